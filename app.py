@@ -1,116 +1,115 @@
 import streamlit as st
-from google import genai
-from google.genai import types
-import os
-from dotenv import load_dotenv
-import io
-from PIL import Image
-import base64 # Required for decorative images/styles
 
-# --- CONFIGURATION AND SETUP ---
+from arabic_ocr import (
+    AUDIO_DELIVERY,
+    LETTER_TO_AUDIO_BASE,
+    RECOGNITION_TIMEOUT_SECONDS,
+    AdmissionRejected,
+    ArchiveRejected,
+    CircuitOpenError,
+    ImageRejected,
+    MissingApiKeyError,
+    expand_batch_uploads,
+    get_audio_asset,
+    get_audio_index,
+    get_admission_controller,
+    get_audio_static_url,
+    get_connection_stats,
+    get_near_duplicate_index,
+    get_preprocess_stats,
+    get_prompt_usage,
+    get_quality_stats,
+    get_recognition_cache,
+    get_single_flight,
+    recognize_batch,
+    recognize_image,
+    set_session_id,
+)
+from arabic_ocr.api import start_api_server
+from arabic_ocr.config import API_PORT, DEBUG_PANEL
+from arabic_ocr.metrics import StageTimer, start_metrics_exporters
+import hashlib
+import uuid
 
-# 1. Load Environment Variables (API Key)
-load_dotenv()
-API_KEY = os.getenv('GEMINI_API_KEY')
-
-# Define the absolute path to the unified MP4 audio folder
-# ⚠️ IMPORTANT: Verify this path on your system.
-AUDIO_FOLDER = "sounds" 
+# The recognition core (engines, caches, client pool, audio index) lives in the
+# importable arabic_ocr package, shared with the command-line batch recognizer.
 
 # =======================================================
-# UTILITY: MAPPER FUNCTION (Arabic Letter to MP4 File)
+# CORE PROCESSING FUNCTION (UI wrapper: errors are shown on the page)
 # =======================================================
-def get_audio_filename(letter: str) -> str | None:
-    """
-    Maps the Arabic letter identified through pattern matching to the correct .mp4 audio file path.
-    Assumes all 36 required files are present and unified to .mp4.
-    """
-    # 1. Clean the letter returned by the processing engine
-    normalized_letter = letter.strip()
-    
-    # 2. Mapping Dictionary: Arabic Letter -> Base Filename (MP4 extension is added later)
-    # This dictionary uses the base filenames matching the 36 available audio files.
-    mapping_base = {
-        'ع': 'ain', 'ا': 'alif', 'أ': 'alif_hamza_foq', 'إ': 'alif_hamza_taht', 
-        'آ': 'alif_madda', 'ى': 'alif_maqsura', 'ب': 'baa', 'ض': 'daad', 
-        'د': 'daal', 'ذ': 'dhaal', 'ف': 'faa', 'غ': 'ghain', 
-        'ح': 'haa', 'ه': 'hah', 'ء': 'hamza', 'ج': 'jeem', 
-        'ك': 'kaaf', 'خ': 'khaa', 'ل': 'laam', 'م': 'meem', 
-        'ن': 'noon', 'ق': 'qaaf', 'ر': 'raa', 'ص': 'saad', 
-        'س': 'seen', 'ش': 'sheen', 'ط': 'taat', 'ة': 'taa_marbuta', 
-        'ت': 'taa', 'ث': 'thaa', 'و': 'waw', 'ؤ': 'waw_hamza', 
-        'ي': 'yaa', 'ئ': 'yaa_hamza', 'ظ': 'zaat', 'ز': 'zay',
-
-        # Robust matching for common hamza/yaa forms
-        'أ': 'alif_hamza_foq', 'إ': 'alif_hamza_taht', 'ي': 'yaa', 'ئ': 'yaa_hamza',
-    }
-    
-    base_name = mapping_base.get(normalized_letter)
-    
-    if base_name:
-        filename = base_name + '.mp4' 
-        full_path = os.path.join(AUDIO_FOLDER, filename)
-        
-        # Check for file existence
-        if os.path.exists(full_path):
-            return full_path
-    
-    return None
+def show_queue_position(placeholder):
+    """on_wait callback: shows this session's turn while its requests wait for the processor."""
+    def update():
+        position = get_admission_controller().queue_position(st.session_state["session_id"])
+        if position:
+            placeholder.info(f"⏳ الطلبات كثيرة حاليًا، دورك في قائمة الانتظار: {position}")
+        else:
+            placeholder.empty()
+    return update
 
-# =======================================================
-# CORE PROCESSING FUNCTION
-# =======================================================
-def identify_arabic_letter_from_bytes(image_bytes: bytes, mime_type: str):
+
+# What the user should do about a capture the local quality gate rejected
+QUALITY_MESSAGES = {
+    "low_contrast": "الصورة فارغة أو باهتة جدًا. صوّر الحرف بإضاءة جيدة وبلون داكن على خلفية فاتحة.",
+    "blank": "لم يظهر حرف في الصورة. قرّب الكاميرا من الحرف ثم أعد التصوير.",
+    "cluttered": "الصورة مزدحمة بالخطوط أو النقوش. صوّر الحرف وحده على خلفية سادة.",
+    "blurry": "الصورة غير واضحة (مهزوزة أو خارج التركيز). ثبّت الكاميرا وأعد التصوير.",
+    "multiple_glyphs": "يبدو أن الصورة تحتوي على أكثر من حرف. صوّر حرفًا واحدًا منفصلًا فقط.",
+}
+
+ARCHIVE_MESSAGES = {
+    "corrupt": "تعذّر فتح الملف {name}: ملف ZIP تالف أو غير مدعوم.",
+    "too_many_entries": "الملف {name} يحتوي على عدد كبير جدًا من الملفات.",
+    "too_large": "حجم الصور في الملف {name} بعد فك الضغط أكبر من المسموح.",
+}
+
+
+def identify_arabic_letter_from_bytes(image_bytes: bytes, mime_type: str, timer: StageTimer | None = None):
     """
     Sends the image data to the processing engine for Arabic letter identification.
+    The core's stage timings (cache, preprocessing, model call...) are added to the timer.
     """
-    if not API_KEY:
+    queue_placeholder = st.empty()
+    try:
+        result = recognize_image(image_bytes, mime_type, on_wait=show_queue_position(queue_placeholder))
+        if timer is not None:
+            timer.include(result.timings_ms)
+        return result.letter
+    except ImageRejected as e:
+        # Rejected locally in a few milliseconds: nothing was sent to the processor
+        st.warning(f"⚠️ {QUALITY_MESSAGES[e.reason]}")
+        return "❌ صورة غير صالحة"
+    except AdmissionRejected as e:
+        st.error(f"❌ المعالج مزدحم حاليًا بطلبات كثيرة، يرجى المحاولة بعد {e.retry_after:.0f} ثانية.")
+        return "❌ فشل الاتصال"
+    except MissingApiKeyError:
         st.error("❌ خطأ: مفتاح API غير موجود.")
         return "❌ فشل الاتصال"
-
-    try:
-        # Note: The underlying function uses Google's multimodal models.
-        client = genai.Client(api_key=API_KEY)
-        
-        # Prompt optimized to return only the single letter (in Arabic)
-        prompt  = (
-                    "انظر بدقة إلى الصورة وحدد الحرف العربي المنفصل الظاهر فيها. "
-                    "كل صورة تحتوي على حرف عربي واحد فقط، مكتوب بخط يدوي أو مطبوع، بدون أي كلمة أو سياق. "
-                    "مهمتك هي تحديد الحرف بشكل دقيق جدًا بناءً على شكله البصري فقط. "
-                
-                    "انتبه جيدًا للتمييز بين الحروف المتشابهة في الشكل مثل (ذ/ز) و(ص/ض) و(ح/هـ)، "
-                    "وخاصة بين (ع) و(ء) لأنها أكثر الحروف تشابهًا في هذه المجموعة. "
-                
-                    "تذكّر أن الحروف كلها **منفصلة** وليست متصلة بأي حرف آخر. "
-                    "الهمزة (ء) هي شكل صغير جدًا، يشبه نصف دائرة أو علامة تشبه رأس العين لكنها مفصولة تمامًا عن أي خط، "
-                    "ولا تحتوي على أي امتداد أو ذيل، وتكون عادة في منتصف السطر أو فوقه. "
-                    "أما العين (ع) فهي حرف أكبر بكثير من الهمزة، له جسم منحني يشبه شكل (C) بالعكس تقريبًا، "
-                    "وله انفتاح واضح من الأعلى، وأحيانًا يمتد للأسفل بخط قصير عند الكتابة اليدوية. "
-                
-                    "عند المقارنة بينهما: الهمزة صغيرة ومنعزلة، والعين أكبر حجمًا ومتصلة جزئيًا بالسطر. "
-                    "احرص على ألا تعتبر الهمزة عينًا، حتى لو كانت مكتوبة بخط سميك أو قريب من شكل القوس."
-                
-                    "يجب أن تكون إجابتك أحد الأحرف التالية فقط: "
-                    "ا، أ، إ، آ، ى، ب، ت، ث، ج، ح، خ، د، ذ، ر، ز، س، ش، ص، ض، ط، ظ، ع، غ، ف، ق، ك، ل، م، ن، هـ، و، ؤ، ي، ئ، ة، ء. "
-                
-                    "أجب بالحرف نفسه فقط دون أي شرح أو كلمات إضافية. "
-                    "إذا كان الحرف غير واضح جدًا، اختر الأقرب من حيث الشكل البصري من القائمة أعلاه."
-                )
-        contents = [
-            types.Part.from_bytes(data=image_bytes, mime_type=mime_type),
-            prompt
-        ]
-
-        response = client.models.generate_content(
-            model='gemini-2.5-flash',
-            contents=contents
-        )
-
-        return response.text.strip()
-        
+    except CircuitOpenError as e:
+        # Repeated upstream failures: fail fast instead of making every user wait
+        st.error(f"❌ المعالج غير متاح مؤقتًا، يرجى المحاولة بعد {e.retry_after:.0f} ثانية.")
+        return "❌ فشل الاتصال"
+    except TimeoutError:
+        st.error(f"❌ انتهت مهلة المعالج ({RECOGNITION_TIMEOUT_SECONDS:.0f} ثانية).")
+        return "❌ فشل المعالجة"
     except Exception as e:
         st.error(f"❌ حدث خطأ أثناء الاتصال بالمعالج: {e}")
         return "❌ فشل المعالجة"
+    finally:
+        queue_placeholder.empty()
+
+
+# Optional HTTP JSON API in this same process, sharing the engine, caches and client pool
+if API_PORT:
+    start_api_server()
+# Stage latency histograms on METRICS_PORT and/or METRICS_TEXTFILE
+start_metrics_exporters()
+
+# Requests from this browser session queue together (fair turns between sessions)
+set_session_id(st.session_state.setdefault("session_id", uuid.uuid4().hex))
+
+# Current clip index (the core rebuilds it when the audio folder changes)
+AUDIO_INDEX = get_audio_index()
 
 # =======================================================
 # STREAMLIT UI DESIGN (Enhanced Arabic Interface)
@@ -141,82 +140,248 @@ with info_cols[2]:
 
 st.divider()
 
-# --- INPUT SECTION ---
-st.subheader("📸 إدخال الحرف للمقارنة")
-st.markdown("يمكنك رفع صورة مكتوبة بخط اليد أو مطبوعة، أو استخدام كاميرا الجهاز مباشرة:")
+tab_single, tab_batch = st.tabs(["حرف واحد", "دفعة من الحروف"])
 
-input_cols = st.columns(2)
+with tab_single:
+    # --- INPUT SECTION ---
+    st.subheader("📸 إدخال الحرف للمقارنة")
+    st.markdown("يمكنك رفع صورة مكتوبة بخط اليد أو مطبوعة، أو استخدام كاميرا الجهاز مباشرة:")
 
-with input_cols[0]:
-    uploaded_file = st.file_uploader(
-        "1. رفع صورة من الجهاز (PNG أو JPG):", 
-        type=["png", "jpg", "jpeg"]
-    )
+    input_cols = st.columns(2)
 
-with input_cols[1]:
-    camera_image = st.camera_input("2. التقاط صورة مباشرة للحرف:")
+    with input_cols[0]:
+        uploaded_file = st.file_uploader(
+            "1. رفع صورة من الجهاز (PNG أو JPG):", 
+            type=["png", "jpg", "jpeg"]
+        )
 
-# Determine the source image
-source_image = camera_image if camera_image is not None else uploaded_file
+    with input_cols[1]:
+        camera_image = st.camera_input("2. التقاط صورة مباشرة للحرف:")
 
-# --- PROCESSING AND OUTPUT ---
+    # Determine the source image
+    source_image = camera_image if camera_image is not None else uploaded_file
 
-if source_image is not None:
-    
-    st.divider()
-    st.subheader("🔍 نتيجة المقارنة الآلية")
-    
-    col_img, col_res = st.columns([1, 2])
-    
-    with col_img:
-        st.image(source_image, caption='الصورة المُدخلة', use_container_width=True) # Updated to use_container_width
-
-    with col_res:
-        st.info("جاري إرسال الصورة للمقارنة الآلية...")
-        
-        image_bytes = source_image.getvalue()
-        mime_type = f"image/{source_image.type.split('/')[-1]}"
-        
-        # Run the processing
-        with st.spinner('⏳ يرجى الانتظار، المعالج يقوم بمطابقة البيانات...'):
-            identified_letter = identify_arabic_letter_from_bytes(image_bytes, mime_type)
-        
-        # Display Final Result
-        st.markdown("### ✅ الحرف المُتعرَّف عليه:")
-        
-        if identified_letter and identified_letter.startswith('❌'):
-            st.error(f"فشل المطابقة: {identified_letter}")
-        else:
-            st.balloons() 
-            st.markdown(f"<p style='font-size: 80px; text-align: center; color: #DC3545; font-weight: bold;'>{identified_letter}</p>", unsafe_allow_html=True)
-            st.success(f"تمت المطابقة بنجاح مع الحرف: **{identified_letter}**")
-            
-            # --- Audio Playback ---
-            st.markdown("---")
-            st.markdown("### 🔈 نطق الحرف (مطابقة آلية):")
-            audio_file_path = get_audio_filename(identified_letter)
-            
-            if audio_file_path and os.path.exists(audio_file_path):
-                # نقرأ الصوت ونحوله Base64
-                with open(audio_file_path, "rb") as f:
-                    audio_bytes = f.read()
-                audio_base64 = base64.b64encode(audio_bytes).decode()
-            
-                # عنصر HTML يشغل الصوت تلقائيًا (فعليًا)
-                audio_html = f"""
-                    <audio autoplay>
-                        <source src="data:audio/mp4;base64,{audio_base64}" type="audio/mp4">
-                        متصفحك لا يدعم تشغيل الصوت.
-                    </audio>
-                """
-                st.markdown(audio_html, unsafe_allow_html=True)
-            
+    # --- PROCESSING AND OUTPUT ---
+
+    if source_image is not None:
+        # Server-side stages of this run (the browser upload itself happens before the script runs)
+        timer = StageTimer()
+
+        st.divider()
+        st.subheader("🔍 نتيجة المقارنة الآلية")
+
+        col_img, col_res = st.columns([1, 2])
+
+        with col_img, timer.stage("image_preview"):
+            st.image(source_image, caption='الصورة المُدخلة', use_container_width=True) # Updated to use_container_width
+
+        with col_res:
+            with timer.stage("upload_read"):
+                image_bytes = source_image.getvalue()
+            mime_type = f"image/{source_image.type.split('/')[-1]}"
+
+            # Reruns (widget changes, animations) keep the same upload: redraw the stored
+            # result instead of sending the same image to the processing engine again.
+            with timer.stage("image_hash"):
+                image_key = (getattr(source_image, "file_id", source_image.name), hashlib.sha256(image_bytes).hexdigest())
+            stored_result = st.session_state.get("recognition_result")
+            is_new_result = stored_result is None or stored_result["key"] != image_key
+
+            if is_new_result:
+                st.info("جاري إرسال الصورة للمقارنة الآلية...")
+
+                # Run the processing
+                with st.spinner('⏳ يرجى الانتظار، المعالج يقوم بمطابقة البيانات...'), timer.stage("recognition"):
+                    identified_letter = identify_arabic_letter_from_bytes(image_bytes, mime_type, timer)
+
+                # Only successful results are kept, so a failed attempt is retried on the next rerun
+                if identified_letter and not identified_letter.startswith('❌'):
+                    st.session_state["recognition_result"] = {"key": image_key, "letter": identified_letter}
+                else:
+                    st.session_state.pop("recognition_result", None)
             else:
-                st.warning(f"⚠️ لم يتم العثور على الملف الصوتي للحرف '{identified_letter}' في مجلد الأصوات.")
+                identified_letter = stored_result["letter"]
 
+            # Display Final Result
+            st.markdown("### ✅ الحرف المُتعرَّف عليه:")
+
+            if identified_letter and identified_letter.startswith('❌'):
+                st.error(f"فشل المطابقة: {identified_letter}")
+            else:
+                if is_new_result:
+                    with timer.stage("balloons"):
+                        st.balloons()
+                with timer.stage("result_render"):
+                    st.markdown(f"<p style='font-size: 80px; text-align: center; color: #DC3545; font-weight: bold;'>{identified_letter}</p>", unsafe_allow_html=True)
+                    st.success(f"تمت المطابقة بنجاح مع الحرف: **{identified_letter}**")
 
-else:
-    st.info("يرجى رفع أو التقاط صورة للحرف العربي للبدء في عملية المقارنة الآلية.")
+                # --- Audio Playback ---
+                st.markdown("---")
+                st.markdown("### 🔈 نطق الحرف (مطابقة آلية):")
+                with timer.stage("audio_embed"):
+                    audio_asset = get_audio_asset(identified_letter)
+
+                    if audio_asset is not None:
+                        if AUDIO_DELIVERY == 'static':
+                            # رابط ثابت بالبصمة: المتصفح يخزّن المقطع ولا يعيد تنزيله عند التكرار
+                            audio_src = get_audio_static_url(audio_asset)
+                        else:
+                            # الصوت مقروء ومحوَّل إلى Base64 مسبقًا (مرة واحدة لكل عملية)
+                            audio_src = f"data:audio/mp4;base64,{audio_asset.base64_data}"
+
+                        # عنصر HTML يشغل الصوت تلقائيًا (فعليًا)
+                        audio_html = f"""
+                            <audio autoplay>
+                                <source src="{audio_src}" type="audio/mp4">
+                                متصفحك لا يدعم تشغيل الصوت.
+                            </audio>
+                        """
+                        st.markdown(audio_html, unsafe_allow_html=True)
+
+                    else:
+                        st.warning(f"⚠️ لم يتم العثور على الملف الصوتي للحرف '{identified_letter}' في مجلد الأصوات.")
+
+
+        st.session_state["last_stage_timings"] = timer.rows()
+
+    else:
+        st.session_state.pop("recognition_result", None)
+        st.info("يرجى رفع أو التقاط صورة للحرف العربي للبدء في عملية المقارنة الآلية.")
+
+with tab_batch:
+    st.subheader("🗂️ التعرف على دفعة من الحروف")
+    st.markdown("ارفع عدة صور للحروف أو ملف ZIP يحتوي عليها (مثل ورقة عمل مقصوصة إلى حروف):")
+
+    batch_files = st.file_uploader(
+        "رفع صور متعددة أو ملف ZIP:",
+        type=["png", "jpg", "jpeg", "zip"],
+        accept_multiple_files=True,
+    )
+
+    if batch_files:
+        # Same rerun rule as the single mode: only a new set of files is sent for recognition
+        batch_key = tuple(getattr(f, "file_id", f.name) for f in batch_files)
+        stored_batch = st.session_state.get("batch_result")
+        if stored_batch is None or stored_batch["key"] != batch_key:
+            try:
+                batch_items = expand_batch_uploads(batch_files)
+            except ArchiveRejected as e:
+                # Kept for this set of files, so reruns do not open the archive again
+                stored_batch = {"key": batch_key, "error": ARCHIVE_MESSAGES[e.reason].format(name=e.archive)}
+            else:
+                queue_placeholder = st.empty()
+                with st.spinner(f'⏳ جاري التعرف على {len(batch_items)} صورة...'):
+                    batch_results, batch_seconds = recognize_batch(batch_items, on_wait=show_queue_position(queue_placeholder))
+                queue_placeholder.empty()
+                stored_batch = {"key": batch_key, "results": batch_results, "seconds": batch_seconds}
+            st.session_state["batch_result"] = stored_batch
+
+        if "error" in stored_batch:
+            st.error(f"❌ {stored_batch['error']}")
+        else:
+            batch_results, batch_seconds = stored_batch["results"], stored_batch["seconds"]
+            recognized = [r for r in batch_results if r.error is None]
+
+            metric_cols = st.columns(3)
+            metric_cols[0].metric("عدد الصور", len(batch_results))
+            metric_cols[1].metric("تم التعرف عليها", len(recognized))
+            metric_cols[2].metric("الإنتاجية", f"{len(batch_results) / batch_seconds:.1f} حرف/ث" if batch_seconds else "—")
+
+            st.dataframe(
+                [
+                    {
+                        "الملف": r.name,
+                        "الحرف": r.letter or "❌",
+                        "الثقة": f"{r.confidence:.0%}" if r.confidence is not None else "",
+                        "المحرك": r.engine or "",
+                        "الزمن (ms)": round(r.elapsed_ms),
+                        "الخطأ": r.error or "",
+                    }
+                    for r in batch_results
+                ],
+                use_container_width=True,
+            )
+
+            st.markdown("### 🔈 نطق الحروف:")
+            for r in recognized:
+                audio_asset = get_audio_asset(r.letter)
+                row_cols = st.columns([3, 1, 4])
+                row_cols[0].write(r.name)
+                row_cols[1].markdown(f"**{r.letter}**")
+                if audio_asset is None:
+                    row_cols[2].caption("لا يوجد ملف صوتي")
+                elif AUDIO_DELIVERY == 'static':
+                    row_cols[2].audio(get_audio_static_url(audio_asset), format="audio/mp4")
+                else:
+                    row_cols[2].audio(audio_asset.data, format="audio/mp4")
+    else:
+        st.session_state.pop("batch_result", None)
+        st.info("يرجى رفع صور الحروف أو ملف ZIP لبدء التعرف على الدفعة.")
+
+# --- PERFORMANCE STATS (Sidebar) ---
+with st.sidebar.expander("📊 إحصاءات الأداء"):
+    conn_stats = get_connection_stats()
+    st.metric("طلبات المعالج", conn_stats.requests)
+    st.metric("اتصالات جديدة", conn_stats.new_connections)
+    st.metric("نسبة إعادة استخدام الاتصال", f"{conn_stats.reuse_ratio:.0%}")
+    recognition_cache = get_recognition_cache()
+    st.metric("إصابات ذاكرة التعرف", f"{recognition_cache.hits} / {recognition_cache.hits + recognition_cache.misses}")
+    st.caption(f"طلبات متطابقة انتظرت نتيجة طلب جارٍ بدل إرسالها مجددًا: {get_single_flight().coalesced}")
+    near_duplicates = get_near_duplicate_index()
+    st.caption(f"صور مشابهة لحرف سبق التعرف عليه (دون استدعاء النموذج): {near_duplicates.hits} — المخزَّن: {len(near_duplicates)}")
+    prompt_usage = get_prompt_usage()
+    if prompt_usage.calls:
+        st.caption(
+            f"رموز الإدخال للنموذج: {prompt_usage.prompt_tokens / prompt_usage.calls:.0f} لكل طلب — "
+            f"منها من الذاكرة المؤقتة للنموذج: {prompt_usage.cached_ratio:.0%}"
+        )
+    preprocess_stats = get_preprocess_stats()
+    if preprocess_stats.images:
+        st.metric(
+            "حجم الصور المرسلة",
+            f"{preprocess_stats.bytes_out / 1024:.0f} KB",
+            f"-{(preprocess_stats.bytes_in - preprocess_stats.bytes_out) / 1024:.0f} KB",
+            delta_color="inverse",
+        )
+        st.caption(f"زمن المعالجة المسبقة: {preprocess_stats.preprocess_ms / preprocess_stats.images:.1f} ms لكل صورة")
+    for mode, label in (("preprocessed", "مع المعالجة المسبقة"), ("raw", "بدون معالجة مسبقة")):
+        average_ms = preprocess_stats.average_model_ms(mode)
+        if average_ms is not None:
+            st.caption(f"متوسط زمن المعالج {label}: {average_ms:.0f} ms")
+    quality_stats = get_quality_stats()
+    if quality_stats.checked:
+        average_ms = preprocess_stats.average_model_ms("preprocessed") or preprocess_stats.average_model_ms("raw")
+        saved = f" — الوقت الموفَّر تقريبًا: {quality_stats.saved_ms(average_ms) / 1000:.1f} ثانية" if average_ms else ""
+        st.caption(
+            f"صور رُفضت محليًا قبل إرسالها: {quality_stats.rejected_total} / {quality_stats.checked} "
+            f"({quality_stats.reject_rate:.0%}){saved}"
+        )
+    audio_assets = AUDIO_INDEX.by_name.values()
+    st.metric("مقاطع صوتية محمّلة", f"{len(AUDIO_INDEX.by_letter)} / {len(LETTER_TO_AUDIO_BASE)}")
+    st.caption(
+        f"الحجم: {sum(a.size_bytes for a in audio_assets) / 1024:.0f} KB — "
+        f"زمن القراءة والترميز الموفَّر لكل طلب: "
+        f"{sum(a.encode_ms for a in audio_assets) / max(len(audio_assets), 1):.2f} ms"
+    )
+    if AUDIO_INDEX.missing_letters:
+        st.warning(f"حروف بلا ملف صوتي: {' '.join(AUDIO_INDEX.missing_letters)}")
+    if AUDIO_INDEX.extra_files:
+        st.caption(f"ملفات صوتية غير مرتبطة بحرف: {', '.join(AUDIO_INDEX.extra_files)}")
+
+# --- DEBUG PANEL (DEBUG_PANEL=1 or ?debug=1): where the last request's time went ---
+if DEBUG_PANEL or st.query_params.get("debug") == "1":
+    with st.sidebar.expander("🐞 تفصيل زمن آخر طلب", expanded=True):
+        stage_rows = st.session_state.get("last_stage_timings")
+        if stage_rows:
+            st.dataframe(
+                [{"المرحلة": "↳ " * depth + stage, "الزمن (ms)": ms} for stage, ms, depth in stage_rows],
+                hide_index=True,
+                use_container_width=True,
+            )
+            st.caption(f"الإجمالي: {sum(ms for _, ms, depth in stage_rows if depth == 0):.1f} ms")
+        else:
+            st.caption("لم تتم معالجة أي صورة بعد.")
 
 st.divider()
 st.markdown("<p style='text-align: center; color: #888;'> إن أحسنا فمن الله، وإن أسأنا أو أخطأنا فمن أنفسنا والشيطان. </p>", unsafe_allow_html=True)
+
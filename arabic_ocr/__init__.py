@@ -0,0 +1,127 @@
+"""
+Arabic letter recognition core, shared by the Streamlit app (app.py) and the
+command-line batch recognizer (python -m arabic_ocr).
+"""
+from .admission import AdmissionController, AdmissionRejected, get_admission_controller, set_session_id
+from .audio import (
+    LETTER_TO_AUDIO_BASE,
+    AudioAsset,
+    AudioIndex,
+    build_audio_index,
+    get_audio_asset,
+    get_audio_filename,
+    get_audio_index,
+    get_audio_static_url,
+    normalize_letter,
+)
+from .cache import RecognitionCache, get_recognition_cache, recognition_cache_key
+from .client import (
+    build_genai_client,
+    get_connection_stats,
+    get_event_loop,
+    get_genai_client,
+    run_sync,
+    submit_async,
+)
+from .config import AUDIO_DELIVERY, MODEL_NAME, MODEL_PROFILE, PROMPT_VERSION, RECOGNITION_TIMEOUT_SECONDS
+from .engines import (
+    CascadeEngine,
+    GeminiEngine,
+    InvalidModelAnswer,
+    MissingApiKeyError,
+    Recognition,
+    RecognitionEngine,
+    TemplateEngine,
+    build_generation_config,
+    get_recognition_engine,
+    parse_model_answer,
+)
+from .metrics import StageTimer, render_metrics, start_metrics_exporters
+from .phash import GlyphKey, NearDuplicateIndex, get_near_duplicate_index, glyph_key
+from .preprocessing import PreprocessResult, get_preprocess_stats, preprocess_image
+from .prompts import RECOGNITION_PROMPT, PromptTemplate, get_prompt_context_cache, get_prompt_usage
+from .quality import ImageRejected, QualityReport, assess_image, get_quality_stats
+from .recognition import (
+    ArchiveRejected,
+    BatchItem,
+    BatchResult,
+    expand_batch_uploads,
+    recognize_batch,
+    recognize_batch_async,
+    recognize_image,
+    recognize_image_async,
+)
+from .resilience import CircuitBreaker, CircuitOpenError, RetryPolicy, get_circuit_breaker
+from .singleflight import SingleFlight, get_single_flight
+
+__all__ = [
+    "AUDIO_DELIVERY",
+    "LETTER_TO_AUDIO_BASE",
+    "MODEL_NAME",
+    "MODEL_PROFILE",
+    "PROMPT_VERSION",
+    "RECOGNITION_PROMPT",
+    "RECOGNITION_TIMEOUT_SECONDS",
+    "AdmissionController",
+    "AdmissionRejected",
+    "ArchiveRejected",
+    "AudioAsset",
+    "AudioIndex",
+    "BatchItem",
+    "BatchResult",
+    "CascadeEngine",
+    "CircuitBreaker",
+    "CircuitOpenError",
+    "GeminiEngine",
+    "GlyphKey",
+    "ImageRejected",
+    "InvalidModelAnswer",
+    "MissingApiKeyError",
+    "NearDuplicateIndex",
+    "PreprocessResult",
+    "PromptTemplate",
+    "QualityReport",
+    "Recognition",
+    "RecognitionCache",
+    "RecognitionEngine",
+    "RetryPolicy",
+    "SingleFlight",
+    "StageTimer",
+    "TemplateEngine",
+    "assess_image",
+    "build_audio_index",
+    "build_generation_config",
+    "build_genai_client",
+    "expand_batch_uploads",
+    "get_admission_controller",
+    "get_audio_asset",
+    "get_audio_filename",
+    "get_audio_index",
+    "get_audio_static_url",
+    "get_circuit_breaker",
+    "get_connection_stats",
+    "get_event_loop",
+    "get_genai_client",
+    "get_near_duplicate_index",
+    "get_preprocess_stats",
+    "get_prompt_context_cache",
+    "get_prompt_usage",
+    "get_quality_stats",
+    "get_recognition_cache",
+    "get_recognition_engine",
+    "get_single_flight",
+    "glyph_key",
+    "normalize_letter",
+    "parse_model_answer",
+    "preprocess_image",
+    "recognition_cache_key",
+    "recognize_batch",
+    "recognize_batch_async",
+    "recognize_image",
+    "recognize_image_async",
+    "render_metrics",
+    "run_sync",
+    "set_session_id",
+    "start_metrics_exporters",
+    "submit_async",
+]
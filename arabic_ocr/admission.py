@@ -0,0 +1,186 @@
+"""
+Admission control in front of the remote model: every session shares one API key, so
+calls pass a process-wide token bucket (requests per minute) and an in-flight limit.
+Waiting calls are queued per session and served round-robin, so one large batch does
+not starve a single upload, and calls that would wait too long are rejected up front.
+"""
+import asyncio
+import contextvars
+import time
+from collections import OrderedDict, deque
+
+from .client import get_event_loop, run_sync
+from .config import ADMISSION_MAX_WAIT_SECONDS, MODEL_MAX_IN_FLIGHT, MODEL_RATE_LIMIT_BURST, MODEL_RATE_LIMIT_RPM
+from .metrics import REGISTRY
+from .resources import cached_resource
+
+# Who is asking: a Streamlit session, an API client, the CLI. Set by the caller;
+# it follows the call onto the shared loop (run_coroutine_threadsafe copies the context).
+SESSION_ID: contextvars.ContextVar[str] = contextvars.ContextVar("arabic_ocr_session_id", default="default")
+
+
+def set_session_id(session_id: str):
+    """Tags the calling thread's (and its submitted coroutines') model calls with a session."""
+    SESSION_ID.set(session_id)
+
+
+QUEUE_DEPTH = REGISTRY.gauge("arabic_ocr_admission_queue_depth", "Model calls waiting for admission.")
+IN_FLIGHT = REGISTRY.gauge("arabic_ocr_model_in_flight", "Model calls currently admitted.")
+WAIT_SECONDS = REGISTRY.histogram("arabic_ocr_admission_wait_seconds", "Time model calls waited for admission.")
+REJECTED = REGISTRY.counter(
+    "arabic_ocr_admission_rejected_total", "Model calls refused by admission control.", ("reason",)
+)
+
+
+class AdmissionRejected(RuntimeError):
+    """The model is saturated: waiting would exceed the admission threshold."""
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(f"server busy ({reason}), retry in {retry_after:.0f}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Lives on the shared event loop: acquire/release must run there (the *_blocking and
+    *_threadsafe variants are for blocking callers). queue_position works from any thread.
+    """
+    def __init__(self, rate_per_minute: float = MODEL_RATE_LIMIT_RPM, burst: int = MODEL_RATE_LIMIT_BURST,
+                 max_in_flight: int = MODEL_MAX_IN_FLIGHT, max_wait_seconds: float = ADMISSION_MAX_WAIT_SECONDS):
+        self.rate = rate_per_minute / 60.0 if rate_per_minute > 0 else None
+        self.capacity = max(burst, 1)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.max_in_flight = max(max_in_flight, 1)
+        self.max_wait_seconds = max_wait_seconds
+        self.in_flight = 0
+        # session -> its waiting calls; the dict order is the round-robin order
+        self._queues: OrderedDict[str, deque[asyncio.Future]] = OrderedDict()
+        self._timer: asyncio.TimerHandle | None = None
+        # Snapshot for other threads: session -> 1-based position of its next call
+        self.positions: dict[str, int] = {}
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def queue_position(self, session_id: str) -> int:
+        """Turn of the session's next waiting call (1 = next), or 0 when it is not waiting."""
+        return self.positions.get(session_id, 0)
+
+    def estimated_wait(self, session_id: str) -> float:
+        """
+        Seconds a call from this session arriving now would wait for a rate-limit token.
+        Round-robin turns: a session with nothing queued only waits behind one call per
+        other session, however long their queues are.
+        """
+        if self.rate is None:
+            return 0.0
+        self._refill()
+        own = len(self._queues.get(session_id, ()))
+        ahead = own + sum(min(len(queue), own + 1) for s, queue in self._queues.items() if s != session_id)
+        return max(0.0, (ahead + 1 - self.tokens) / self.rate)
+
+    def _refill(self):
+        if self.rate is None:
+            return
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def _try_admit(self) -> bool:
+        if self.in_flight >= self.max_in_flight:
+            return False
+        self._refill()
+        if self.rate is not None:
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+        self.in_flight += 1
+        IN_FLIGHT.set(self.in_flight)
+        return True
+
+    async def acquire(self, session_id: str | None = None):
+        session_id = session_id or SESSION_ID.get()
+        if not self._queues and self._try_admit():
+            WAIT_SECONDS.observe(0.0)
+            return
+        estimate = self.estimated_wait(session_id)
+        if estimate > self.max_wait_seconds:
+            REJECTED.inc(reason="estimate")
+            raise AdmissionRejected("quota", estimate)
+
+        started = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(session_id, deque()).append(future)
+        self._dispatch()
+        try:
+            await asyncio.wait_for(future, self.max_wait_seconds)
+        except (TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # Admitted just as the caller gave up: hand the slot back
+                self.release()
+            else:
+                self._remove(session_id, future)
+            if isinstance(e, TimeoutError):
+                REJECTED.inc(reason="timeout")
+                raise AdmissionRejected("timeout", self.max_wait_seconds) from None
+            raise
+        WAIT_SECONDS.observe(time.monotonic() - started)
+
+    def release(self):
+        self.in_flight -= 1
+        IN_FLIGHT.set(self.in_flight)
+        self._dispatch()
+
+    def _remove(self, session_id: str, future: asyncio.Future):
+        queue = self._queues.get(session_id)
+        if queue is not None and future in queue:
+            queue.remove(future)
+            if not queue:
+                del self._queues[session_id]
+        self._publish()
+
+    def _dispatch(self):
+        """Admits waiting calls round-robin across sessions while capacity lasts."""
+        while self._queues:
+            session_id, queue = next(iter(self._queues.items()))
+            if queue[0].done():
+                # Cancelled while waiting: not a turn
+                queue.popleft()
+                if not queue:
+                    del self._queues[session_id]
+                continue
+            if not self._try_admit():
+                if self.rate is not None and self.in_flight < self.max_in_flight:
+                    self._wake_after((1 - self.tokens) / self.rate)
+                break
+            queue.popleft().set_result(None)
+            if queue:
+                self._queues.move_to_end(session_id)
+            else:
+                del self._queues[session_id]
+        self._publish()
+
+    def _wake_after(self, delay: float):
+        if self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(delay, self._on_timer)
+
+    def _on_timer(self):
+        self._timer = None
+        self._dispatch()
+
+    def _publish(self):
+        self.positions = {session_id: turn for turn, session_id in enumerate(self._queues, start=1)}
+        QUEUE_DEPTH.set(self.queue_depth)
+
+    def acquire_blocking(self, session_id: str | None = None):
+        run_sync(self.acquire(session_id), timeout=None)
+
+    def release_threadsafe(self):
+        get_event_loop().call_soon_threadsafe(self.release)
+
+
+@cached_resource
+def get_admission_controller() -> AdmissionController:
+    return AdmissionController()
@@ -0,0 +1,182 @@
+"""
+HTTP JSON recognition API (ASGI), sharing the engine, caches and client pool with the UI.
+
+    uvicorn arabic_ocr.api:app --port 8000         (or: python -m arabic_ocr.api --port 8000)
+    curl --data-binary @letter.png -H 'Content-Type: image/png' http://localhost:8000/recognize
+
+Setting API_PORT also starts it inside the Streamlit process (see start_api_server).
+"""
+import argparse
+import asyncio
+import json
+import threading
+import time
+
+from .admission import AdmissionRejected, set_session_id
+from .audio import clip_response, get_audio_asset, get_audio_index
+from .cache import get_recognition_cache
+from .client import submit_async
+from .config import API_HOST, API_MAX_BODY_BYTES, API_PORT, RECOGNITION_TIMEOUT_SECONDS
+from .engines import MissingApiKeyError
+from .metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, render_metrics
+from .prompts import get_prompt_usage
+from .quality import ImageRejected, get_quality_stats
+from .recognition import recognize_image_async
+from .resilience import CircuitOpenError
+from .singleflight import get_single_flight
+from .resources import cached_resource
+
+
+async def _read_body(receive, limit: int) -> bytes | None:
+    """Request body, or None when it exceeds the limit."""
+    chunks, size = [], 0
+    while True:
+        message = await receive()
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if size > limit:
+            return None
+        chunks.append(chunk)
+        if not message.get('more_body', False):
+            return b''.join(chunks)
+
+
+async def _send(send, status: int, headers: list[tuple[str, str]], body: bytes):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(name.lower().encode(), value.encode()) for name, value in headers],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def _send_json(send, status: int, payload: dict, extra_headers: list[tuple[str, str]] = ()):
+    body = json.dumps(payload, ensure_ascii=False).encode()
+    await _send(send, status, [('Content-Type', 'application/json; charset=utf-8'),
+                               ('Content-Length', str(len(body))), *extra_headers], body)
+
+
+async def recognize_endpoint(headers: dict[str, str], client: str, receive, send):
+    start = time.perf_counter()
+    mime_type = headers.get('content-type', '').split(';', 1)[0].strip().lower()
+    if not mime_type.startswith('image/'):
+        await _send_json(send, 415, {"error": "send the raw image with an image/* Content-Type"})
+        return
+    image_bytes = await _read_body(receive, API_MAX_BODY_BYTES)
+    if image_bytes is None:
+        await _send_json(send, 413, {"error": f"image larger than {API_MAX_BODY_BYTES} bytes"})
+        return
+    if not image_bytes:
+        await _send_json(send, 400, {"error": "empty body"})
+        return
+
+    # Admission control queues callers fairly per session: an explicit id, else the client address
+    set_session_id(headers.get('x-session-id') or client)
+
+    recognition_start = time.perf_counter()
+    try:
+        # Recognition runs on the shared loop, where the model client's connection pool lives;
+        # identical images in flight (from any caller) share one model call there
+        result = await asyncio.wrap_future(submit_async(recognize_image_async(image_bytes, mime_type),
+                                                        RECOGNITION_TIMEOUT_SECONDS))
+    except ImageRejected as e:
+        await _send_json(send, 422, {"error": str(e), "reason": e.reason})
+        return
+    except MissingApiKeyError:
+        await _send_json(send, 503, {"error": "GEMINI_API_KEY is not set"})
+        return
+    except (AdmissionRejected, CircuitOpenError) as e:
+        await _send_json(send, 503, {"error": str(e)}, [('Retry-After', str(int(e.retry_after + 0.999)))])
+        return
+    except TimeoutError:
+        await _send_json(send, 504, {"error": f"recognition timed out after {RECOGNITION_TIMEOUT_SECONDS:.0f}s"})
+        return
+    except Exception as e:
+        await _send_json(send, 502, {"error": str(e) or type(e).__name__})
+        return
+    recognition_ms = (time.perf_counter() - recognition_start) * 1000
+
+    audio_asset = get_audio_asset(result.letter)
+    await _send_json(send, 200, {
+        "letter": result.letter,
+        "confidence": result.confidence,
+        "alternatives": [{"letter": letter, "confidence": confidence} for letter, confidence in result.alternatives],
+        "engine": result.engine,
+        "audio_url": f"/sounds/{audio_asset.fingerprinted_name}" if audio_asset else None,
+        "coalesced": result.coalesced,
+        "timings_ms": {
+            "recognition": round(recognition_ms, 2),
+            "total": round((time.perf_counter() - start) * 1000, 2),
+            "stages": result.timings_ms,
+        },
+    })
+
+
+async def app(scope, receive, send):
+    """The ASGI application."""
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+    if scope['type'] != 'http':
+        return
+
+    path, method = scope['path'], scope['method']
+    headers = {name.decode().lower(): value.decode() for name, value in scope['headers']}
+
+    if path == '/recognize' and method == 'POST':
+        await recognize_endpoint(headers, (scope.get('client') or ('unknown',))[0], receive, send)
+    elif path.startswith('/sounds/') and method in ('GET', 'HEAD'):
+        asset = get_audio_index().by_name.get(path.removeprefix('/sounds/'))
+        status, clip_headers, body = clip_response(asset, headers.get('if-none-match'), headers.get('range'))
+        await _send(send, status, clip_headers, b'' if method == 'HEAD' else body)
+    elif path == '/metrics' and method == 'GET':
+        body = render_metrics().encode()
+        await _send(send, 200, [('Content-Type', METRICS_CONTENT_TYPE), ('Content-Length', str(len(body)))], body)
+    elif path == '/healthz':
+        await _send_json(send, 200, {"status": "ok"})
+    elif path == '/stats':
+        cache = get_recognition_cache()
+        single_flight = get_single_flight()
+        prompt_usage = get_prompt_usage()
+        quality_stats = get_quality_stats()
+        await _send_json(send, 200, {
+            "coalesced_requests": single_flight.coalesced,
+            "upstream_requests": single_flight.leaders,
+            "cache_hits": cache.hits,
+            "cache_misses": cache.misses,
+            "prompt_tokens": prompt_usage.prompt_tokens,
+            "cached_prompt_tokens": prompt_usage.cached_tokens,
+            "quality_checked": quality_stats.checked,
+            "quality_rejected": quality_stats.rejected,
+        })
+    else:
+        await _send_json(send, 404, {"error": "not found"})
+
+
+@cached_resource
+def start_api_server(host: str = API_HOST, port: int = API_PORT):
+    """Runs the API with uvicorn in a daemon thread of the current process (once)."""
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning", lifespan="off"))
+    threading.Thread(target=server.run, name="recognition-api", daemon=True).start()
+    return server
+
+
+def main(argv: list[str] | None = None):
+    import uvicorn
+
+    parser = argparse.ArgumentParser(prog="python -m arabic_ocr.api", description="Arabic letter recognition API")
+    parser.add_argument("--host", default=API_HOST)
+    parser.add_argument("--port", type=int, default=API_PORT or 8000)
+    args = parser.parse_args(argv)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="info")
+
+
+if __name__ == "__main__":
+    main()
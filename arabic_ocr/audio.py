@@ -0,0 +1,269 @@
+"""
+Letter-to-audio mapping: the clip index, the Base64 payloads for inline playback and
+the static server for browser-cacheable clip URLs.
+"""
+import base64
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import MappingProxyType
+from typing import Mapping
+
+from .config import AUDIO_FOLDER, AUDIO_RELOAD_SECONDS, AUDIO_STATIC_BASE_URL, AUDIO_STATIC_PORT
+from .resources import cached_resource
+
+logger = logging.getLogger(__name__)
+
+# =======================================================
+# UTILITY: MAPPER (Arabic Letter to MP4 File)
+# =======================================================
+# Mapping Dictionary: Arabic Letter -> Base Filename (MP4 extension is added by the index)
+# This dictionary uses the base filenames matching the 36 available audio files.
+LETTER_TO_AUDIO_BASE = MappingProxyType({
+    'ع': 'ain', 'ا': 'alif', 'أ': 'alif_hamza_foq', 'إ': 'alif_hamza_taht', 
+    'آ': 'alif_madda', 'ى': 'alif_maqsura', 'ب': 'baa', 'ض': 'daad', 
+    'د': 'daal', 'ذ': 'dhaal', 'ف': 'faa', 'غ': 'ghain', 
+    'ح': 'haa', 'ه': 'hah', 'ء': 'hamza', 'ج': 'jeem', 
+    'ك': 'kaaf', 'خ': 'khaa', 'ل': 'laam', 'م': 'meem', 
+    'ن': 'noon', 'ق': 'qaaf', 'ر': 'raa', 'ص': 'saad', 
+    'س': 'seen', 'ش': 'sheen', 'ط': 'taat', 'ة': 'taa_marbuta', 
+    'ت': 'taa', 'ث': 'thaa', 'و': 'waw', 'ؤ': 'waw_hamza', 
+    'ي': 'yaa', 'ئ': 'yaa_hamza', 'ظ': 'zaat', 'ز': 'zay',
+})
+
+# Tatweel (ـ) is only a drawing aid: the prompt lists "هـ" for the isolated "ه"
+TATWEEL = 'ـ'
+
+
+def normalize_letter(letter: str) -> str:
+    """Cleans the letter returned by the processing engine before any lookup."""
+    return letter.strip().replace(TATWEEL, '')
+
+
+_LETTER_BY_BASE = {base_name: letter for letter, base_name in LETTER_TO_AUDIO_BASE.items()}
+# Longest names first so "alif_hamza_foq_2" is not read as "alif"
+_BASE_NAMES_LONGEST_FIRST = sorted(_LETTER_BY_BASE, key=len, reverse=True)
+
+
+def letter_for_filename(filename: str) -> str | None:
+    """The letter an image is named after by its clip's base name (baa.png, baa_2.png), or None."""
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    base_name = next((b for b in _BASE_NAMES_LONGEST_FIRST if stem == b or stem.startswith(b + '_')), None)
+    return _LETTER_BY_BASE.get(base_name)
+
+# =======================================================
+# AUDIO ASSET INDEX (clips scanned, read and Base64-encoded once)
+# =======================================================
+@dataclass(frozen=True)
+class AudioAsset:
+    path: str
+    data: bytes
+    base64_data: str
+    digest: str
+    size_bytes: int
+    encode_ms: float
+
+    @property
+    def fingerprinted_name(self) -> str:
+        # Content hash in the file name lets the browser cache the clip forever
+        stem, ext = os.path.splitext(os.path.basename(self.path))
+        return f"{stem}.{self.digest}{ext}"
+
+
+def load_audio_asset(full_path: str) -> AudioAsset:
+    start = time.perf_counter()
+    with open(full_path, "rb") as f:
+        audio_bytes = f.read()
+    audio_base64 = base64.b64encode(audio_bytes).decode()
+    encode_ms = (time.perf_counter() - start) * 1000
+    digest = hashlib.sha256(audio_bytes).hexdigest()[:12]
+    return AudioAsset(full_path, audio_bytes, audio_base64, digest, len(audio_bytes), encode_ms)
+
+
+@dataclass(frozen=True)
+class AudioIndex:
+    """Immutable letter -> clip index; lookups are plain dict hits with no filesystem access."""
+    by_letter: Mapping[str, AudioAsset]
+    by_name: Mapping[str, AudioAsset]  # fingerprinted file name -> clip (static server)
+    missing_letters: tuple[str, ...]
+    extra_files: tuple[str, ...]
+
+
+def build_audio_index(folder: str = AUDIO_FOLDER) -> AudioIndex:
+    """
+    Scans the audio folder a single time, loads every clip and checks that each of
+    the 36 letters has one. Letters without a clip and clips without a letter are reported.
+    """
+    filenames = sorted(f for f in os.listdir(folder) if f.endswith('.mp4'))
+    assets_by_file = {f: load_audio_asset(os.path.join(folder, f)) for f in filenames}
+
+    by_letter = {}
+    for letter, base_name in LETTER_TO_AUDIO_BASE.items():
+        asset = assets_by_file.get(base_name + '.mp4')
+        if asset is not None:
+            by_letter[letter] = asset
+
+    mapped_files = {base_name + '.mp4' for base_name in LETTER_TO_AUDIO_BASE.values()}
+    return AudioIndex(
+        by_letter=MappingProxyType(by_letter),
+        by_name=MappingProxyType({a.fingerprinted_name: a for a in assets_by_file.values()}),
+        missing_letters=tuple(l for l in LETTER_TO_AUDIO_BASE if l not in by_letter),
+        extra_files=tuple(f for f in filenames if f not in mapped_files),
+    )
+
+
+# (file name, modification time in ns, size) of every clip: changes on any add, remove,
+# rename or in-place overwrite, which the folder's own mtime does not
+FolderSignature = tuple[tuple[str, int, int], ...]
+
+
+def audio_folder_signature(folder: str) -> FolderSignature:
+    signature = []
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if entry.name.endswith('.mp4'):
+                stat = entry.stat()
+                signature.append((entry.name, stat.st_mtime_ns, stat.st_size))
+    return tuple(sorted(signature))
+
+
+@cached_resource(max_entries=1)
+def load_audio_index(folder: str, signature: FolderSignature) -> AudioIndex:
+    index = build_audio_index(folder)
+    if index.missing_letters:
+        logger.warning("Audio folder %s has no clip for: %s", folder, " ".join(index.missing_letters))
+    if index.extra_files:
+        logger.warning("Audio folder %s has unmapped clips: %s", folder, ", ".join(index.extra_files))
+    return index
+
+
+# folder -> (monotonic time of the last check, folder signature at that check)
+_audio_folder_checks: dict[str, tuple[float, FolderSignature]] = {}
+
+
+def get_audio_index(folder: str = AUDIO_FOLDER) -> AudioIndex:
+    """
+    Hot-reload hook: the clips' names, modification times and sizes are the cache key,
+    so adding, removing, renaming or overwriting a clip rebuilds the index. The folder is
+    checked at most once every AUDIO_RELOAD_SECONDS; lookups in between touch no files.
+    """
+    now = time.monotonic()
+    checked = _audio_folder_checks.get(folder)
+    if checked is None or now - checked[0] >= AUDIO_RELOAD_SECONDS:
+        checked = (now, audio_folder_signature(folder))
+        _audio_folder_checks[folder] = checked
+    return load_audio_index(folder, checked[1])
+
+
+def get_audio_asset(letter: str) -> AudioAsset | None:
+    return get_audio_index().by_letter.get(normalize_letter(letter))
+
+
+def get_audio_filename(letter: str) -> str | None:
+    """
+    Maps the Arabic letter identified through pattern matching to the correct .mp4 audio file path.
+    """
+    asset = get_audio_asset(letter)
+    return asset.path if asset is not None else None
+
+# =======================================================
+# STATIC AUDIO SERVER (browser-cacheable clip URLs)
+# =======================================================
+# A single "first-last", "first-" or suffix "-length" byte range
+_BYTE_RANGE = re.compile(r'bytes=([0-9]*)-([0-9]*)')
+
+
+def _requested_range(range_header: str | None, size: int) -> tuple[int, int] | None:
+    """
+    (start, end) of the byte range asked for, start past end when it is unsatisfiable.
+    None for no range or a malformed or multi-range one, which are ignored so that the
+    whole clip is sent (RFC 9110, section 14.2).
+    """
+    match = _BYTE_RANGE.fullmatch(range_header or '')
+    if match is None or not any(match.groups()):
+        return None
+    first, last = match.groups()
+    if not first:
+        return max(size - int(last), 0), size - 1
+    start = int(first)
+    if not last:
+        return start, size - 1
+    # A last byte before the first is invalid, not unsatisfiable
+    return None if int(last) < start else (start, min(int(last), size - 1))
+
+
+def clip_response(asset: AudioAsset | None, if_none_match: str | None = None,
+                  range_header: str | None = None) -> tuple[int, list[tuple[str, str]], bytes]:
+    """
+    Status, headers and body for a clip request: immutable cache headers, ETag
+    revalidation and single byte ranges (media elements, Safari in particular, ask for them).
+    Shared by the static sidecar and the HTTP API.
+    """
+    if asset is None:
+        return 404, [('Content-Length', '0')], b''
+
+    etag = f'"{asset.digest}"'
+    headers = [
+        ('Cache-Control', 'public, max-age=31536000, immutable'),
+        ('ETag', etag),
+        ('Access-Control-Allow-Origin', '*'),
+    ]
+    if if_none_match == etag:
+        return 304, headers + [('Content-Length', '0')], b''
+
+    body, status = asset.data, 200
+    requested = _requested_range(range_header, asset.size_bytes)
+    if requested is not None:
+        start, end = requested
+        if start > end:
+            return 416, [('Content-Range', f"bytes */{asset.size_bytes}"), ('Content-Length', '0')], b''
+        body, status = asset.data[start:end + 1], 206
+        headers.append(('Content-Range', f"bytes {start}-{end}/{asset.size_bytes}"))
+
+    headers += [('Content-Type', 'audio/mp4'), ('Accept-Ranges', 'bytes'), ('Content-Length', str(len(body)))]
+    return status, headers, body
+
+
+class AudioStaticHandler(BaseHTTPRequestHandler):
+    """
+    Serves the in-memory clips at /sounds/<name>.<digest>.mp4 with immutable cache
+    headers, so the browser downloads each clip once and replays it from its cache.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        asset = self.server.assets_by_name.get(self.path.split('?', 1)[0].removeprefix('/sounds/'))
+        status, headers, body = clip_response(asset, self.headers.get('If-None-Match'), self.headers.get('Range'))
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@cached_resource
+def start_audio_static_server(port: int = AUDIO_STATIC_PORT) -> ThreadingHTTPServer:
+    """
+    Starts the static clip server in a daemon thread once per process.
+    """
+    server = ThreadingHTTPServer(('0.0.0.0', port), AudioStaticHandler)
+    server.daemon_threads = True
+    server.assets_by_name = {}
+    server.base_url = (AUDIO_STATIC_BASE_URL or f"http://localhost:{port}").rstrip('/') + "/sounds/"
+    threading.Thread(target=server.serve_forever, name="audio-static-server", daemon=True).start()
+    return server
+
+
+def get_audio_static_url(asset: AudioAsset) -> str:
+    server = start_audio_static_server()
+    # Serve from the current (possibly hot-reloaded) index
+    server.assets_by_name = get_audio_index().by_name
+    return server.base_url + asset.fingerprinted_name
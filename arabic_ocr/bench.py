@@ -0,0 +1,328 @@
+"""
+Per-stage benchmark of the recognition pipeline, against a local stub model server.
+
+    python -m arabic_ocr.bench -o bench.json -c 1,4,16 -n 200
+    python -m arabic_ocr.bench -o after.json --compare bench.json
+
+Stages: decode_preprocess, serialize, model_call, model_stream_answer (streamed call
+closed once the letter and confidence are in), parse, audio_lookup, audio_base64_encode, audio_embed
+and end_to_end. For every stage and concurrency
+level it reports p50/p95/p99 latency and throughput; a separate sequential pass under
+tracemalloc reports peak and retained memory per operation.
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable
+
+import httpx
+from google.genai import types
+
+from .audio import LETTER_TO_AUDIO_BASE, get_audio_asset, get_audio_index
+from .client import build_genai_client, run_sync
+from .config import MODEL_NAME, MODEL_PROFILE, PREPROCESS_ENABLED, PREPROCESS_FORMAT, PREPROCESS_MAX_SIDE
+from .engines import StreamReader, build_generation_config, parse_model_answer
+from .loadgen import folder_images, percentile, synthetic_images
+from .preprocessing import preprocess_image
+from .prompts import RECOGNITION_PROMPT
+
+
+@dataclass
+class Stage:
+    """One pipeline stage: exactly one of run (sync) or run_async, called with an op index."""
+    name: str
+    run: Callable[[int], object] | None = None
+    run_async: Callable[[int], object] | None = None
+
+
+# =======================================================
+# STUB SERVER (a separate process, so it does not share our GIL or allocations)
+# =======================================================
+def start_stub_server(latency: str, replay: str | None = None) -> tuple[subprocess.Popen, str]:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+    command = [sys.executable, "-m", "arabic_ocr.mock_server", "--port", str(port), "--latency", latency]
+    if replay:
+        command += ["--replay", replay]
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 15
+    while True:
+        try:
+            httpx.get(f"{url}/stats", timeout=1)
+            return process, url
+        except httpx.HTTPError:
+            if time.monotonic() > deadline or process.poll() is not None:
+                process.kill()
+                raise RuntimeError("stub model server did not start")
+            time.sleep(0.1)
+
+
+# =======================================================
+# STAGES
+# =======================================================
+def build_stages(images: list[tuple[bytes, str]], stub_url: str) -> list[Stage]:
+    client = build_genai_client(stub_url)
+    generation_config = build_generation_config()
+    preprocessed = [preprocess_image(data, mime) for data, mime in images]
+    parts = [types.Part.from_bytes(data=p.image_bytes, mime_type=p.mime_type) for p in preprocessed]
+    letters = list(LETTER_TO_AUDIO_BASE)
+    responses = [
+        json.dumps({"candidates": [{"content": {"role": "model", "parts": [{"text": json.dumps(
+            {"letter": letter, "confidence": 0.9, "alternatives": [{"letter": letters[i - 1], "confidence": 0.05}]},
+            ensure_ascii=False)}]}, "finishReason": "STOP"}]}, ensure_ascii=False).encode()
+        for i, letter in enumerate(letters)
+    ]
+    assets = [asset for asset in map(get_audio_asset, letters) if asset is not None]
+
+    def decode_preprocess(i):
+        data, mime = images[i % len(images)]
+        return preprocess_image(data, mime)
+
+    def serialize(i):
+        p = preprocessed[i % len(preprocessed)]
+        content = types.Content(role="user", parts=RECOGNITION_PROMPT.contents(
+            types.Part.from_bytes(data=p.image_bytes, mime_type=p.mime_type)
+        ))
+        return json.dumps({"contents": [content.model_dump(mode="json", by_alias=True, exclude_none=True)]}).encode()
+
+    async def model_call(i):
+        return await client.aio.models.generate_content(
+            model=MODEL_NAME, contents=RECOGNITION_PROMPT.contents(parts[i % len(parts)]), config=generation_config
+        )
+
+    async def model_stream_answer(i):
+        reader = StreamReader()
+        stream = await client.aio.models.generate_content_stream(
+            model=MODEL_NAME, contents=RECOGNITION_PROMPT.contents(parts[i % len(parts)]), config=generation_config
+        )
+        try:
+            async for chunk in stream:
+                if reader.feed(chunk):
+                    break
+        finally:
+            await stream.aclose()
+        return reader.answer
+
+    def parse(i):
+        body = responses[i % len(responses)]
+        return parse_model_answer(types.GenerateContentResponse.model_validate(json.loads(body)).text)
+
+    def audio_lookup(i):
+        return get_audio_asset(letters[i % len(letters)])
+
+    def audio_base64_encode(i):
+        # Paid once per clip when the audio index loads
+        return base64.b64encode(assets[i % len(assets)].data).decode('ascii')
+
+    def audio_embed(i):
+        # Paid per page render: the data URI built from the pre-encoded clip
+        return f"data:audio/mp4;base64,{assets[i % len(assets)].base64_data}"
+
+    async def end_to_end(i):
+        data, mime = images[i % len(images)]
+        p = await asyncio.to_thread(preprocess_image, data, mime)
+        response = await client.aio.models.generate_content(
+            model=MODEL_NAME,
+            contents=RECOGNITION_PROMPT.contents(types.Part.from_bytes(data=p.image_bytes, mime_type=p.mime_type)),
+            config=generation_config,
+        )
+        asset = get_audio_asset(parse_model_answer(response.text)[0])
+        return f"data:audio/mp4;base64,{asset.base64_data}" if asset else None
+
+    stages = [
+        Stage("decode_preprocess", run=decode_preprocess),
+        Stage("serialize", run=serialize),
+        Stage("model_call", run_async=model_call),
+        Stage("model_stream_answer", run_async=model_stream_answer),
+        Stage("parse", run=parse),
+        Stage("audio_lookup", run=audio_lookup),
+    ]
+    if assets:
+        stages += [Stage("audio_base64_encode", run=audio_base64_encode), Stage("audio_embed", run=audio_embed)]
+    stages.append(Stage("end_to_end", run_async=end_to_end))
+    return stages
+
+
+# =======================================================
+# MEASUREMENT
+# =======================================================
+def _timed(func: Callable[[int], object], latencies: list[float]) -> Callable[[int], None]:
+    def call(i):
+        start = time.perf_counter()
+        func(i)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return call
+
+
+async def _gather_limited(func, ops: int, concurrency: int, latencies: list[float]):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def call(i):
+        async with semaphore:
+            start = time.perf_counter()
+            await func(i)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    await asyncio.gather(*(call(i) for i in range(ops)))
+
+
+def measure_latency(stage: Stage, ops: int, concurrency: int, warmup: int) -> dict:
+    latencies: list[float] = []
+    if stage.run is not None:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(stage.run, range(warmup)))
+            started = time.perf_counter()
+            list(pool.map(_timed(stage.run, latencies), range(ops)))
+            elapsed = time.perf_counter() - started
+    else:
+        run_sync(_gather_limited(stage.run_async, warmup, concurrency, []), timeout=None)
+        started = time.perf_counter()
+        run_sync(_gather_limited(stage.run_async, ops, concurrency, latencies), timeout=None)
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "ops": ops,
+        "throughput_ops_s": round(ops / elapsed, 2) if elapsed else None,
+        "latency_ms": {q: round(percentile(latencies, int(q[1:])), 4) for q in ("p50", "p95", "p99")},
+        "mean_ms": round(sum(latencies) / len(latencies), 4),
+    }
+
+
+def measure_allocations(stage: Stage, ops: int) -> dict:
+    """Sequential ops under tracemalloc: peak above the starting point, and bytes left behind."""
+    tracemalloc.start()
+    try:
+        baseline, _ = tracemalloc.get_traced_memory()
+        peak = 0
+        for i in range(ops):
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            if stage.run is not None:
+                stage.run(i)
+            else:
+                run_sync(stage.run_async(i), timeout=None)
+            _, op_peak = tracemalloc.get_traced_memory()
+            peak = max(peak, op_peak - before)
+        retained, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"ops": ops, "peak_bytes_per_op": peak, "retained_bytes_per_op": round((retained - baseline) / ops)}
+
+
+def run_benchmark(stages: list[Stage], ops: int, levels: list[int], warmup: int, alloc_ops: int,
+                  only: set[str] | None = None) -> dict:
+    results = {}
+    for stage in stages:
+        if only and stage.name not in only:
+            continue
+        print(f"{stage.name} ...", file=sys.stderr)
+        results[stage.name] = {
+            "kind": "sync" if stage.run is not None else "async",
+            "concurrency": {str(level): measure_latency(stage, ops, level, warmup) for level in levels},
+            "allocations": measure_allocations(stage, alloc_ops),
+        }
+    return results
+
+
+def _git_revision() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(baseline: dict, current: dict) -> list[str]:
+    """Lines with the p50 and throughput change of every stage/concurrency in both runs."""
+    lines = []
+    for name, stage in current["stages"].items():
+        for level, now in stage["concurrency"].items():
+            before = baseline.get("stages", {}).get(name, {}).get("concurrency", {}).get(level)
+            if not before:
+                continue
+            p50_before, p50_now = before["latency_ms"]["p50"], now["latency_ms"]["p50"]
+            tput_before, tput_now = before["throughput_ops_s"], now["throughput_ops_s"]
+            lines.append(
+                f"{name:<20} c={level:<3} p50 {p50_before:>9.3f} -> {p50_now:>9.3f} ms "
+                f"({(p50_now / p50_before - 1) * 100 if p50_before else 0:+.0f}%)  "
+                f"throughput {tput_before:>9.1f} -> {tput_now:>9.1f} ops/s"
+            )
+    return lines
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(prog="python -m arabic_ocr.bench", description="Recognition pipeline benchmark")
+    parser.add_argument("-o", "--output", default="bench.json", help="result file (default: bench.json)")
+    parser.add_argument("-n", "--ops", type=int, default=200, help="timed operations per stage and concurrency level")
+    parser.add_argument("-c", "--concurrency", default="1,4,16", help="comma-separated concurrency levels")
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--alloc-ops", type=int, default=20, help="operations in the tracemalloc pass")
+    parser.add_argument("--images", help="folder of letter images (default: synthetic glyphs)")
+    parser.add_argument("--distinct", type=int, default=20, help="number of synthetic images")
+    parser.add_argument("--stub-latency", default="constant:0",
+                        help="latency model of the stub server (see arabic_ocr.mock_server)")
+    parser.add_argument("--stub-url", help="use an already running stub server instead of starting one")
+    parser.add_argument("--stage", action="append", help="only run this stage (repeatable)")
+    parser.add_argument("--compare", help="earlier result file to compare against")
+    args = parser.parse_args(argv)
+
+    levels = [int(c) for c in args.concurrency.split(',') if c]
+    images = folder_images(args.images) if args.images else synthetic_images(args.distinct)
+    get_audio_index()
+
+    process = None
+    stub_url = args.stub_url
+    if not stub_url:
+        process, stub_url = start_stub_server(args.stub_latency)
+    try:
+        stages = build_stages(images, stub_url)
+        results = run_benchmark(stages, args.ops, levels, args.warmup, args.alloc_ops,
+                                set(args.stage) if args.stage else None)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "git_revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "model": MODEL_NAME,
+            "model_profile": MODEL_PROFILE,
+            "prompt_version": RECOGNITION_PROMPT.key,
+            "preprocess": {"enabled": PREPROCESS_ENABLED, "max_side": PREPROCESS_MAX_SIDE,
+                           "format": PREPROCESS_FORMAT},
+            "images": len(images),
+            "stub_latency": args.stub_latency if not args.stub_url else None,
+            "ops": args.ops,
+            "concurrency_levels": levels,
+        },
+        "stages": results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"Wrote {args.output}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            print("\n".join(compare(json.load(f), report)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Content-addressed recognition cache: an in-memory LRU in front of an optional SQLite file.
+"""
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from .config import (
+    MODEL_NAME,
+    RECOGNITION_CACHE_DB,
+    RECOGNITION_CACHE_MAX_ROWS,
+    RECOGNITION_CACHE_SIZE,
+    RECOGNITION_CACHE_TTL_SECONDS,
+)
+from .prompts import RECOGNITION_PROMPT
+from .resources import cached_resource
+
+# =======================================================
+# RECOGNITION CACHE (content-addressed on the image bytes)
+# =======================================================
+def recognition_cache_key(image_bytes: bytes, model: str = MODEL_NAME,
+                          prompt_version: str = RECOGNITION_PROMPT.key) -> str:
+    """
+    Hashes the image together with the model name and prompt key (version and text
+    digest), so changing either one never serves an answer produced under the old settings.
+    """
+    digest = hashlib.sha256()
+    digest.update(model.encode())
+    digest.update(b"\0")
+    digest.update(prompt_version.encode())
+    digest.update(b"\0")
+    digest.update(image_bytes)
+    return digest.hexdigest()
+
+
+class RecognitionCache:
+    """
+    Two-tier cache of recognized letters: an in-memory LRU in front of an optional
+    SQLite file. Both tiers expire entries after a TTL; the disk tier is also
+    trimmed to a maximum number of rows (oldest first). The tiers have separate locks,
+    so a memory lookup never waits for a disk query or commit.
+    """
+    # Disk eviction runs every N writes instead of on every insert
+    EVICT_EVERY = 100
+
+    def __init__(self, max_entries: int, db_path: str | None = None,
+                 ttl_seconds: float = RECOGNITION_CACHE_TTL_SECONDS,
+                 max_rows: int = RECOGNITION_CACHE_MAX_ROWS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_rows = max_rows
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._memory: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self._writes = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS recognitions ("
+                "key TEXT PRIMARY KEY, letter TEXT NOT NULL, stored_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS recognitions_stored_at ON recognitions (stored_at)")
+            self._db.commit()
+
+    def get(self, key: str) -> str | None:
+        letter = self._memory_get(key)
+        if letter is None and self._db is not None:
+            letter = self._disk_get(key)
+        if letter is None:
+            self._count_miss()
+        return letter
+
+    async def get_async(self, key: str) -> str | None:
+        """Same as get, for the shared event loop: the disk tier is queried in a worker thread."""
+        letter = self._memory_get(key)
+        if letter is None and self._db is not None:
+            letter = await asyncio.to_thread(self._disk_get, key)
+        if letter is None:
+            self._count_miss()
+        return letter
+
+    def put(self, key: str, letter: str):
+        now = time.time()
+        with self._lock:
+            self._remember(key, letter, now)
+        if self._db is not None:
+            self._disk_put(key, letter, now)
+
+    async def put_async(self, key: str, letter: str):
+        """Same as put, for the shared event loop: the disk write and commit run in a worker thread."""
+        now = time.time()
+        with self._lock:
+            self._remember(key, letter, now)
+        if self._db is not None:
+            await asyncio.to_thread(self._disk_put, key, letter, now)
+
+    def _memory_get(self, key: str) -> str | None:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            letter, stored_at = entry
+            if now - stored_at > self.ttl_seconds:
+                del self._memory[key]
+                return None
+            self._memory.move_to_end(key)
+            self.memory_hits += 1
+            return letter
+
+    def _disk_get(self, key: str) -> str | None:
+        now = time.time()
+        with self._db_lock:
+            row = self._db.execute("SELECT letter, stored_at FROM recognitions WHERE key = ?", (key,)).fetchone()
+        if row is None or now - row[1] > self.ttl_seconds:
+            return None
+        with self._lock:
+            self._remember(key, row[0], row[1])
+            self.disk_hits += 1
+        return row[0]
+
+    def _disk_put(self, key: str, letter: str, now: float):
+        with self._db_lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO recognitions (key, letter, stored_at) VALUES (?, ?, ?)",
+                (key, letter, now),
+            )
+            self._writes += 1
+            if self._writes % self.EVICT_EVERY == 0:
+                self._evict_disk(now)
+            self._db.commit()
+
+    def _count_miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def _remember(self, key: str, letter: str, stored_at: float):
+        self._memory[key] = (letter, stored_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self, now: float):
+        self._db.execute("DELETE FROM recognitions WHERE stored_at < ?", (now - self.ttl_seconds,))
+        self._db.execute(
+            "DELETE FROM recognitions WHERE key IN ("
+            "SELECT key FROM recognitions ORDER BY stored_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_rows,),
+        )
+
+    @property
+    def hits(self) -> int:
+        return self.memory_hits + self.disk_hits
+
+
+@cached_resource
+def get_recognition_cache() -> RecognitionCache:
+    return RecognitionCache(RECOGNITION_CACHE_SIZE, RECOGNITION_CACHE_DB or None)
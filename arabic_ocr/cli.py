@@ -0,0 +1,194 @@
+"""
+Headless batch recognizer: recognizes every image in a directory and writes JSONL or CSV.
+
+    python -m arabic_ocr path/to/images -o results.jsonl -j 16 --resume
+"""
+import argparse
+import asyncio
+import csv
+import json
+import os
+import sys
+import time
+
+from .admission import set_session_id
+from .audio import get_audio_filename
+from .client import run_sync
+from .config import BATCH_CONCURRENCY, METRICS_TEXTFILE, RECOGNITION_TIMEOUT_SECONDS
+from .metrics import write_metrics_textfile
+from .recognition import recognize_image_async
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp')
+RESULT_FIELDS = ["path", "letter", "confidence", "engine", "audio_clip", "elapsed_ms", "error"]
+MIME_TYPES = {'.png': 'image/png', '.jpg': 'image/jpeg', '.jpeg': 'image/jpeg', '.webp': 'image/webp'}
+
+
+def find_images(folder: str, recursive: bool) -> list[str]:
+    """Image paths relative to the folder, sorted so runs and checkpoints are reproducible."""
+    paths = []
+    for root, dirnames, filenames in os.walk(folder):
+        if not recursive:
+            dirnames.clear()
+        for filename in filenames:
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                paths.append(os.path.relpath(os.path.join(root, filename), folder))
+    return sorted(paths)
+
+
+def read_checkpoint(output: str, output_format: str) -> set[str]:
+    """Paths already recognized successfully in a previous run of the same output file."""
+    if not os.path.exists(output):
+        return set()
+    done = set()
+    with open(output, newline='', encoding='utf-8') as f:
+        if output_format == 'csv':
+            rows = csv.DictReader(f)
+        else:
+            rows = (json.loads(line) for line in f if line.strip())
+        for row in rows:
+            if not row.get("error"):
+                done.add(row["path"])
+    return done
+
+
+class ResultWriter:
+    """Appends one row per finished image and flushes it, so an interrupted run can resume."""
+
+    def __init__(self, output: str, output_format: str, append: bool):
+        new_file = not append or not os.path.exists(output) or os.path.getsize(output) == 0
+        self.output_format = output_format
+        self.file = open(output, 'a' if append else 'w', newline='', encoding='utf-8')
+        self.csv_writer = None
+        if output_format == 'csv':
+            self.csv_writer = csv.DictWriter(self.file, fieldnames=RESULT_FIELDS)
+            if new_file:
+                self.csv_writer.writeheader()
+
+    def write(self, row: dict):
+        if self.csv_writer is not None:
+            self.csv_writer.writerow(row)
+        else:
+            self.file.write(json.dumps(row, ensure_ascii=False) + '\n')
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class Progress:
+    """Single-line progress and throughput readout on stderr."""
+
+    def __init__(self, total: int, stream=sys.stderr):
+        self.total = total
+        self.stream = stream
+        self.done = 0
+        self.errors = 0
+        self.started = time.perf_counter()
+        self._last_draw = 0.0
+
+    def update(self, error: bool):
+        self.done += 1
+        self.errors += int(error)
+        now = time.perf_counter()
+        if now - self._last_draw >= 0.2 or self.done == self.total:
+            self._last_draw = now
+            self.draw()
+
+    @property
+    def rate(self) -> float:
+        elapsed = time.perf_counter() - self.started
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+    def draw(self):
+        rate = self.rate
+        eta = (self.total - self.done) / rate if rate else 0
+        self.stream.write(
+            f"\r[{self.done}/{self.total}] {rate:.1f} letters/s  "
+            f"ETA {int(eta // 60):02d}:{int(eta % 60):02d}  errors: {self.errors}"
+        )
+        self.stream.flush()
+
+
+async def recognize_folder(folder: str, paths: list[str], writer: ResultWriter,
+                           concurrency: int, timeout: float) -> Progress:
+    queue: asyncio.Queue[str] = asyncio.Queue()
+    for path in paths:
+        queue.put_nowait(path)
+    progress = Progress(len(paths))
+
+    async def worker():
+        while True:
+            try:
+                path = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            start = time.perf_counter()
+            row = dict.fromkeys(RESULT_FIELDS, None)
+            row["path"] = path
+            try:
+                image_bytes = await asyncio.to_thread(_read_file, os.path.join(folder, path))
+                mime_type = MIME_TYPES[os.path.splitext(path)[1].lower()]
+                result = await asyncio.wait_for(recognize_image_async(image_bytes, mime_type), timeout)
+                row.update(
+                    letter=result.letter,
+                    confidence=result.confidence,
+                    engine=result.engine,
+                    audio_clip=os.path.basename(get_audio_filename(result.letter) or '') or None,
+                )
+            except Exception as e:
+                row["error"] = str(e) or type(e).__name__
+            row["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 1)
+            writer.write(row)
+            progress.update(row["error"] is not None)
+
+    await asyncio.gather(*(worker() for _ in range(max(concurrency, 1))))
+    return progress
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m arabic_ocr", description=__doc__.strip().splitlines()[0])
+    parser.add_argument("folder", help="directory of letter images")
+    parser.add_argument("-o", "--output", default="results.jsonl", help="result file (default: results.jsonl)")
+    parser.add_argument("-f", "--format", choices=["jsonl", "csv"],
+                        help="output format (default: from the output extension)")
+    parser.add_argument("-j", "--concurrency", type=int, default=BATCH_CONCURRENCY,
+                        help=f"images recognized at the same time (default: {BATCH_CONCURRENCY})")
+    parser.add_argument("--timeout", type=float, default=RECOGNITION_TIMEOUT_SECONDS,
+                        help="per-image timeout in seconds")
+    parser.add_argument("-r", "--recursive", action="store_true", help="include subdirectories")
+    parser.add_argument("--resume", action="store_true",
+                        help="skip images already recognized in the output file and append to it")
+    args = parser.parse_args(argv)
+
+    output_format = args.format or ('csv' if args.output.lower().endswith('.csv') else 'jsonl')
+    paths = find_images(args.folder, args.recursive)
+    if args.resume:
+        done = read_checkpoint(args.output, output_format)
+        paths = [p for p in paths if p not in done]
+        print(f"Resuming: {len(done)} already done, {len(paths)} remaining.", file=sys.stderr)
+    if not paths:
+        print("Nothing to recognize.", file=sys.stderr)
+        return 0
+
+    set_session_id("cli")
+    writer = ResultWriter(args.output, output_format, append=args.resume)
+    try:
+        progress = run_sync(
+            recognize_folder(args.folder, paths, writer, args.concurrency, args.timeout), timeout=None
+        )
+    finally:
+        writer.close()
+        if METRICS_TEXTFILE:
+            write_metrics_textfile(METRICS_TEXTFILE)
+    print(f"\nRecognized {progress.done - progress.errors}/{progress.total} images "
+          f"at {progress.rate:.1f} letters/s -> {args.output}", file=sys.stderr)
+    return 1 if progress.errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
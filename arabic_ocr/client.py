@@ -0,0 +1,148 @@
+"""
+The shared processing-engine client (one keep-alive connection pool per process) and
+the shared event loop that async model calls run on.
+"""
+import asyncio
+import concurrent.futures
+import threading
+from typing import Callable, Coroutine
+
+import httpx
+from google import genai
+from google.genai import types
+
+from .config import (
+    API_KEY,
+    GEMINI_BASE_URL,
+    HTTP_KEEPALIVE_EXPIRY_SECONDS,
+    HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    RECOGNITION_TIMEOUT_SECONDS,
+)
+from .resources import cached_resource
+
+# =======================================================
+# SHARED CLIENT: one connection pool per server process
+# =======================================================
+class ConnectionStats:
+    """
+    Thread-safe counters that show how often pooled HTTP connections are reused.
+    A request that never opens a new TCP connection was served by a kept-alive one.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.new_connections = 0
+
+    def on_request(self, request: httpx.Request):
+        # httpx event hook: attach httpcore's trace callback to every outgoing request
+        with self._lock:
+            self.requests += 1
+        request.extensions["trace"] = self._trace
+
+    def _trace(self, event_name: str, info: dict):
+        if event_name == "connection.connect_tcp.complete":
+            with self._lock:
+                self.new_connections += 1
+
+    async def on_request_async(self, request: httpx.Request):
+        # Same hook for the async client, whose trace callback must be a coroutine
+        with self._lock:
+            self.requests += 1
+        request.extensions["trace"] = self._trace_async
+
+    async def _trace_async(self, event_name: str, info: dict):
+        self._trace(event_name, info)
+
+    @property
+    def reused_connections(self) -> int:
+        return max(self.requests - self.new_connections, 0)
+
+    @property
+    def reuse_ratio(self) -> float:
+        return self.reused_connections / self.requests if self.requests else 0.0
+
+
+@cached_resource
+def get_connection_stats() -> ConnectionStats:
+    return ConnectionStats()
+
+
+@cached_resource
+def get_genai_client() -> genai.Client:
+    """
+    Builds the processing-engine client once per server process and shares it across
+    sessions and reruns, so the HTTP connection pool (TLS + keep-alive) is reused.
+    """
+    return build_genai_client(GEMINI_BASE_URL)
+
+
+def build_genai_client(base_url: str = '') -> genai.Client:
+    """A client with the production pool settings, optionally against another endpoint."""
+    stats = get_connection_stats()
+    limits = httpx.Limits(
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY_SECONDS,
+    )
+    http_options = types.HttpOptions(
+        client_args={
+            "limits": limits,
+            "event_hooks": {"request": [stats.on_request]},
+        },
+        # An explicit httpx transport keeps client.aio on httpx (not aiohttp) with the same pool settings
+        async_client_args={
+            "transport": httpx.AsyncHTTPTransport(limits=limits),
+            "event_hooks": {"request": [stats.on_request_async]},
+        },
+    )
+    if base_url:
+        # A local stand-in server accepts any key
+        http_options.base_url = base_url
+        return genai.Client(api_key=API_KEY or "local-mock", http_options=http_options)
+    return genai.Client(api_key=API_KEY, http_options=http_options)
+
+# =======================================================
+# SHARED EVENT LOOP (async model calls behind a sync facade)
+# =======================================================
+@cached_resource
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """
+    Runs one asyncio loop in a daemon thread per server process. Every session's model
+    calls are awaited on it, so many in-flight requests share a single OS thread.
+    """
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="recognition-event-loop", daemon=True).start()
+    return loop
+
+
+def submit_async(coro: Coroutine, timeout: float | None = RECOGNITION_TIMEOUT_SECONDS) -> concurrent.futures.Future:
+    """
+    Schedules a coroutine on the shared loop with a per-call timeout. Cancelling the
+    returned future cancels the coroutine (and its HTTP request) on the loop.
+    """
+    if timeout is not None:
+        coro = asyncio.wait_for(coro, timeout)
+    return asyncio.run_coroutine_threadsafe(coro, get_event_loop())
+
+
+def run_sync(coro: Coroutine, timeout: float | None = RECOGNITION_TIMEOUT_SECONDS,
+             on_wait: Callable[[], None] | None = None, poll_seconds: float = 0.25):
+    """
+    Sync facade: blocks the calling script thread until the coroutine finishes.
+    on_wait, when given, is called every poll_seconds meanwhile (e.g. to show progress).
+    """
+    future = submit_async(coro, timeout)
+    try:
+        if on_wait is not None:
+            while True:
+                try:
+                    return future.result(timeout=poll_seconds)
+                except concurrent.futures.TimeoutError:
+                    # Also the type of the coroutine's own timeout, which finishes the future
+                    if future.done():
+                        raise
+                    on_wait()
+        return future.result()
+    except BaseException:
+        # e.g. the Streamlit script was stopped by a rerun: do not leave the call running
+        future.cancel()
+        raise
@@ -0,0 +1,160 @@
+"""
+Configuration for the Arabic letter recognizer, read once from the environment (.env supported).
+"""
+import os
+
+from dotenv import load_dotenv
+
+# --- CONFIGURATION AND SETUP ---
+
+# 1. Load Environment Variables (API Key)
+load_dotenv()
+API_KEY = os.getenv('GEMINI_API_KEY')
+
+# Repository root: default folders below are resolved from here, not from the working directory
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Define the absolute path to the unified MP4 audio folder
+AUDIO_FOLDER = os.getenv('AUDIO_FOLDER', os.path.join(PROJECT_ROOT, "sounds"))
+# Seconds between checks of the audio folder for added, removed or replaced clips (hot reload)
+AUDIO_RELOAD_SECONDS = float(os.getenv('AUDIO_RELOAD_SECONDS', '5'))
+
+# Audio delivery: "inline" embeds Base64 in the page, "static" serves fingerprinted clips by URL
+AUDIO_DELIVERY = os.getenv('AUDIO_DELIVERY', 'inline')
+AUDIO_STATIC_PORT = int(os.getenv('AUDIO_STATIC_PORT', '8502'))
+# Public URL prefix for the static clips (e.g. behind a reverse proxy); defaults to localhost
+AUDIO_STATIC_BASE_URL = os.getenv('AUDIO_STATIC_BASE_URL', '')
+
+# Latency profiles for the model call: model tier, thinking budget (tokens, 0 = no
+# thinking, -1 = as much as the model decides), output token cap (thinking included) and
+# temperature; None keeps the model's default. MODEL_PROFILE picks one; "baseline" is the
+# original call (dynamic thinking) and stays the default until python -m arabic_ocr.evaluate
+# on a labeled set shows another profile keeps its accuracy
+MODEL_PROFILES = {
+    'baseline': {'model': 'gemini-2.5-flash', 'thinking_budget': -1, 'max_output_tokens': None, 'temperature': None},
+    'fast': {'model': 'gemini-2.5-flash-lite', 'thinking_budget': 0, 'max_output_tokens': 128, 'temperature': 0.0},
+    'balanced': {'model': 'gemini-2.5-flash', 'thinking_budget': 0, 'max_output_tokens': 128, 'temperature': 0.0},
+    'accurate': {'model': 'gemini-2.5-flash', 'thinking_budget': 1024, 'max_output_tokens': 1152, 'temperature': 0.2},
+}
+MODEL_PROFILE = os.getenv('MODEL_PROFILE', 'baseline')
+if MODEL_PROFILE not in MODEL_PROFILES:
+    raise ValueError(f"MODEL_PROFILE must be one of {', '.join(MODEL_PROFILES)}, not {MODEL_PROFILE!r}")
+
+# Model used by the processing engine
+MODEL_NAME = MODEL_PROFILES[MODEL_PROFILE]['model']
+
+# Point the client at another endpoint, e.g. the local mock server (python -m arabic_ocr.mock_server)
+GEMINI_BASE_URL = os.getenv('GEMINI_BASE_URL', '')
+# Append every real model answer to this JSONL file, for replay by the mock server
+GEMINI_RECORD_PATH = os.getenv('GEMINI_RECORD_PATH', '')
+
+# Bump whenever the recognition prompt (arabic_ocr/prompts.py) changes so cached answers
+# are not reused; cache keys also carry a digest of the prompt text
+PROMPT_VERSION = 'v3'
+# Explicit upstream context cache for the instructions, so they are billed and processed
+# once per TTL instead of on every call (the model must accept a prompt of this size)
+CONTEXT_CACHE_ENABLED = os.getenv('CONTEXT_CACHE_ENABLED', '0') == '1'
+CONTEXT_CACHE_TTL_SECONDS = int(os.getenv('CONTEXT_CACHE_TTL_SECONDS', '3600'))
+
+# Recognition cache: in-memory LRU tier + optional on-disk SQLite tier (empty path = memory only)
+RECOGNITION_CACHE_SIZE = int(os.getenv('RECOGNITION_CACHE_SIZE', '1024'))
+RECOGNITION_CACHE_DB = os.getenv('RECOGNITION_CACHE_DB', '')
+RECOGNITION_CACHE_TTL_SECONDS = float(os.getenv('RECOGNITION_CACHE_TTL_SECONDS', str(7 * 24 * 3600)))
+RECOGNITION_CACHE_MAX_ROWS = int(os.getenv('RECOGNITION_CACHE_MAX_ROWS', '100000'))
+
+# Near-duplicate cache: re-captures of an already recognized glyph (perceptual hash,
+# "phash" or "dhash", within PHASH_MAX_DISTANCE differing bits, and the same dots and
+# hamzas) skip the model. Off by default: a near match is answered without the model
+PHASH_ENABLED = os.getenv('PHASH_ENABLED', '0') == '1'
+PHASH_ALGORITHM = os.getenv('PHASH_ALGORITHM', 'phash')
+PHASH_MAX_DISTANCE = int(os.getenv('PHASH_MAX_DISTANCE', '4'))
+PHASH_CACHE_SIZE = int(os.getenv('PHASH_CACHE_SIZE', '200000'))
+
+# Image preprocessing before upload: crop to the glyph, grayscale, downscale, re-encode
+PREPROCESS_ENABLED = os.getenv('PREPROCESS_ENABLED', '1') == '1'
+PREPROCESS_MAX_SIDE = int(os.getenv('PREPROCESS_MAX_SIDE', '384'))
+PREPROCESS_FORMAT = os.getenv('PREPROCESS_FORMAT', 'PNG').upper()  # PNG or WEBP
+
+# Local quality gate: blank, low-contrast, blurred or cluttered captures are rejected
+# before any engine sees them (off until its thresholds are checked on real captures).
+# Contrast and ink are measured against the paper around each pixel, so uneven lighting
+# does not count; sharpness is the Laplacian variance of the glyph crop scaled to 128 px
+# with ink at 0 and paper at 1; a letter has at most 4 components (ث/ش)
+QUALITY_GATE_ENABLED = os.getenv('QUALITY_GATE_ENABLED', '0') == '1'
+QUALITY_MIN_CONTRAST = float(os.getenv('QUALITY_MIN_CONTRAST', '40'))  # gray levels, ink vs local paper
+QUALITY_MIN_INK = float(os.getenv('QUALITY_MIN_INK', '0.0002'))  # share of the frame
+QUALITY_MAX_INK = float(os.getenv('QUALITY_MAX_INK', '0.45'))
+QUALITY_MIN_SHARPNESS = float(os.getenv('QUALITY_MIN_SHARPNESS', '0.001'))
+QUALITY_MAX_COMPONENTS = int(os.getenv('QUALITY_MAX_COMPONENTS', '5'))
+
+# Recognition engine: "gemini", "cascade" (local classifier, then the model), "local"
+# or "stub" (fixed-latency fake model for load tests). The local classifier needs
+# templates: python -m arabic_ocr.templates --font <Arabic font> or --samples <folder>
+RECOGNITION_ENGINE = os.getenv('RECOGNITION_ENGINE', 'gemini')
+STUB_LATENCY_MS = float(os.getenv('STUB_LATENCY_MS', '300'))
+# Folder of reference glyphs for the local classifier (e.g. templates/baa_1.png)
+LOCAL_TEMPLATES_DIR = os.getenv('LOCAL_TEMPLATES_DIR', os.path.join(PROJECT_ROOT, 'templates'))
+LOCAL_GLYPH_SIZE = int(os.getenv('LOCAL_GLYPH_SIZE', '32'))
+# Local answers at or above this confidence skip the remote model
+LOCAL_CONFIDENCE_THRESHOLD = float(os.getenv('LOCAL_CONFIDENCE_THRESHOLD', '0.9'))
+# Add each remote answer to the local templates (saved under LOCAL_TEMPLATES_DIR/learned)
+LOCAL_ENGINE_LEARN = os.getenv('LOCAL_ENGINE_LEARN', '0') == '1'
+
+# Remote calls go through the async client on a shared event loop (0 = blocking client)
+ASYNC_RECOGNITION = os.getenv('ASYNC_RECOGNITION', '1') == '1'
+RECOGNITION_TIMEOUT_SECONDS = float(os.getenv('RECOGNITION_TIMEOUT_SECONDS', '30'))
+# Stream the model's answer and answer once its letter and confidence are in (the
+# alternatives that follow are read in the background, keeping the connection pooled)
+STREAM_RECOGNITION = os.getenv('STREAM_RECOGNITION', '0') == '1'
+
+# Retries of transient model errors (429, 5xx, network): attempts, full-jitter backoff
+# base/cap, and the budget after which no new retry is started (keep it below the timeout)
+MODEL_RETRY_ATTEMPTS = int(os.getenv('MODEL_RETRY_ATTEMPTS', '4'))
+MODEL_RETRY_BASE_SECONDS = float(os.getenv('MODEL_RETRY_BASE_SECONDS', '0.5'))
+MODEL_RETRY_MAX_SECONDS = float(os.getenv('MODEL_RETRY_MAX_SECONDS', '8'))
+MODEL_RETRY_DEADLINE_SECONDS = float(os.getenv('MODEL_RETRY_DEADLINE_SECONDS', '20'))
+
+# Model answers (JSON: letter, confidence, top-3 alternatives) below this confidence are
+# asked again up to MODEL_REASK_ATTEMPTS more times, are not cached, and in cascade
+# mode lose to a more confident local guess; malformed answers are asked again too
+MODEL_MIN_CONFIDENCE = float(os.getenv('MODEL_MIN_CONFIDENCE', '0.6'))
+MODEL_REASK_ATTEMPTS = int(os.getenv('MODEL_REASK_ATTEMPTS', '1'))
+# Re-asks sample at least at this temperature: at a profile's temperature 0 the same
+# request would only return the same answer
+MODEL_REASK_TEMPERATURE = float(os.getenv('MODEL_REASK_TEMPERATURE', '0.7'))
+
+# Circuit breaker: open after this many consecutive transient failures (0 = off) and
+# fail fast (or use the local engine in cascade mode) for BREAKER_RESET_SECONDS
+BREAKER_FAILURE_THRESHOLD = int(os.getenv('BREAKER_FAILURE_THRESHOLD', '5'))
+BREAKER_RESET_SECONDS = float(os.getenv('BREAKER_RESET_SECONDS', '30'))
+
+# Admission control for the shared API key: requests per minute (0 = no limit) with a
+# burst allowance, calls in flight at once, and the longest a call may wait in the queue
+MODEL_RATE_LIMIT_RPM = float(os.getenv('MODEL_RATE_LIMIT_RPM', '0'))
+MODEL_RATE_LIMIT_BURST = int(os.getenv('MODEL_RATE_LIMIT_BURST', '5'))
+MODEL_MAX_IN_FLIGHT = int(os.getenv('MODEL_MAX_IN_FLIGHT', '16'))
+ADMISSION_MAX_WAIT_SECONDS = float(os.getenv('ADMISSION_MAX_WAIT_SECONDS', '15'))
+
+# Batch mode: maximum images per batch and how many are recognized at the same time
+BATCH_MAX_ITEMS = int(os.getenv('BATCH_MAX_ITEMS', '200'))
+BATCH_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', '8'))
+# ZIP uploads with more entries, or more uncompressed image bytes, are rejected unread
+BATCH_MAX_ARCHIVE_ENTRIES = int(os.getenv('BATCH_MAX_ARCHIVE_ENTRIES', '1000'))
+BATCH_MAX_ARCHIVE_BYTES = int(os.getenv('BATCH_MAX_ARCHIVE_BYTES', str(100 * 1024 * 1024)))
+
+# Connection pool settings for the shared client (keep-alive between letters)
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv('HTTP_MAX_KEEPALIVE_CONNECTIONS', '20'))
+HTTP_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv('HTTP_KEEPALIVE_EXPIRY_SECONDS', '120'))
+
+# HTTP JSON API (arabic_ocr.api); API_PORT also starts it inside the Streamlit process
+API_HOST = os.getenv('API_HOST', '0.0.0.0')
+API_PORT = int(os.getenv('API_PORT', '0'))
+API_MAX_BODY_BYTES = int(os.getenv('API_MAX_BODY_BYTES', str(10 * 1024 * 1024)))
+
+# Metrics (Prometheus text format): a /metrics endpoint on METRICS_PORT (0 = off) and/or
+# a text file rewritten every METRICS_TEXTFILE_SECONDS (empty path = off)
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
+METRICS_TEXTFILE = os.getenv('METRICS_TEXTFILE', '')
+METRICS_TEXTFILE_SECONDS = float(os.getenv('METRICS_TEXTFILE_SECONDS', '15'))
+# Show the last request's stage breakdown on the page (also enabled by ?debug=1)
+DEBUG_PANEL = os.getenv('DEBUG_PANEL', '0') == '1'
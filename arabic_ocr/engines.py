@@ -0,0 +1,724 @@
+"""
+Recognition engines: the remote model, the offline template classifier and the cascade
+that asks the local engine first.
+"""
+import asyncio
+import functools
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
+from typing import Protocol
+
+import numpy as np
+from google.genai import errors, types
+
+from .admission import get_admission_controller
+from .audio import LETTER_TO_AUDIO_BASE, letter_for_filename, normalize_letter
+from .client import get_genai_client, run_sync
+from .config import (
+    API_KEY,
+    ASYNC_RECOGNITION,
+    GEMINI_BASE_URL,
+    LOCAL_CONFIDENCE_THRESHOLD,
+    LOCAL_ENGINE_LEARN,
+    LOCAL_GLYPH_SIZE,
+    LOCAL_TEMPLATES_DIR,
+    MODEL_MIN_CONFIDENCE,
+    MODEL_PROFILE,
+    MODEL_PROFILES,
+    MODEL_REASK_ATTEMPTS,
+    MODEL_REASK_TEMPERATURE,
+    PREPROCESS_ENABLED,
+    RECOGNITION_ENGINE,
+    STREAM_RECOGNITION,
+    STUB_LATENCY_MS,
+)
+from .metrics import REGISTRY, StageTimer
+from .preprocessing import crop_to_ink, decode_grayscale, get_preprocess_stats, normalize_glyph, preprocess_image
+from .prompts import RECOGNITION_PROMPT, PromptTemplate, get_prompt_context_cache, get_prompt_usage
+from .recording import get_response_recorder
+from .resilience import call_with_retry, call_with_retry_async
+from .resources import cached_resource
+
+logger = logging.getLogger(__name__)
+
+MODEL_REASKS = REGISTRY.counter(
+    "arabic_ocr_model_reasks_total", "Model calls repeated for a malformed or low-confidence answer.", ("reason",)
+)
+FIRST_TOKEN_SECONDS = REGISTRY.histogram(
+    "arabic_ocr_model_first_token_seconds", "Time from a streamed model call to its first chunk."
+)
+STREAM_TOTAL_SECONDS = REGISTRY.histogram(
+    "arabic_ocr_model_stream_total_seconds",
+    "Time from a streamed model call to its last chunk (read in the background after an early answer)."
+)
+STREAM_EARLY_EXITS = REGISTRY.counter(
+    "arabic_ocr_model_stream_early_exits_total",
+    "Streamed model calls answered as soon as their letter and confidence arrived."
+)
+
+# =======================================================
+# RECOGNITION ENGINES (local classifier first, processing engine as fallback)
+# =======================================================
+class MissingApiKeyError(RuntimeError):
+    pass
+
+
+@dataclass(frozen=True)
+class Recognition:
+    letter: str
+    confidence: float | None  # None when the engine gives no score
+    engine: str
+    # Runner-up letters with their confidences, best first (model answers only)
+    alternatives: tuple[tuple[str, float], ...] = ()
+    # True when a low-confidence local answer was used because the remote engine failed
+    degraded: bool = False
+    # True when this request shared the result of an identical request already in flight
+    coalesced: bool = False
+    # True when the engine was asked for a confidence (schema answers): a missing one is doubtful
+    confidence_expected: bool = False
+    # Stage -> milliseconds spent inside the engine (and cache), for per-request breakdowns
+    timings_ms: dict[str, float] = field(default_factory=dict, compare=False)
+
+    @property
+    def low_confidence(self) -> bool:
+        if self.confidence is None:
+            return self.confidence_expected
+        return self.confidence < MODEL_MIN_CONFIDENCE
+
+    @property
+    def cacheable(self) -> bool:
+        """Fit to answer later requests for the same glyph: neither a fallback nor a doubtful guess."""
+        return not self.degraded and not self.low_confidence
+
+
+class RecognitionEngine(Protocol):
+    name: str
+
+    def recognize(self, image_bytes: bytes, mime_type: str) -> Recognition:
+        """Identifies the letter in the image; raises on failure."""
+        ...
+
+    async def recognize_async(self, image_bytes: bytes, mime_type: str) -> Recognition:
+        """Same as recognize, awaited on the shared event loop."""
+        ...
+
+
+# =======================================================
+# STRUCTURED MODEL ANSWER (JSON constrained to the 36 letters)
+# =======================================================
+LETTERS = tuple(LETTER_TO_AUDIO_BASE)
+_LETTER_SET = frozenset(LETTERS)
+_CONFIDENCE_SCHEMA = types.Schema(type=types.Type.NUMBER, minimum=0, maximum=1)
+_LETTER_SCHEMA = types.Schema(type=types.Type.STRING, enum=list(LETTERS))
+
+RESPONSE_SCHEMA = types.Schema(
+    type=types.Type.OBJECT,
+    properties={
+        "letter": _LETTER_SCHEMA,
+        "confidence": _CONFIDENCE_SCHEMA,
+        "alternatives": types.Schema(
+            type=types.Type.ARRAY,
+            max_items=3,
+            items=types.Schema(
+                type=types.Type.OBJECT,
+                properties={"letter": _LETTER_SCHEMA, "confidence": _CONFIDENCE_SCHEMA},
+                required=["letter", "confidence"],
+            ),
+        ),
+    },
+    required=["letter", "confidence", "alternatives"],
+    property_ordering=["letter", "confidence", "alternatives"],
+)
+
+
+def build_generation_config(profile: str = MODEL_PROFILE) -> types.GenerateContentConfig:
+    """The JSON answer schema plus the latency profile's thinking budget, output cap and temperature."""
+    settings = MODEL_PROFILES[profile]
+    return types.GenerateContentConfig(
+        response_mime_type="application/json",
+        response_schema=RESPONSE_SCHEMA,
+        thinking_config=types.ThinkingConfig(thinking_budget=settings['thinking_budget']),
+        max_output_tokens=settings['max_output_tokens'],
+        temperature=settings['temperature'],
+    )
+
+
+def reask_generation_config(config: types.GenerateContentConfig) -> types.GenerateContentConfig:
+    """The config of a re-ask: sampled at MODEL_REASK_TEMPERATURE or above, so it can answer differently."""
+    if config.temperature is None or config.temperature >= MODEL_REASK_TEMPERATURE:
+        return config
+    return config.model_copy(update={"temperature": MODEL_REASK_TEMPERATURE})
+
+
+class InvalidModelAnswer(ValueError):
+    """The model's reply is not one of the 36 letters (malformed JSON, unknown letter, bad confidence)."""
+
+
+def parse_model_answer(text: str | None) -> tuple[str, float | None, tuple[tuple[str, float], ...]]:
+    """
+    (letter, confidence, alternatives) from the model's JSON reply. A bare letter (replies
+    recorded before the schema) is accepted without a confidence. Raises InvalidModelAnswer.
+    """
+    text = (text or '').strip()
+    if not text.startswith('{'):
+        letter = normalize_letter(text)
+        if letter in _LETTER_SET:
+            return letter, None, ()
+        raise InvalidModelAnswer(f"not a letter: {text[:40]!r}")
+    try:
+        answer = json.loads(text)
+        letter = normalize_letter(answer["letter"])
+        confidence = float(answer["confidence"])
+        candidates = answer.get("alternatives") or ()
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        raise InvalidModelAnswer(f"malformed answer: {text[:80]!r}") from e
+    if letter not in _LETTER_SET or not 0.0 <= confidence <= 1.0:
+        raise InvalidModelAnswer(f"invalid answer: {text[:80]!r}")
+
+    # Alternatives are advisory: invalid entries are skipped instead of failing the answer
+    alternatives = []
+    for candidate in candidates:
+        try:
+            alternative, score = normalize_letter(candidate["letter"]), float(candidate["confidence"])
+        except (KeyError, TypeError, ValueError, AttributeError):
+            continue
+        if alternative in _LETTER_SET and alternative != letter and 0.0 <= score <= 1.0:
+            alternatives.append((alternative, score))
+    alternatives.sort(key=lambda pair: pair[1], reverse=True)
+    return letter, confidence, tuple(alternatives[:3])
+
+
+# The schema orders "letter" then "confidence" first, so the first match is the answer, not
+# an alternative; the confidence is settled once a delimiter follows its number
+_ANSWER_FIELDS = re.compile(r'"letter"\s*:\s*"([^"]*)"\s*,\s*"confidence"\s*:\s*([-+0-9.eE]+)\s*[,}]')
+
+
+def streamed_answer(text: str) -> str | None:
+    """
+    The answer a partial JSON reply already settles, as JSON with its letter and
+    confidence (only the alternatives are still to come), else None.
+    """
+    match = _ANSWER_FIELDS.search(text)
+    if match is None:
+        return None
+    try:
+        confidence = float(match.group(2))
+    except ValueError:
+        return None
+    letter = normalize_letter(match.group(1))
+    if letter not in _LETTER_SET or not 0.0 <= confidence <= 1.0:
+        return None
+    return json.dumps({"letter": letter, "confidence": confidence}, ensure_ascii=False)
+
+
+@dataclass(frozen=True)
+class ModelReply:
+    text: str | None
+    usage: types.GenerateContentResponseUsageMetadata | None
+
+
+class StreamReader:
+    """
+    Accumulates a streamed answer. Reading can stop as soon as the answer is complete
+    or its letter and confidence are in; the time to the first chunk and to the answer
+    are recorded.
+    """
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.text = ''
+        self.usage = None
+        self.answer: str | None = None
+        self.first_token_ms: float | None = None
+        self.answer_ms: float | None = None
+
+    def _elapsed_ms(self) -> float:
+        return round((time.perf_counter() - self.start) * 1000, 3)
+
+    def feed(self, chunk: types.GenerateContentResponse) -> bool:
+        """Adds a chunk; True once the rest of the stream is not needed."""
+        if self.first_token_ms is None:
+            self.first_token_ms = self._elapsed_ms()
+            FIRST_TOKEN_SECONDS.observe(self.first_token_ms / 1000)
+        self.text += chunk.text or ''
+        self.usage = chunk.usage_metadata or self.usage
+        if self.text.rstrip().endswith('}'):
+            try:
+                parse_model_answer(self.text)
+            except InvalidModelAnswer:
+                pass
+            else:
+                self.answer_ms = self._elapsed_ms()
+                return True
+        self.answer = streamed_answer(self.text)
+        if self.answer is not None:
+            self.answer_ms = self._elapsed_ms()
+            return True
+        return False
+
+    def reply(self, timer: StageTimer, cancelled: bool) -> ModelReply:
+        """
+        The answer read so far (letter and confidence without the alternatives when
+        reading stopped early), with the time to first chunk and to the answer nested
+        under the current stage.
+        """
+        timer.include({"first_token": self.first_token_ms or 0.0, "answer_received": self.answer_ms or 0.0})
+        if cancelled and self.answer is not None:
+            STREAM_EARLY_EXITS.inc()
+            return ModelReply(self.answer, self.usage)
+        return ModelReply(self.text, self.usage)
+
+    def finished(self):
+        """The last chunk is in: records the total time, to set against the time to the answer."""
+        STREAM_TOTAL_SECONDS.observe(time.perf_counter() - self.start)
+
+
+# Streams answered early are read to the end by these few shared threads (blocking calls)
+STREAM_DRAIN_WORKERS = 4
+
+
+@cached_resource
+def get_stream_drainer() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=STREAM_DRAIN_WORKERS, thread_name_prefix="stream-drain")
+
+
+def _drain(stream, reader: StreamReader):
+    """Reads the rest of a stream already answered, so its connection goes back to the pool."""
+    try:
+        for _ in stream:
+            pass
+    except Exception:
+        return
+    else:
+        reader.finished()
+    finally:
+        stream.close()
+
+
+async def _drain_async(stream, reader: StreamReader):
+    try:
+        async for _ in stream:
+            pass
+    except Exception:
+        return
+    else:
+        reader.finished()
+    finally:
+        await stream.aclose()
+
+
+# Background drains, referenced until done so they are not garbage collected mid-stream
+_DRAINING: set[asyncio.Task] = set()
+
+
+# Errors of a call referencing a context cache that expired or was deleted upstream
+CONTEXT_CACHE_GONE = (400, 403, 404)
+
+
+class GeminiEngine:
+    """Remote recognition through Google's multimodal models, with one latency profile."""
+    name = "gemini"
+
+    def __init__(self, profile: str = MODEL_PROFILE, prompt: PromptTemplate = RECOGNITION_PROMPT):
+        self.profile = profile
+        self.model = MODEL_PROFILES[profile]['model']
+        self.prompt = prompt
+        self.generation_config = build_generation_config(profile)
+        self.reask_config = reask_generation_config(self.generation_config)
+        # Re-ask or not -> (context cache name, generation config referencing it) for the current cache
+        self._cached_configs: dict[bool, tuple[str, types.GenerateContentConfig]] = {}
+
+    def _image_part(self, image_bytes: bytes, mime_type: str, timer: StageTimer | None = None) -> types.Part:
+        if PREPROCESS_ENABLED:
+            with (timer or StageTimer()).stage("preprocess"):
+                preprocessed = preprocess_image(image_bytes, mime_type)
+            get_preprocess_stats().record_preprocess(preprocessed)
+            image_bytes, mime_type = preprocessed.image_bytes, preprocessed.mime_type
+        return types.Part.from_bytes(data=image_bytes, mime_type=mime_type)
+
+    def _request(self, image_part: types.Part, cache_name: str | None,
+                 reask: bool = False) -> tuple[list, types.GenerateContentConfig]:
+        """Contents and config of a call: the instructions inline, or referenced from the context cache."""
+        config = self.reask_config if reask else self.generation_config
+        if cache_name is None:
+            return self.prompt.contents(image_part), config
+        cached = self._cached_configs.get(reask)
+        if cached is None or cached[0] != cache_name:
+            cached = self._cached_configs[reask] = (
+                cache_name, config.model_copy(update={"cached_content": cache_name})
+            )
+        return [image_part], cached[1]
+
+    def recognize(self, image_bytes: bytes, mime_type: str) -> Recognition:
+        if ASYNC_RECOGNITION:
+            return run_sync(self.recognize_async(image_bytes, mime_type))
+
+        if not API_KEY and not GEMINI_BASE_URL:
+            raise MissingApiKeyError("GEMINI_API_KEY is not set")
+
+        # Note: The underlying function uses Google's multimodal models.
+        client = get_genai_client()
+        timer = StageTimer()
+        image_part = self._image_part(image_bytes, mime_type, timer)
+
+        admission = get_admission_controller()
+        context_cache = get_prompt_context_cache()
+
+        def attempt(reask: bool):
+            cache_name = None
+            if context_cache is not None:
+                with timer.stage("context_cache"):
+                    cache_name = context_cache.name(client, self.model)
+            # Every attempt, retries included, passes the shared rate limit
+            with timer.stage("admission_wait"):
+                admission.acquire_blocking()
+            try:
+                with timer.stage("model_call"):
+                    try:
+                        return self._call(client, *self._request(image_part, cache_name, reask), timer)
+                    except errors.ClientError as e:
+                        if cache_name is None or e.code not in CONTEXT_CACHE_GONE:
+                            raise
+                        # The context cache expired or was deleted upstream: send the instructions inline
+                        context_cache.invalidate(self.model)
+                        return self._call(client, *self._request(image_part, None, reask), timer)
+            finally:
+                admission.release_threadsafe()
+
+        # Transient errors (429, 5xx, network) are retried within the deadline budget;
+        # malformed or low-confidence answers are asked again
+        best = None
+        for ask in range(1 + MODEL_REASK_ATTEMPTS):
+            reply = call_with_retry(functools.partial(attempt, ask > 0))
+            best = self._keep_best(best, image_part, reply, timer)
+            if not self._reask(best, ask):
+                break
+        return self._best_or_raise(best)
+
+    def _call(self, client, contents: list, config: types.GenerateContentConfig, timer: StageTimer) -> ModelReply:
+        if not STREAM_RECOGNITION:
+            response = client.models.generate_content(model=self.model, contents=contents, config=config)
+            return ModelReply(response.text, response.usage_metadata)
+        reader = StreamReader()
+        stream = client.models.generate_content_stream(model=self.model, contents=contents, config=config)
+        try:
+            for chunk in stream:
+                if reader.feed(chunk):
+                    # Closing mid-stream would drop the connection: the rest is read off the request path
+                    get_stream_drainer().submit(_drain, stream, reader)
+                    return reader.reply(timer, cancelled=True)
+        except BaseException:
+            stream.close()
+            raise
+        stream.close()
+        reader.finished()
+        return reader.reply(timer, cancelled=False)
+
+    async def recognize_async(self, image_bytes: bytes, mime_type: str) -> Recognition:
+        if not API_KEY and not GEMINI_BASE_URL:
+            raise MissingApiKeyError("GEMINI_API_KEY is not set")
+
+        client = get_genai_client()
+        timer = StageTimer()
+        # Decoding and re-encoding is CPU work: keep it off the shared event loop
+        image_part = await asyncio.to_thread(self._image_part, image_bytes, mime_type, timer)
+
+        admission = get_admission_controller()
+        context_cache = get_prompt_context_cache()
+
+        async def attempt(reask: bool):
+            cache_name = None
+            if context_cache is not None:
+                with timer.stage("context_cache"):
+                    cache_name = await context_cache.name_async(client, self.model)
+            with timer.stage("admission_wait"):
+                await admission.acquire()
+            try:
+                with timer.stage("model_call"):
+                    try:
+                        return await self._call_async(client, *self._request(image_part, cache_name, reask), timer)
+                    except errors.ClientError as e:
+                        if cache_name is None or e.code not in CONTEXT_CACHE_GONE:
+                            raise
+                        context_cache.invalidate(self.model)
+                        return await self._call_async(client, *self._request(image_part, None, reask), timer)
+            finally:
+                admission.release()
+
+        best = None
+        for ask in range(1 + MODEL_REASK_ATTEMPTS):
+            reply = await call_with_retry_async(functools.partial(attempt, ask > 0))
+            best = self._keep_best(best, image_part, reply, timer)
+            if not self._reask(best, ask):
+                break
+        return self._best_or_raise(best)
+
+    async def _call_async(self, client, contents: list, config: types.GenerateContentConfig,
+                          timer: StageTimer) -> ModelReply:
+        if not STREAM_RECOGNITION:
+            response = await client.aio.models.generate_content(model=self.model, contents=contents, config=config)
+            return ModelReply(response.text, response.usage_metadata)
+        reader = StreamReader()
+        stream = await client.aio.models.generate_content_stream(model=self.model, contents=contents, config=config)
+        try:
+            async for chunk in stream:
+                if reader.feed(chunk):
+                    task = asyncio.get_running_loop().create_task(_drain_async(stream, reader))
+                    _DRAINING.add(task)
+                    task.add_done_callback(_DRAINING.discard)
+                    return reader.reply(timer, cancelled=True)
+        except BaseException:
+            await stream.aclose()
+            raise
+        await stream.aclose()
+        reader.finished()
+        return reader.reply(timer, cancelled=False)
+
+    def _finish(self, image_part: types.Part, reply: ModelReply, timer: StageTimer) -> Recognition:
+        latency_ms = timer.timings_ms["model_call"]
+        get_preprocess_stats().record_model_call(PREPROCESS_ENABLED, latency_ms)
+        get_prompt_usage().record(reply.usage)
+        recorder = get_response_recorder()
+        if recorder is not None:
+            usage = reply.usage.model_dump(exclude_none=True) if reply.usage else None
+            recorder.record(image_part.inline_data.data, self.model, self.prompt.key, reply.text, latency_ms, usage)
+        with timer.stage("parse"):
+            letter, confidence, alternatives = parse_model_answer(reply.text)
+        return Recognition(letter, confidence, self.name, alternatives=alternatives,
+                           confidence_expected=self.generation_config.response_schema is not None,
+                           timings_ms=timer.timings_ms)
+
+    def _keep_best(self, best: Recognition | None, image_part: types.Part, reply: ModelReply,
+                   timer: StageTimer) -> Recognition | None:
+        """The more confident of the earlier answer and this one; None while no answer was valid."""
+        try:
+            result = self._finish(image_part, reply, timer)
+        except InvalidModelAnswer:
+            return best
+        if best is None or (result.confidence or 0.0) > (best.confidence or 0.0):
+            return result
+        return best
+
+    @staticmethod
+    def _reask(best: Recognition | None, ask: int) -> bool:
+        """Whether to ask again after answer number `ask` (0-based)."""
+        reason = "invalid" if best is None else "low_confidence" if best.low_confidence else None
+        if reason is None or ask >= MODEL_REASK_ATTEMPTS:
+            return False
+        MODEL_REASKS.inc(reason=reason)
+        return True
+
+    @staticmethod
+    def _best_or_raise(best: Recognition | None) -> Recognition:
+        if best is None:
+            raise InvalidModelAnswer("the model gave no valid letter")
+        return best
+
+
+def glyph_vector(image_bytes: bytes, size: int = LOCAL_GLYPH_SIZE) -> np.ndarray:
+    """
+    Normalized glyph bitmap used by the local classifier: ink cropped, dark-on-light,
+    padded to a square, resized to size x size, then mean-centered and L2-normalized
+    so that a dot product between two vectors is their cosine similarity.
+    """
+    ink = 1.0 - np.asarray(normalize_glyph(image_bytes, size), dtype=np.float32).ravel() / 255.0
+    ink -= ink.mean()
+    norm = np.linalg.norm(ink)
+    return ink / norm if norm > 0 else ink
+
+
+class TemplateEngine:
+    """
+    Offline CPU classifier: nearest-template matching over normalized glyph bitmaps.
+    Templates are PNG/JPG files in LOCAL_TEMPLATES_DIR named after the audio clip of
+    their letter (e.g. baa.png, baa_2.png), plus any learned from confirmed remote answers.
+    """
+    name = "local"
+    # Softmax temperature turning per-letter cosine similarities into a confidence
+    TEMPERATURE = 0.05
+
+    def __init__(self, templates_dir: str | None = None):
+        self.templates_dir = templates_dir
+        self._lock = threading.Lock()
+        self._vectors: list[np.ndarray] = []
+        self._labels: list[str] = []
+        self._matrix: np.ndarray | None = None
+        if templates_dir and os.path.isdir(templates_dir):
+            self._load_templates(templates_dir)
+
+    def _load_templates(self, folder: str):
+        for root, _, filenames in os.walk(folder):
+            for filename in sorted(filenames):
+                if os.path.splitext(filename)[1].lower() not in ('.png', '.jpg', '.jpeg', '.webp'):
+                    continue
+                letter = letter_for_filename(filename)
+                if letter is None:
+                    continue
+                with open(os.path.join(root, filename), "rb") as f:
+                    self.add_template(letter, glyph_vector(f.read()))
+
+    def __len__(self) -> int:
+        return len(self._labels)
+
+    def add_template(self, letter: str, vector: np.ndarray):
+        with self._lock:
+            self._vectors.append(vector)
+            self._labels.append(normalize_letter(letter))
+            self._matrix = None
+
+    def learn(self, image_bytes: bytes, letter: str):
+        """Adds a confirmed answer as a new template (and saves it when a folder is configured)."""
+        letter = normalize_letter(letter)
+        base_name = LETTER_TO_AUDIO_BASE.get(letter)
+        if base_name is None:
+            return
+        self.add_template(letter, glyph_vector(image_bytes))
+        if self.templates_dir:
+            learned_dir = os.path.join(self.templates_dir, "learned")
+            os.makedirs(learned_dir, exist_ok=True)
+            filename = f"{base_name}_{hashlib.sha256(image_bytes).hexdigest()[:12]}.png"
+            gray, _ = crop_to_ink(decode_grayscale(image_bytes))
+            gray.save(os.path.join(learned_dir, filename))
+
+    def recognize(self, image_bytes: bytes, mime_type: str) -> Recognition:
+        timer = StageTimer()
+        with timer.stage("local_classify"):
+            letter, confidence = self._classify(image_bytes)
+        return Recognition(letter, confidence, self.name, timings_ms=timer.timings_ms)
+
+    def _classify(self, image_bytes: bytes) -> tuple[str, float]:
+        with self._lock:
+            if not self._labels:
+                raise LookupError("the local engine has no templates")
+            if self._matrix is None:
+                self._matrix = np.stack(self._vectors)
+            matrix, labels = self._matrix, list(self._labels)
+
+        similarities = matrix @ glyph_vector(image_bytes)
+        # Best similarity per letter, then a softmax across letters
+        best_by_letter: dict[str, float] = {}
+        for label, similarity in zip(labels, similarities.tolist()):
+            if similarity > best_by_letter.get(label, -1.0):
+                best_by_letter[label] = similarity
+        letters = list(best_by_letter)
+        scores = np.array([best_by_letter[l] for l in letters]) / self.TEMPERATURE
+        probabilities = np.exp(scores - scores.max())
+        probabilities /= probabilities.sum()
+        best = int(probabilities.argmax())
+        return letters[best], float(probabilities[best])
+
+    async def recognize_async(self, image_bytes: bytes, mime_type: str) -> Recognition:
+        return await asyncio.to_thread(self.recognize, image_bytes, mime_type)
+
+
+class CascadeEngine:
+    """
+    Asks the local engine first and only queries the remote engine when the local
+    confidence is below the threshold. Without network, the best local guess is used.
+    """
+    name = "cascade"
+
+    def __init__(self, local: TemplateEngine, remote: RecognitionEngine,
+                 threshold: float = LOCAL_CONFIDENCE_THRESHOLD, learn: bool = LOCAL_ENGINE_LEARN):
+        self.local = local
+        self.remote = remote
+        self.threshold = threshold
+        self.learn = learn
+
+    def _try_local(self, image_bytes: bytes, mime_type: str) -> Recognition | None:
+        try:
+            return self.local.recognize(image_bytes, mime_type)
+        except (LookupError, OSError, ValueError):
+            return None
+
+    def _accept_local(self, local_result: Recognition | None) -> bool:
+        return local_result is not None and local_result.confidence >= self.threshold
+
+    def _fallback(self, local_result: Recognition | None) -> Recognition:
+        return replace(local_result, degraded=True)
+
+    def _after_remote(self, image_bytes: bytes, local_result: Recognition | None,
+                      remote_result: Recognition) -> Recognition:
+        if self.learn and not remote_result.low_confidence:
+            self.local.learn(image_bytes, remote_result.letter)
+        if local_result is None:
+            return remote_result
+        timings_ms = {**local_result.timings_ms, **remote_result.timings_ms}
+        if remote_result.low_confidence and local_result.confidence > (remote_result.confidence or 0.0):
+            # The model is unsure and the local guess is surer: keep the local guess
+            return replace(local_result, timings_ms=timings_ms)
+        return replace(remote_result, timings_ms=timings_ms)
+
+    def recognize(self, image_bytes: bytes, mime_type: str) -> Recognition:
+        local_result = self._try_local(image_bytes, mime_type)
+        if self._accept_local(local_result):
+            return local_result
+        try:
+            remote_result = self.remote.recognize(image_bytes, mime_type)
+        except Exception:
+            if local_result is None:
+                raise
+            return self._fallback(local_result)
+        return self._after_remote(image_bytes, local_result, remote_result)
+
+    async def recognize_async(self, image_bytes: bytes, mime_type: str) -> Recognition:
+        local_result = await asyncio.to_thread(self._try_local, image_bytes, mime_type)
+        if self._accept_local(local_result):
+            return local_result
+        try:
+            remote_result = await self.remote.recognize_async(image_bytes, mime_type)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            if local_result is None:
+                raise
+            return self._fallback(local_result)
+        return await asyncio.to_thread(self._after_remote, image_bytes, local_result, remote_result)
+
+
+class StubEngine:
+    """
+    Stand-in for the remote model in load tests and benchmarks: answers after a fixed
+    latency with a letter derived from the image hash, without any network access.
+    """
+    name = "stub"
+    LETTERS = tuple(LETTER_TO_AUDIO_BASE)
+
+    def __init__(self, latency_ms: float = STUB_LATENCY_MS):
+        self.latency_ms = latency_ms
+
+    def _answer(self, image_bytes: bytes) -> Recognition:
+        digest = hashlib.sha256(image_bytes).digest()
+        return Recognition(self.LETTERS[digest[0] % len(self.LETTERS)], 1.0, self.name)
+
+    def recognize(self, image_bytes: bytes, mime_type: str) -> Recognition:
+        time.sleep(self.latency_ms / 1000)
+        return self._answer(image_bytes)
+
+    async def recognize_async(self, image_bytes: bytes, mime_type: str) -> Recognition:
+        await asyncio.sleep(self.latency_ms / 1000)
+        return self._answer(image_bytes)
+
+
+@cached_resource
+def get_recognition_engine() -> RecognitionEngine:
+    if RECOGNITION_ENGINE == 'stub':
+        return StubEngine()
+    remote = GeminiEngine()
+    if RECOGNITION_ENGINE == 'gemini':
+        return remote
+    local = TemplateEngine(LOCAL_TEMPLATES_DIR)
+    if RECOGNITION_ENGINE == 'local':
+        return local
+    if not len(local) and not LOCAL_ENGINE_LEARN:
+        # Nothing to match against and nothing to learn from: every call would go remote anyway
+        logger.warning("No templates in %s: the cascade uses the model only "
+                       "(build them with python -m arabic_ocr.templates)", LOCAL_TEMPLATES_DIR)
+        return remote
+    return CascadeEngine(local, remote)
@@ -0,0 +1,242 @@
+"""
+Accuracy, latency and token usage of the model call on a labeled set of letter images,
+per latency profile.
+
+    python -m arabic_ocr.evaluate samples/ -o profiles.json
+    python -m arabic_ocr.evaluate samples/ --profiles fast,balanced --stub --replay recordings.jsonl
+
+Images are labeled by name like the local templates (baa.png, baa_2.png) or by folder
+(baa/001.png). Each image is sent once per profile, bypassing the recognition caches,
+re-asks and admission queue, so the numbers describe the model call alone. With
+GEMINI_RECORD_PATH set the answers are recorded for later replay by the stub server.
+"""
+import argparse
+import asyncio
+import json
+import mimetypes
+import os
+import platform
+import sys
+import time
+from dataclasses import dataclass
+
+from google.genai import types
+
+from .audio import letter_for_filename
+from .bench import _git_revision, start_stub_server
+from .client import build_genai_client, run_sync
+from .config import GEMINI_BASE_URL, MODEL_PROFILE, MODEL_PROFILES, PREPROCESS_ENABLED
+from .engines import InvalidModelAnswer, build_generation_config, parse_model_answer
+from .loadgen import percentile
+from .preprocessing import preprocess_image
+from .prompts import RECOGNITION_PROMPT, PromptTemplate
+from .recording import get_response_recorder
+from .resilience import CircuitBreaker, call_with_retry_async
+
+
+@dataclass(frozen=True)
+class LabeledImage:
+    path: str
+    image_bytes: bytes
+    mime_type: str
+    letter: str
+
+
+def labeled_images(folder: str) -> list[LabeledImage]:
+    """Images under folder whose file (or parent folder) is named after a letter's clip."""
+    samples = []
+    for root, _, filenames in os.walk(folder):
+        for filename in sorted(filenames):
+            if os.path.splitext(filename)[1].lower() not in ('.png', '.jpg', '.jpeg', '.webp'):
+                continue
+            letter = letter_for_filename(filename) or letter_for_filename(os.path.basename(root))
+            if letter is None:
+                continue
+            path = os.path.join(root, filename)
+            with open(path, 'rb') as f:
+                samples.append(LabeledImage(os.path.relpath(path, folder), f.read(),
+                                            mimetypes.guess_type(filename)[0] or 'image/png', letter))
+    return sorted(samples, key=lambda sample: sample.path)
+
+
+@dataclass(frozen=True)
+class Variant:
+    """One way of calling the model: a model tier, a generation config and a prompt."""
+    name: str
+    model: str
+    config: types.GenerateContentConfig
+    prompt: PromptTemplate
+
+
+def profile_variants(profiles: list[str], prompt: PromptTemplate = RECOGNITION_PROMPT) -> list[Variant]:
+    return [Variant(name, MODEL_PROFILES[name]['model'], build_generation_config(name), prompt) for name in profiles]
+
+
+# =======================================================
+# EVALUATION
+# =======================================================
+async def evaluate_variant(client, variant: Variant, samples: list[LabeledImage], parts: list[types.Part],
+                           concurrency: int) -> dict:
+    """Sends every sample once and summarizes accuracy, latency and token usage."""
+    semaphore = asyncio.Semaphore(concurrency)
+    # Transient errors are retried, but the evaluation never trips the app's breaker
+    breaker = CircuitBreaker(failure_threshold=0)
+    recorder = get_response_recorder()
+
+    async def run_one(sample: LabeledImage, part: types.Part) -> dict:
+        latency = {}
+
+        async def attempt():
+            start = time.perf_counter()
+            response = await client.aio.models.generate_content(
+                model=variant.model, contents=variant.prompt.contents(part), config=variant.config
+            )
+            latency["ms"] = (time.perf_counter() - start) * 1000
+            return response
+
+        async with semaphore:
+            try:
+                response = await call_with_retry_async(attempt, breaker=breaker)
+            except Exception as e:
+                return {"letter": sample.letter, "error": str(e) or type(e).__name__}
+        usage = response.usage_metadata
+        if recorder is not None:
+            recorder.record(part.inline_data.data, variant.model, variant.prompt.key, response.text, latency["ms"],
+                            usage.model_dump(exclude_none=True) if usage else None)
+        row = {
+            "letter": sample.letter,
+            "latency_ms": latency["ms"],
+            "prompt_tokens": (usage and usage.prompt_token_count) or 0,
+            "output_tokens": (usage and usage.candidates_token_count) or 0,
+            "thinking_tokens": (usage and usage.thoughts_token_count) or 0,
+        }
+        try:
+            answer, confidence, _ = parse_model_answer(response.text)
+        except InvalidModelAnswer:
+            return {**row, "invalid": True}
+        return {**row, "answer": answer, "confidence": confidence}
+
+    rows = await asyncio.gather(*(run_one(sample, part) for sample, part in zip(samples, parts)))
+    return summarize(rows)
+
+
+def _round(value: float | None) -> float | None:
+    return round(value, 2) if value is not None else None
+
+
+def summarize(rows: list[dict]) -> dict:
+    answered = [row for row in rows if "error" not in row]
+    latencies = sorted(row["latency_ms"] for row in answered)
+    correct = sum(1 for row in answered if row.get("answer") == row["letter"])
+    per_letter: dict[str, dict] = {}
+    for row in rows:
+        entry = per_letter.setdefault(row["letter"], {"n": 0, "correct": 0})
+        entry["n"] += 1
+        entry["correct"] += row.get("answer") == row["letter"]
+    for entry in per_letter.values():
+        entry["accuracy"] = round(entry["correct"] / entry["n"], 4)
+
+    def mean(key: str) -> float | None:
+        return _round(sum(row[key] for row in answered) / len(answered)) if answered else None
+
+    return {
+        "n": len(rows),
+        "correct": correct,
+        "accuracy": round(correct / len(rows), 4) if rows else None,
+        "invalid": sum(1 for row in answered if row.get("invalid")),
+        "errors": len(rows) - len(answered),
+        "latency_ms": {f"p{q}": _round(percentile(latencies, q)) for q in (50, 95, 99)},
+        "mean_latency_ms": mean("latency_ms"),
+        "mean_tokens": {"prompt": mean("prompt_tokens"), "output": mean("output_tokens"),
+                        "thinking": mean("thinking_tokens")},
+        "per_letter": dict(sorted(per_letter.items())),
+    }
+
+
+def image_parts(samples: list[LabeledImage]) -> list[types.Part]:
+    """The image parts the engine would send: preprocessed once, like the engine."""
+    if PREPROCESS_ENABLED:
+        prepared = [preprocess_image(s.image_bytes, s.mime_type) for s in samples]
+        return [types.Part.from_bytes(data=p.image_bytes, mime_type=p.mime_type) for p in prepared]
+    return [types.Part.from_bytes(data=s.image_bytes, mime_type=s.mime_type) for s in samples]
+
+
+def evaluate(client, variants: list[Variant], samples: list[LabeledImage], concurrency: int = 4,
+             parts: list[types.Part] | None = None) -> dict:
+    """Results per variant name."""
+    parts = parts or image_parts(samples)
+    results = {}
+    for variant in variants:
+        print(f"{variant.name} ...", file=sys.stderr)
+        results[variant.name] = run_sync(evaluate_variant(client, variant, samples, parts, concurrency), timeout=None)
+    return results
+
+
+def format_table(results: dict) -> str:
+    lines = [f"{'variant':<16} {'accuracy':>8} {'p50 ms':>8} {'p95 ms':>8} {'prompt':>7} {'output':>7} {'think':>7}"]
+    for name, r in results.items():
+        tokens = r["mean_tokens"]
+        lines.append(
+            f"{name:<16} {r['accuracy'] or 0:>8.1%} {r['latency_ms']['p50'] or 0:>8.1f} "
+            f"{r['latency_ms']['p95'] or 0:>8.1f} {tokens['prompt'] or 0:>7.0f} {tokens['output'] or 0:>7.0f} "
+            f"{tokens['thinking'] or 0:>7.0f}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(prog="python -m arabic_ocr.evaluate",
+                                     description="Model call accuracy, latency and tokens per latency profile")
+    parser.add_argument("labeled", help="folder of labeled letter images (baa.png, baa_2.png or baa/001.png)")
+    parser.add_argument("-o", "--output", default="evaluate.json", help="result file (default: evaluate.json)")
+    parser.add_argument("--profiles", default=",".join(MODEL_PROFILES),
+                        help=f"comma-separated latency profiles (default: all; current: {MODEL_PROFILE})")
+    parser.add_argument("-c", "--concurrency", type=int, default=4)
+    parser.add_argument("--stub", action="store_true", help="start a local stub model server")
+    parser.add_argument("--stub-latency", default="replay", help="latency model of the stub server")
+    parser.add_argument("--replay", help="answers recorded with GEMINI_RECORD_PATH, replayed by the stub")
+    parser.add_argument("--stub-url", help="use an already running stub server")
+    args = parser.parse_args(argv)
+
+    profiles = [p for p in args.profiles.split(',') if p]
+    unknown = [p for p in profiles if p not in MODEL_PROFILES]
+    if unknown:
+        parser.error(f"unknown profiles: {', '.join(unknown)}")
+    samples = labeled_images(args.labeled)
+    if not samples:
+        parser.error(f"no labeled images in {args.labeled}")
+
+    process = None
+    base_url = args.stub_url or GEMINI_BASE_URL
+    if args.stub:
+        process, base_url = start_stub_server(args.stub_latency, args.replay)
+    try:
+        results = evaluate(build_genai_client(base_url), profile_variants(profiles), samples,
+                           args.concurrency)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "git_revision": _git_revision(),
+            "python": platform.python_version(),
+            "prompt_version": RECOGNITION_PROMPT.key,
+            "preprocess": PREPROCESS_ENABLED,
+            "labeled_images": len(samples),
+            "letters": len({s.letter for s in samples}),
+            "endpoint": base_url or "gemini",
+            "profiles": {name: MODEL_PROFILES[name] for name in profiles},
+        },
+        "variants": results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(format_table(results))
+    print(f"Wrote {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Load generator for the recognition API.
+
+    RECOGNITION_ENGINE=stub STUB_LATENCY_MS=300 python -m arabic_ocr.api --port 8000
+    python -m arabic_ocr.loadgen http://localhost:8000/recognize -n 1000 -c 64 --distinct 20
+
+Prints a JSON summary: throughput, latency percentiles, status codes and coalesced requests.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import time
+
+import httpx
+from PIL import Image, ImageDraw
+
+
+def percentile(sorted_values: list[float], q: float) -> float | None:
+    """Nearest-rank percentile of an already sorted list (q in 0..100)."""
+    if not sorted_values:
+        return None
+    rank = max(int(round(q / 100 * len(sorted_values))) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def synthetic_images(count: int, seed: int = 0) -> list[tuple[bytes, str]]:
+    """Distinct single-stroke glyph-like PNGs, for runs without a folder of real letters."""
+    rng = random.Random(seed)
+    images = []
+    for _ in range(count):
+        img = Image.new('L', (256, 256), 255)
+        draw = ImageDraw.Draw(img)
+        points = [(rng.randint(40, 216), rng.randint(40, 216)) for _ in range(4)]
+        draw.line(points, fill=0, width=rng.randint(6, 14))
+        buffer = io.BytesIO()
+        img.save(buffer, format='PNG')
+        images.append((buffer.getvalue(), 'image/png'))
+    return images
+
+
+def folder_images(folder: str) -> list[tuple[bytes, str]]:
+    images = []
+    for filename in sorted(os.listdir(folder)):
+        ext = os.path.splitext(filename)[1].lower()
+        if ext in ('.png', '.jpg', '.jpeg', '.webp'):
+            with open(os.path.join(folder, filename), 'rb') as f:
+                images.append((f.read(), 'image/jpeg' if ext in ('.jpg', '.jpeg') else f'image/{ext[1:]}'))
+    return images
+
+
+async def run_load(url: str, images: list[tuple[bytes, str]], requests: int, concurrency: int,
+                   timeout: float) -> dict:
+    latencies: list[float] = []
+    statuses: dict[str, int] = {}
+    coalesced = 0
+    counter = iter(range(requests))
+
+    async def worker(client: httpx.AsyncClient):
+        nonlocal coalesced
+        for i in counter:
+            image_bytes, mime_type = images[i % len(images)]
+            start = time.perf_counter()
+            try:
+                response = await client.post(url, content=image_bytes, headers={'Content-Type': mime_type})
+                status = str(response.status_code)
+                if response.status_code == 200 and response.json().get('coalesced'):
+                    coalesced += 1
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            latencies.append((time.perf_counter() - start) * 1000)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    started = time.perf_counter()
+    async with httpx.AsyncClient(limits=limits, timeout=timeout) as client:
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "distinct_images": len(images),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(requests / elapsed, 2) if elapsed else None,
+        "latency_ms": {q: round(percentile(latencies, int(q[1:])), 2) for q in ("p50", "p95", "p99")},
+        "statuses": statuses,
+        "coalesced": coalesced,
+    }
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(prog="python -m arabic_ocr.loadgen", description="Recognition API load generator")
+    parser.add_argument("url", help="e.g. http://localhost:8000/recognize")
+    parser.add_argument("-n", "--requests", type=int, default=500)
+    parser.add_argument("-c", "--concurrency", type=int, default=32)
+    parser.add_argument("--images", help="folder of letter images (default: synthetic glyphs)")
+    parser.add_argument("--distinct", type=int, default=50,
+                        help="number of distinct synthetic images; fewer means more identical requests")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args(argv)
+
+    images = folder_images(args.images) if args.images else synthetic_images(args.distinct)
+    summary = asyncio.run(run_load(args.url, images, args.requests, args.concurrency, args.timeout))
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+"""
+Process-wide metrics in the Prometheus text format, and per-request stage timing.
+
+    curl http://localhost:9464/metrics          (METRICS_PORT=9464)
+    curl http://localhost:8000/metrics          (the recognition API)
+
+METRICS_TEXTFILE additionally writes the same text to a file periodically, for the
+node_exporter textfile collector or for diffing runs.
+"""
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .config import METRICS_PORT, METRICS_TEXTFILE, METRICS_TEXTFILE_SECONDS
+from .resources import cached_resource
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = '') -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# =======================================================
+# METRIC TYPES
+# =======================================================
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: dict[tuple[str, ...], object] = {}
+
+    def _key(self, labels: dict) -> tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_sample(key, value))
+        return lines
+
+    def _render_sample(self, key, value) -> list[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                # [per-bucket counts (not cumulative), sum, count]
+                series = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def _render_sample(self, key, value) -> list[str]:
+        counts, total, count = value
+        lines, cumulative = [], 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            le = f'le="{_format_value(bound)}"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            # Re-registering returns the existing metric, so module reloads keep their series
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help_text: str, labelnames: tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name: str, help_text: str, labelnames: tuple[str, ...] = ()) -> Gauge:
+        return self._register(Gauge(name, help_text, labelnames))
+
+    def histogram(self, name: str, help_text: str, labelnames: tuple[str, ...] = (),
+                  buckets: tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "arabic_ocr_stage_duration_seconds", "Time spent in each stage of a recognition request.", ("stage",)
+)
+RECOGNITIONS = REGISTRY.counter(
+    "arabic_ocr_recognitions_total", "Recognitions answered, by the engine that answered.", ("engine",)
+)
+
+
+# =======================================================
+# PER-REQUEST STAGE TIMING
+# =======================================================
+class StageTimer:
+    """
+    Times the stages of one request. Every stage is observed in STAGE_SECONDS and kept
+    in timings_ms (in start order) for a per-request breakdown such as the debug panel.
+    """
+    def __init__(self):
+        self.timings_ms: dict[str, float] = {}
+        self.depths: dict[str, int] = {}
+        self._depth = 0
+
+    @contextmanager
+    def stage(self, name: str):
+        self.timings_ms[name] = 0.0
+        self.depths[name] = self._depth
+        self._depth += 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self._depth -= 1
+            self.timings_ms[name] = round(elapsed * 1000, 3)
+            STAGE_SECONDS.observe(elapsed, stage=name)
+
+    def include(self, timings_ms: dict[str, float]):
+        """Adds stages timed (and exported) elsewhere, nested under the current stage."""
+        for name, ms in timings_ms.items():
+            self.timings_ms[name] = ms
+            self.depths[name] = self._depth
+
+    def rows(self) -> list[tuple[str, float, int]]:
+        """(stage, milliseconds, nesting depth) in start order."""
+        return [(name, ms, self.depths.get(name, 0)) for name, ms in self.timings_ms.items()]
+
+
+# =======================================================
+# EXPORT: /metrics endpoint and text file
+# =======================================================
+def render_metrics() -> str:
+    return REGISTRY.render()
+
+
+def write_metrics_textfile(path: str):
+    """Writes atomically, so a collector never reads a half-written file."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(render_metrics())
+    os.replace(tmp_path, path)
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        if self.path.split('?', 1)[0] != '/metrics':
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        body = render_metrics().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@cached_resource
+def start_metrics_server(port: int = METRICS_PORT) -> ThreadingHTTPServer:
+    """Serves /metrics from a daemon thread of the current process (once)."""
+    server = ThreadingHTTPServer(('0.0.0.0', port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
+
+
+@cached_resource
+def start_metrics_textfile_writer(path: str = METRICS_TEXTFILE,
+                                  interval_seconds: float = METRICS_TEXTFILE_SECONDS) -> threading.Thread:
+    def write_forever():
+        while True:
+            time.sleep(interval_seconds)
+            try:
+                write_metrics_textfile(path)
+            except OSError:
+                pass
+
+    thread = threading.Thread(target=write_forever, name="metrics-textfile", daemon=True)
+    thread.start()
+    return thread
+
+
+def start_metrics_exporters():
+    """Starts whichever exporters are configured (METRICS_PORT, METRICS_TEXTFILE)."""
+    if METRICS_PORT:
+        start_metrics_server()
+    if METRICS_TEXTFILE:
+        start_metrics_textfile_writer()
@@ -0,0 +1,328 @@
+"""
+Local stand-in for the Gemini generateContent endpoint, for load tests and offline runs.
+
+    python -m arabic_ocr.mock_server --port 8765 --latency lognormal:250,0.4 \
+        --error-rate 0.02 --rpm 120 --replay recordings.jsonl
+    GEMINI_BASE_URL=http://localhost:8765 RECOGNITION_ENGINE=gemini streamlit run app.py
+
+Answers are replayed from a recording (GEMINI_RECORD_PATH) when the image was seen
+before, preferably with the same prompt text; otherwise a letter is derived from the image
+hash (as the JSON answer when the request asks for application/json, like the app's
+response schema). Latency, 5xx errors and 429 rate limiting are injected according to the options; GET /stats returns counters.
+streamGenerateContent answers as server-sent events, the JSON answer split at its
+fields: the first event after STREAM_FIRST_CHUNK_SHARE of the sampled latency.
+POST cachedContents creates a context cache; calls referencing it report its tokens as
+cachedContentTokenCount, and unknown or expired caches get 404 like the service.
+"""
+import argparse
+import base64
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .audio import LETTER_TO_AUDIO_BASE
+from .recording import Recordings, image_digest, load_recordings, prompt_digest
+
+GENERATE_PATH = re.compile(r"^/[^/]+/models/(?P<model>[^/:]+):(?P<method>generateContent|streamGenerateContent)$")
+CACHED_CONTENTS_PATH = re.compile(r"^/[^/]+/cachedContents$")
+# Rough token estimates for answers that were not recorded
+CHARS_PER_TOKEN = 4
+IMAGE_TOKENS = 258
+# Share of a streamed answer's latency spent before its first event (time to first token)
+STREAM_FIRST_CHUNK_SHARE = 0.4
+# Streamed answers are cut before each JSON member ('{"letter": "ب", ' | '"confidence": ...')
+STREAM_SPLIT = re.compile(r'(?<=, )(?=")')
+
+
+class LatencyModel:
+    """
+    Parses "constant:MS", "uniform:LOW,HIGH", "lognormal:MEDIAN,SIGMA" or "replay"
+    (the latency recorded with each answer, constant:0 when unknown).
+    """
+    def __init__(self, spec: str, rng: random.Random):
+        self.rng = rng
+        self.kind, _, params = spec.partition(':')
+        self.params = [float(p) for p in params.split(',') if p]
+        if self.kind not in ('constant', 'uniform', 'lognormal', 'replay'):
+            raise ValueError(f"unknown latency model: {spec}")
+
+    def sample_ms(self, recorded_ms: float | None = None) -> float:
+        if self.kind == 'constant':
+            return self.params[0] if self.params else 0.0
+        if self.kind == 'uniform':
+            return self.rng.uniform(self.params[0], self.params[1])
+        if self.kind == 'lognormal':
+            median, sigma = self.params
+            return median * self.rng.lognormvariate(0.0, sigma)
+        return recorded_ms or 0.0
+
+
+class TokenBucket:
+    """Requests per minute with a burst of one minute's worth; non-blocking."""
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60.0
+        self.capacity = max(per_minute, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> float:
+        """0 when a token was taken, otherwise the seconds until one is available."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+
+class MockGeminiServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency: LatencyModel, error_rate: float, rpm: float | None,
+                 recordings: Recordings, rng: random.Random):
+        super().__init__(address, MockGeminiHandler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.bucket = TokenBucket(rpm) if rpm else None
+        self.recordings = recordings
+        self.rng = rng
+        self.rng_lock = threading.Lock()
+        self.stats_lock = threading.Lock()
+        self.stats = {"requests": 0, "ok": 0, "replayed": 0, "errors": 0, "rate_limited": 0,
+                      "streamed": 0, "stream_cancelled": 0, "caches_created": 0, "cached_calls": 0}
+        # cache name -> (prompt tokens it holds, expiry as time.time(), digest of its prompt text)
+        self.caches: dict[str, tuple[int, float, str | None]] = {}
+
+    def count(self, *names: str):
+        with self.stats_lock:
+            for name in names:
+                self.stats[name] += 1
+
+
+class MockGeminiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; with Nagle on, delayed ACKs add ~40 ms
+    disable_nagle_algorithm = True
+    LETTERS = tuple(LETTER_TO_AUDIO_BASE)
+
+    def do_GET(self):
+        if self.path == '/stats':
+            with self.server.stats_lock:
+                self._send_json(200, dict(self.server.stats))
+        else:
+            self._send_json(404, {"error": {"code": 404, "message": "not found", "status": "NOT_FOUND"}})
+
+    def do_POST(self):
+        server: MockGeminiServer = self.server
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        path = self.path.split('?', 1)[0]
+        if CACHED_CONTENTS_PATH.match(path):
+            self._create_cache(json.loads(body or b'{}'))
+            return
+        match = GENERATE_PATH.match(path)
+        if match is None:
+            self._send_json(404, {"error": {"code": 404, "message": "unknown method", "status": "NOT_FOUND"}})
+            return
+        server.count("requests")
+
+        if server.bucket is not None:
+            wait = server.bucket.try_acquire()
+            if wait:
+                server.count("rate_limited")
+                self._send_json(429, {"error": {"code": 429, "message": "Resource has been exhausted (mock quota).",
+                                                "status": "RESOURCE_EXHAUSTED"}},
+                                extra_headers=[('Retry-After', str(max(int(wait + 0.999), 1)))])
+                return
+
+        model = match.group('model')
+        request = json.loads(body or b'{}')
+        cached_tokens, prompt = 0, self._prompt_digest(request)
+        if request.get('cachedContent'):
+            cache = server.caches.get(request['cachedContent'])
+            if cache is None or cache[1] < time.time():
+                self._send_json(404, {"error": {"code": 404, "message": "CachedContent not found (mock).",
+                                                "status": "NOT_FOUND"}})
+                return
+            server.count("cached_calls")
+            cached_tokens, prompt = cache[0], prompt or cache[2]
+        image = self._inline_image(request)
+        digest = image_digest(image) if image is not None else ''
+        recording = server.recordings.get(model, digest, prompt)
+        with server.rng_lock:
+            fail = server.rng.random() < server.error_rate
+            delay_ms = server.latency.sample_ms(recording.get("latency_ms") if recording else None)
+        stream = match.group('method') == 'streamGenerateContent'
+        time.sleep(delay_ms * (STREAM_FIRST_CHUNK_SHARE if stream and not fail else 1.0) / 1000)
+
+        if fail:
+            server.count("errors")
+            self._send_json(503, {"error": {"code": 503, "message": "The model is overloaded (mock).",
+                                            "status": "UNAVAILABLE"}})
+            return
+
+        if recording is not None:
+            server.count("ok", "replayed")
+            text, usage = recording["text"], recording.get("usage")
+        else:
+            server.count("ok")
+            text = self._answer(int(digest[:8] or '0', 16), request.get('generationConfig') or {})
+            usage = None
+        # Cached tokens count as prompt tokens too (recorded calls sent the instructions inline)
+        usage = dict(usage or {"promptTokenCount": self._estimate_tokens(request) + cached_tokens,
+                               "candidatesTokenCount": max(len(text) // CHARS_PER_TOKEN, 1)})
+        if cached_tokens:
+            usage["cachedContentTokenCount"] = cached_tokens
+        usage["totalTokenCount"] = (usage.get("promptTokenCount") or 0) + (usage.get("candidatesTokenCount") or 0)
+        if stream:
+            server.count("streamed")
+            self._send_stream(model, STREAM_SPLIT.split(text), usage, delay_ms * (1 - STREAM_FIRST_CHUNK_SHARE))
+            return
+        self._send_json(200, {
+            "candidates": [{"content": {"role": "model", "parts": [{"text": text}]},
+                            "finishReason": "STOP", "index": 0}],
+            "usageMetadata": usage,
+            "modelVersion": model,
+        })
+
+    def _answer(self, seed: int, generation_config: dict) -> str:
+        letter = self.LETTERS[seed % len(self.LETTERS)]
+        if generation_config.get('responseMimeType') != 'application/json':
+            return letter
+        # A deterministic confidence and the next letters as runners-up; sampled answers
+        # (temperature above 0, the model's default) vary by up to 0.1 per unit of temperature
+        confidence = 0.5 + (seed >> 8) % 50 / 100
+        temperature = generation_config.get('temperature', 1.0)
+        if temperature:
+            with self.server.rng_lock:
+                confidence += self.server.rng.uniform(-0.1, 0.1) * temperature
+        confidence = round(min(max(confidence, 0.0), 1.0), 2)
+        alternatives = [
+            {"letter": self.LETTERS[(seed + k) % len(self.LETTERS)], "confidence": round((1 - confidence) / (k + 1), 2)}
+            for k in (1, 2, 3)
+        ]
+        return json.dumps({"letter": letter, "confidence": confidence, "alternatives": alternatives}, ensure_ascii=False)
+
+    def _create_cache(self, request: dict):
+        server: MockGeminiServer = self.server
+        tokens = self._estimate_tokens(request)
+        ttl = float(str(request.get('ttl') or '3600s').rstrip('s'))
+        name = f"cachedContents/mock-{len(server.caches) + 1}"
+        server.caches[name] = (tokens, time.time() + ttl, self._prompt_digest(request))
+        server.count("caches_created")
+        self._send_json(200, {
+            "name": name,
+            "displayName": request.get('displayName', ''),
+            "model": request.get('model', ''),
+            "expireTime": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time() + ttl)),
+            "usageMetadata": {"totalTokenCount": tokens},
+        })
+
+    @staticmethod
+    def _estimate_tokens(request: dict) -> int:
+        tokens = 0
+        for content in request.get('contents', []):
+            for part in content.get('parts', []):
+                if 'text' in part:
+                    tokens += len(part['text']) // CHARS_PER_TOKEN + 1
+                elif part.get('inlineData') or part.get('inline_data'):
+                    tokens += IMAGE_TOKENS
+        return tokens
+
+    @staticmethod
+    def _prompt_digest(request: dict) -> str | None:
+        for content in request.get('contents', []):
+            for part in content.get('parts', []):
+                if 'text' in part:
+                    return prompt_digest(part['text'])
+        return None
+
+    @staticmethod
+    def _inline_image(request: dict) -> bytes | None:
+        for content in request.get('contents', []):
+            for part in content.get('parts', []):
+                inline = part.get('inlineData') or part.get('inline_data')
+                if inline:
+                    # The SDK sends URL-safe base64 without padding
+                    data = inline['data']
+                    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+        return None
+
+    def _send_json(self, status: int, payload: dict, extra_headers: list[tuple[str, str]] = ()):
+        body = json.dumps(payload, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=UTF-8')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in extra_headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_stream(self, model: str, pieces: list[str], usage: dict, remaining_ms: float):
+        """One server-sent event per piece (chunked encoding), spread over remaining_ms."""
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        try:
+            for i, piece in enumerate(pieces):
+                if i:
+                    time.sleep(remaining_ms / (len(pieces) - 1) / 1000)
+                candidate = {"content": {"role": "model", "parts": [{"text": piece}]}, "index": 0}
+                event = {"candidates": [candidate], "modelVersion": model}
+                if i == len(pieces) - 1:
+                    candidate["finishReason"] = "STOP"
+                    event["usageMetadata"] = usage
+                data = f"data: {json.dumps(event, ensure_ascii=False)}\r\n\r\n".encode()
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                self.wfile.flush()
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # The client had its letter and closed the stream
+            self.server.count("stream_cancelled")
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_mock_server(port: int = 0, latency: str = 'constant:0', error_rate: float = 0.0,
+                      rpm: float | None = None, replay: str | None = None, seed: int = 0) -> MockGeminiServer:
+    """Starts the mock in a daemon thread (port 0 picks a free port) and returns it."""
+    rng = random.Random(seed)
+    server = MockGeminiServer(('127.0.0.1', port), LatencyModel(latency, rng), error_rate, rpm,
+                              load_recordings(replay) if replay else Recordings(), rng)
+    threading.Thread(target=server.serve_forever, name="mock-gemini-server", daemon=True).start()
+    return server
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(prog="python -m arabic_ocr.mock_server", description="Local Gemini stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", default="constant:0",
+                        help="constant:MS | uniform:LOW,HIGH | lognormal:MEDIAN,SIGMA | replay")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--rpm", type=float, help="quota in requests per minute; excess requests get 429")
+    parser.add_argument("--replay", help="JSONL recording made with GEMINI_RECORD_PATH")
+    parser.add_argument("--seed", type=int, default=0, help="seed for latency and error injection")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    server = MockGeminiServer((args.host, args.port), LatencyModel(args.latency, rng), args.error_rate, args.rpm,
+                              load_recordings(args.replay) if args.replay else Recordings(), rng)
+    print(f"Mock Gemini server on http://{args.host}:{args.port} "
+          f"({len(server.recordings)} recorded answers)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""
+Near-duplicate recognition cache: perceptual hashes of normalized glyphs, searched
+within a Hamming distance by multi-index hashing.
+
+Exact byte hashes miss re-captures of the same card (sensor noise, re-encoding,
+metadata); a perceptual hash of the cropped, normalized glyph does not. The 64-bit
+hashes cannot see dots or a hamza (ح/ج, ط/ظ and ا/أ/إ hash alike), so a match also
+needs the same marks: the glyph's small components, counted above, beside and below
+its main stroke.
+"""
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+from PIL import Image
+
+from .config import MODEL_NAME, PHASH_ALGORITHM, PHASH_CACHE_SIZE, PHASH_MAX_DISTANCE
+from .metrics import REGISTRY
+from .preprocessing import connected_components, normalize_glyph
+from .prompts import RECOGNITION_PROMPT
+from .resources import cached_resource
+
+HASH_BITS = 64
+# Side of the normalized glyph the hashes and marks are computed from
+GLYPH_SIDE = 64
+# Components smaller than this share of the ink are specks, not dots or a hamza
+MIN_MARK_SHARE = 0.01
+
+NEAR_HITS = REGISTRY.counter(
+    "arabic_ocr_near_duplicate_hits_total", "Recognitions answered from a perceptually similar earlier image."
+)
+INDEX_SIZE = REGISTRY.gauge("arabic_ocr_near_duplicate_index_entries", "Glyph hashes in the near-duplicate index.")
+
+
+# =======================================================
+# PERCEPTUAL HASHES (64 bits)
+# =======================================================
+def _dct_matrix(n: int) -> np.ndarray:
+    """Orthonormal DCT-II basis: dct(x) == D @ x."""
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    matrix[0] /= np.sqrt(2.0)
+    return matrix
+
+
+_DCT_32 = _dct_matrix(32)
+
+
+def _bits_to_int(bits: np.ndarray) -> int:
+    return int.from_bytes(np.packbits(bits.ravel().astype(np.uint8)).tobytes(), 'big')
+
+
+def dhash(glyph: Image.Image) -> int:
+    """Difference hash: is each pixel of a 9x8 glyph brighter than its right neighbour."""
+    pixels = np.asarray(glyph.resize((9, 8), Image.Resampling.BILINEAR), dtype=np.int16)
+    return _bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+
+
+def phash(glyph: Image.Image) -> int:
+    """DCT hash: the 8x8 lowest frequencies of a 32x32 glyph, thresholded at their median."""
+    pixels = np.asarray(glyph.resize((32, 32), Image.Resampling.BILINEAR), dtype=np.float32)
+    low = (_DCT_32 @ pixels @ _DCT_32.T)[:8, :8].ravel()
+    # The DC term only says how much ink there is; leave it out of the median
+    return _bits_to_int(low > np.median(low[1:]))
+
+
+HASH_FUNCTIONS = {'dhash': dhash, 'phash': phash}
+
+
+def glyph_marks(glyph: Image.Image) -> tuple[int, int, int]:
+    """
+    Dots and hamzas of a normalized glyph: its components besides the largest (the
+    main stroke), counted by where they sit against it (above, beside, below).
+    """
+    ink = np.asarray(glyph) < 128
+    components = connected_components(ink)
+    if not components:
+        return 0, 0, 0
+    min_area = max(int(np.count_nonzero(ink) * MIN_MARK_SHARE), 1)
+    body, marks = components[0], [0, 0, 0]
+    quarter = (body.bottom - body.top + 1) / 4
+    for mark in components[1:]:
+        if mark.area < min_area:
+            continue
+        if mark.center_row < body.top + quarter:
+            marks[0] += 1
+        elif mark.center_row > body.bottom - quarter:
+            marks[2] += 1
+        else:
+            marks[1] += 1
+    return marks[0], marks[1], marks[2]
+
+
+@dataclass(frozen=True)
+class GlyphKey:
+    """What a near-duplicate must share with a stored glyph: close hash, identical marks."""
+    hash: int
+    marks: tuple[int, int, int]
+
+
+def glyph_key(image_bytes: bytes, algorithm: str = PHASH_ALGORITHM) -> GlyphKey | None:
+    """The glyph's perceptual hash and marks, or None when the image cannot be decoded."""
+    try:
+        glyph = normalize_glyph(image_bytes, GLYPH_SIDE)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+    return GlyphKey(HASH_FUNCTIONS[algorithm](glyph), glyph_marks(glyph))
+
+
+# =======================================================
+# MULTI-INDEX HASHING
+# =======================================================
+class MultiIndexHash:
+    """
+    Hashes split into max_distance + 1 disjoint chunks, one dict per chunk. By the
+    pigeonhole principle a hash within max_distance of the query equals it exactly in
+    at least one chunk, so only the hashes sharing a chunk value are compared.
+    """
+    def __init__(self, max_distance: int, bits: int = HASH_BITS):
+        self.max_distance = max_distance
+        chunks = max_distance + 1
+        widths = [bits // chunks + (1 if i < bits % chunks else 0) for i in range(chunks)]
+        self._chunks = []  # (shift, mask)
+        shift = 0
+        for width in widths:
+            self._chunks.append((shift, (1 << width) - 1))
+            shift += width
+        self._tables: list[dict[int, set[int]]] = [{} for _ in widths]
+
+    def _keys(self, value: int):
+        for shift, mask in self._chunks:
+            yield (value >> shift) & mask
+
+    def add(self, value: int):
+        for table, key in zip(self._tables, self._keys(value)):
+            table.setdefault(key, set()).add(value)
+
+    def remove(self, value: int):
+        for table, key in zip(self._tables, self._keys(value)):
+            bucket = table.get(key)
+            if bucket is not None:
+                bucket.discard(value)
+                if not bucket:
+                    del table[key]
+
+    def nearest(self, value: int) -> tuple[int, int] | None:
+        """(closest stored hash, Hamming distance) within max_distance, or None."""
+        best = None
+        for table, key in zip(self._tables, self._keys(value)):
+            for candidate in table.get(key, ()):
+                distance = (candidate ^ value).bit_count()
+                if distance <= self.max_distance and (best is None or distance < best[1]):
+                    best = (candidate, distance)
+                    if distance == 0:
+                        return best
+        return best
+
+
+class NearDuplicateIndex:
+    """Glyph key -> recognized letter, LRU-bounded, thread-safe; one hash index per set of marks."""
+
+    def __init__(self, max_distance: int = PHASH_MAX_DISTANCE, max_entries: int = PHASH_CACHE_SIZE):
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._letters: OrderedDict[GlyphKey, str] = OrderedDict()
+        self._indexes: dict[tuple[int, int, int], MultiIndexHash] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._letters)
+
+    def get(self, key: GlyphKey) -> tuple[str, int] | None:
+        """(letter, Hamming distance) of the nearest stored glyph with the same marks, or None."""
+        with self._lock:
+            index = self._indexes.get(key.marks)
+            match = index.nearest(key.hash) if index is not None else None
+            if match is None:
+                self.misses += 1
+                return None
+            stored, distance = GlyphKey(match[0], key.marks), match[1]
+            self._letters.move_to_end(stored)
+            self.hits += 1
+            letter = self._letters[stored]
+        NEAR_HITS.inc()
+        return letter, distance
+
+    def put(self, key: GlyphKey, letter: str):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            if key not in self._letters:
+                self._indexes.setdefault(key.marks, MultiIndexHash(self.max_distance)).add(key.hash)
+            self._letters[key] = letter
+            self._letters.move_to_end(key)
+            while len(self._letters) > self.max_entries:
+                evicted, _ = self._letters.popitem(last=False)
+                self._indexes[evicted.marks].remove(evicted.hash)
+            INDEX_SIZE.set(len(self._letters))
+
+
+@cached_resource
+def get_near_duplicate_index(model: str = MODEL_NAME,
+                             prompt_version: str = RECOGNITION_PROMPT.key) -> NearDuplicateIndex:
+    """One index per model and prompt version, like the exact cache's keys."""
+    return NearDuplicateIndex()
@@ -0,0 +1,227 @@
+"""
+Image preprocessing: decode, orient, crop to the glyph, downscale and re-encode uploads.
+"""
+import io
+import threading
+import time
+from dataclasses import dataclass
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from .config import PREPROCESS_FORMAT, PREPROCESS_MAX_SIDE
+from .resources import cached_resource
+
+# =======================================================
+# IMAGE PREPROCESSING (shrink the upload before it leaves the server)
+# =======================================================
+@dataclass(frozen=True)
+class PreprocessResult:
+    image_bytes: bytes
+    mime_type: str
+    original_size: int
+    processed_size: int
+    elapsed_ms: float
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.original_size - self.processed_size
+
+
+def otsu_threshold(histogram: list[int]) -> int:
+    """Gray level that best separates ink from paper (Otsu's method on a 256-bin histogram)."""
+    total = sum(histogram)
+    weighted_total = sum(level * count for level, count in enumerate(histogram))
+    background_count, background_sum = 0, 0
+    best_level, best_variance = 0, -1.0
+    for level, count in enumerate(histogram):
+        background_count += count
+        if background_count == 0:
+            continue
+        foreground_count = total - background_count
+        if foreground_count == 0:
+            break
+        background_sum += level * count
+        mean_background = background_sum / background_count
+        mean_foreground = (weighted_total - background_sum) / foreground_count
+        variance = background_count * foreground_count * (mean_background - mean_foreground) ** 2
+        if variance > best_variance:
+            best_level, best_variance = level, variance
+    return best_level
+
+
+@dataclass
+class Component:
+    """A connected blob of ink: its pixel count, bounding rows/columns and row centroid."""
+    area: int
+    top: int
+    bottom: int
+    left: int
+    right: int
+    row_sum: float
+
+    @property
+    def center_row(self) -> float:
+        return self.row_sum / self.area
+
+
+def connected_components(mask: np.ndarray) -> list[Component]:
+    """
+    8-connected components of a boolean mask, largest first: runs of each row are
+    joined to the overlapping runs of the row above (union-find on runs).
+    """
+    parent: list[int] = []
+    runs: list[Component] = []
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    previous: list[tuple[int, int, int]] = []  # (start, end, run id) of the row above
+    padded = np.zeros(mask.shape[1] + 2, dtype=np.int8)
+    for y, row in enumerate(mask):
+        padded[1:-1] = row
+        edges = np.flatnonzero(np.diff(padded))
+        current = []
+        for start, end in zip(edges[::2].tolist(), edges[1::2].tolist()):
+            run = len(parent)
+            parent.append(run)
+            runs.append(Component(end - start, y, y, start, end - 1, y * (end - start)))
+            for p_start, p_end, p_run in previous:
+                # Diagonal neighbours touch too: [start, end) overlaps [p_start - 1, p_end + 1)
+                if p_start - 1 < end and start < p_end + 1:
+                    a, b = find(run), find(p_run)
+                    if a != b:
+                        parent[b] = a
+                        merged, other = runs[a], runs[b]
+                        merged.area += other.area
+                        merged.top, merged.bottom = min(merged.top, other.top), max(merged.bottom, other.bottom)
+                        merged.left, merged.right = min(merged.left, other.left), max(merged.right, other.right)
+                        merged.row_sum += other.row_sum
+            current.append((start, end, run))
+        previous = current
+    return sorted((runs[i] for i in range(len(parent)) if parent[i] == i), key=lambda c: c.area, reverse=True)
+
+
+def decode_grayscale(image_bytes: bytes, draft_side: int | None = None) -> Image.Image:
+    """
+    Decodes an upload to an upright grayscale image (raises OSError/ValueError if unreadable).
+    With draft_side, JPEGs are decoded directly at a reduced scale no smaller than it.
+    """
+    with Image.open(io.BytesIO(image_bytes)) as img:
+        if draft_side:
+            img.draft('L', (draft_side, draft_side))
+        img = ImageOps.exif_transpose(img)
+        if img.mode in ('RGBA', 'LA', 'PA') or 'transparency' in img.info:
+            # Transparent backgrounds become paper-white, not black
+            background = Image.new('RGBA', img.size, (255, 255, 255, 255))
+            img = Image.alpha_composite(background, img.convert('RGBA'))
+        return img.convert('L')
+
+
+def crop_to_ink(gray: Image.Image) -> tuple[Image.Image, bool]:
+    """
+    Crops a grayscale image to the bounding box of its ink plus a small margin.
+    Returns the crop and whether the ink is darker than the paper.
+    """
+    # Ink is whichever side of the threshold covers fewer pixels (dark-on-light or light-on-dark)
+    histogram = gray.histogram()
+    threshold = otsu_threshold(histogram)
+    dark_pixels = sum(histogram[:threshold + 1])
+    ink_is_dark = dark_pixels <= gray.width * gray.height - dark_pixels
+    ink_mask = gray.point(lambda v: 255 if (v <= threshold) == ink_is_dark else 0)
+    bbox = ink_mask.getbbox()
+    if bbox is not None:
+        margin = max(bbox[2] - bbox[0], bbox[3] - bbox[1]) // 8 + 4
+        gray = gray.crop((
+            max(bbox[0] - margin, 0), max(bbox[1] - margin, 0),
+            min(bbox[2] + margin, gray.width), min(bbox[3] + margin, gray.height),
+        ))
+    return gray, ink_is_dark
+
+
+def normalize_glyph(image_bytes: bytes, size: int) -> Image.Image:
+    """
+    The glyph as a size x size dark-on-light image: ink cropped, padded to a square
+    (keeping its aspect ratio) and contrast-stretched. Independent of the capture's
+    resolution, framing and polarity, so re-captures of one glyph look alike.
+    """
+    gray, ink_is_dark = crop_to_ink(decode_grayscale(image_bytes))
+    if not ink_is_dark:
+        gray = ImageOps.invert(gray)
+    side = max(gray.width, gray.height)
+    square = Image.new('L', (side, side), 255)
+    square.paste(gray, ((side - gray.width) // 2, (side - gray.height) // 2))
+    return ImageOps.autocontrast(square.resize((size, size), Image.Resampling.BILINEAR))
+
+
+def preprocess_image(image_bytes: bytes, mime_type: str,
+                     max_side: int = PREPROCESS_MAX_SIDE,
+                     output_format: str = PREPROCESS_FORMAT) -> PreprocessResult:
+    """
+    Decodes the upload, applies the EXIF orientation, converts it to grayscale, crops it
+    to the ink bounding box, downscales it to max_side and re-encodes it compactly.
+    The original bytes are kept when the image cannot be decoded or would not shrink.
+    """
+    start = time.perf_counter()
+    try:
+        gray = decode_grayscale(image_bytes)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        return PreprocessResult(image_bytes, mime_type, len(image_bytes), len(image_bytes), elapsed_ms)
+
+    gray, _ = crop_to_ink(gray)
+    gray.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+
+    buffer = io.BytesIO()
+    if output_format == 'WEBP':
+        gray.save(buffer, format='WEBP', quality=85, method=4)
+        processed_mime = 'image/webp'
+    else:
+        gray.save(buffer, format='PNG', optimize=True)
+        processed_mime = 'image/png'
+    processed_bytes = buffer.getvalue()
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    if len(processed_bytes) >= len(image_bytes):
+        return PreprocessResult(image_bytes, mime_type, len(image_bytes), len(image_bytes), elapsed_ms)
+    return PreprocessResult(processed_bytes, processed_mime, len(image_bytes), len(processed_bytes), elapsed_ms)
+
+
+class PreprocessStats:
+    """
+    Per-process totals for the upload path: bytes saved by preprocessing and the model
+    latency with and without it, so the gain can be compared by toggling PREPROCESS_ENABLED.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.images = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.preprocess_ms = 0.0
+        # mode ("preprocessed" / "raw") -> [model calls, total model ms]
+        self.model_latency = {"preprocessed": [0, 0.0], "raw": [0, 0.0]}
+
+    def record_preprocess(self, result: PreprocessResult):
+        with self._lock:
+            self.images += 1
+            self.bytes_in += result.original_size
+            self.bytes_out += result.processed_size
+            self.preprocess_ms += result.elapsed_ms
+
+    def record_model_call(self, preprocessed: bool, elapsed_ms: float):
+        with self._lock:
+            entry = self.model_latency["preprocessed" if preprocessed else "raw"]
+            entry[0] += 1
+            entry[1] += elapsed_ms
+
+    def average_model_ms(self, mode: str) -> float | None:
+        calls, total_ms = self.model_latency[mode]
+        return total_ms / calls if calls else None
+
+
+@cached_resource
+def get_preprocess_stats() -> PreprocessStats:
+    return PreprocessStats()
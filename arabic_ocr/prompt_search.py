@@ -0,0 +1,193 @@
+"""
+Prompt compression: accuracy, latency and input tokens of shorter recognition prompts on
+a labeled set, and the shortest one that stays within an accuracy tolerance of the
+current prompt.
+
+    GEMINI_RECORD_PATH=prompts.jsonl python -m arabic_ocr.prompt_search samples/
+    python -m arabic_ocr.prompt_search samples/ --stub --replay prompts.jsonl -o prompt_search.json
+
+Variants are composed from the named prompt sections (PROMPT_VARIANTS, or a JSON file of
+{"name": ["section", ...] or "prompt text"}) and compared with the current prompt. The
+stub only answers according to the prompt when it replays answers recorded with that
+prompt; variants missing recordings are reported and never chosen.
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+
+from .bench import _git_revision, start_stub_server
+from .client import build_genai_client
+from .config import GEMINI_BASE_URL, MODEL_PROFILE, MODEL_PROFILES, PREPROCESS_ENABLED, PROMPT_VERSION
+from .engines import build_generation_config
+from .evaluate import Variant, evaluate, image_parts, labeled_images
+from .prompts import RECOGNITION_PROMPT, PromptTemplate, compose_prompt
+from .recording import image_digest, load_recordings, prompt_digest
+
+BASELINE = "current"
+
+PROMPT_VARIANTS = {
+    # The response schema already enumerates the letters and the answer fields
+    "no_letters": ["task", "confusables", "hamza_ain", "format"],
+    "no_letters_format": ["task", "confusables", "hamza_ain"],
+    "short_hamza_ain": ["task", "confusables", "hamza_ain_short", "format_short"],
+    "minimal": ["task_short", "hamza_ain_short"],
+}
+
+
+def prompt_variants(definitions: dict[str, list[str] | str]) -> dict[str, PromptTemplate]:
+    """The current prompt and each defined variant, versioned after the current one."""
+    prompts = {BASELINE: RECOGNITION_PROMPT}
+    for name, definition in definitions.items():
+        version = f"{PROMPT_VERSION}-{name}"
+        prompts[name] = (PromptTemplate(version, definition) if isinstance(definition, str)
+                         else compose_prompt(version, definition))
+    return prompts
+
+
+def unrecorded_answers(replay: str, model: str, prompts: dict[str, PromptTemplate], parts) -> dict[str, int]:
+    """Per variant, the images with no answer recorded for its exact prompt text."""
+    recordings = load_recordings(replay)
+    digests = [image_digest(part.inline_data.data) for part in parts]
+    return {
+        name: sum(not recordings.has(model, digest, prompt_digest(prompt.text)) for digest in digests)
+        for name, prompt in prompts.items()
+    }
+
+
+# =======================================================
+# SELECTION (shortest prompt within the accuracy guardrails)
+# =======================================================
+def rejections(result: dict, baseline: dict, tolerance: float, letter_tolerance: float,
+               unrecorded: int = 0) -> list[str]:
+    """Why a variant cannot replace the current prompt; empty when it can."""
+    reasons = []
+    if unrecorded:
+        reasons.append(f"{unrecorded} answers not recorded with this prompt")
+    if result["errors"]:
+        reasons.append(f"{result['errors']} failed calls")
+    accuracy, floor = result["accuracy"] or 0.0, (baseline["accuracy"] or 0.0) - tolerance
+    if accuracy < floor - 1e-9:
+        reasons.append(f"accuracy {accuracy:.1%} < {floor:.1%}")
+    for letter, entry in result["per_letter"].items():
+        base_entry = baseline["per_letter"].get(letter)
+        if base_entry is not None and entry["accuracy"] < base_entry["accuracy"] - letter_tolerance - 1e-9:
+            reasons.append(f"{letter} {entry['accuracy']:.0%} < {base_entry['accuracy']:.0%}")
+    return reasons
+
+
+def choose(results: dict, prompts: dict[str, PromptTemplate], verdicts: dict[str, list[str]]) -> str:
+    """The eligible variant with the fewest prompt tokens (then characters); the current prompt otherwise."""
+    eligible = [name for name in results if not verdicts[name]] or [BASELINE]
+    return min(eligible, key=lambda name: (results[name]["mean_tokens"]["prompt"] or 0, len(prompts[name].text)))
+
+
+def format_table(results: dict, prompts: dict[str, PromptTemplate], verdicts: dict[str, list[str]],
+                 chosen: str) -> str:
+    lines = [f"{'variant':<18} {'chars':>6} {'prompt':>7} {'accuracy':>8} {'p50 ms':>8}  verdict"]
+    for name, r in results.items():
+        verdict = "chosen" if name == chosen else "; ".join(verdicts[name]) or "eligible"
+        lines.append(
+            f"{name:<18} {len(prompts[name].text):>6} {r['mean_tokens']['prompt'] or 0:>7.0f} "
+            f"{r['accuracy'] or 0:>8.1%} {r['latency_ms']['p50'] or 0:>8.1f}  {verdict}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(prog="python -m arabic_ocr.prompt_search",
+                                     description="Shortest recognition prompt within an accuracy tolerance")
+    parser.add_argument("labeled", help="folder of labeled letter images (baa.png, baa_2.png or baa/001.png)")
+    parser.add_argument("-o", "--output", default="prompt_search.json", help="result file (default: prompt_search.json)")
+    parser.add_argument("--variants", help="JSON file of {name: [sections] or prompt text} (default: built-in)")
+    parser.add_argument("--profile", default=MODEL_PROFILE, choices=list(MODEL_PROFILES))
+    parser.add_argument("--tolerance", type=float, default=0.01,
+                        help="accuracy a variant may lose against the current prompt (default: 0.01)")
+    parser.add_argument("--letter-tolerance", type=float, default=0.1,
+                        help="accuracy a variant may lose on any single letter (default: 0.1)")
+    parser.add_argument("-c", "--concurrency", type=int, default=4)
+    parser.add_argument("--stub", action="store_true", help="start a local stub model server")
+    parser.add_argument("--stub-latency", default="replay", help="latency model of the stub server")
+    parser.add_argument("--replay", help="answers recorded with GEMINI_RECORD_PATH, replayed by the stub")
+    parser.add_argument("--stub-url", help="use an already running stub server")
+    args = parser.parse_args(argv)
+
+    definitions = PROMPT_VARIANTS
+    if args.variants:
+        with open(args.variants, encoding='utf-8') as f:
+            definitions = json.load(f)
+    try:
+        prompts = prompt_variants(definitions)
+    except ValueError as e:
+        parser.error(str(e))
+    samples = labeled_images(args.labeled)
+    if not samples:
+        parser.error(f"no labeled images in {args.labeled}")
+
+    model = MODEL_PROFILES[args.profile]['model']
+    config = build_generation_config(args.profile)
+    parts = image_parts(samples)
+    stubbed = args.stub or args.stub_url
+    if args.replay:
+        unrecorded = unrecorded_answers(args.replay, model, prompts, parts)
+    else:
+        # Without recordings the stub's answers ignore the prompt: only tokens and latency compare
+        unrecorded = {name: len(samples) if stubbed and name != BASELINE else 0 for name in prompts}
+
+    process = None
+    base_url = args.stub_url or GEMINI_BASE_URL
+    if args.stub:
+        process, base_url = start_stub_server(args.stub_latency, args.replay)
+    try:
+        variants = [Variant(name, model, config, prompt) for name, prompt in prompts.items()]
+        results = evaluate(build_genai_client(base_url), variants, samples, args.concurrency, parts)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    verdicts = {
+        name: rejections(result, results[BASELINE], args.tolerance, args.letter_tolerance, unrecorded[name])
+        for name, result in results.items()
+    }
+    chosen = choose(results, prompts, verdicts)
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "git_revision": _git_revision(),
+            "python": platform.python_version(),
+            "model_profile": args.profile,
+            "model": model,
+            "preprocess": PREPROCESS_ENABLED,
+            "labeled_images": len(samples),
+            "letters": len({s.letter for s in samples}),
+            "endpoint": base_url or "gemini",
+            "answers": "replay" if args.replay else "stub" if stubbed else "live",
+            "tolerance": args.tolerance,
+            "letter_tolerance": args.letter_tolerance,
+        },
+        "baseline": BASELINE,
+        "chosen": chosen,
+        "chosen_prompt_key": prompts[chosen].key,
+        "variants": {
+            name: {
+                "prompt_key": prompts[name].key,
+                "prompt_chars": len(prompts[name].text),
+                "sections": definitions.get(name) if not isinstance(definitions.get(name), str) else None,
+                "unrecorded": unrecorded[name],
+                "rejected_because": verdicts[name],
+                **result,
+                "prompt": prompts[name].text,
+            }
+            for name, result in results.items()
+        },
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(format_table(results, prompts, verdicts, chosen))
+    print(f"Wrote {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
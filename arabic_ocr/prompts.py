@@ -0,0 +1,224 @@
+"""
+The recognition prompt as a compiled, versioned template, the optional upstream context
+cache holding it, and input-token accounting for the model calls.
+"""
+import asyncio
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+
+import httpx
+from google.genai import errors, types
+
+from .config import CONTEXT_CACHE_ENABLED, CONTEXT_CACHE_TTL_SECONDS, PROMPT_VERSION
+from .metrics import REGISTRY
+from .recording import prompt_digest
+from .resources import cached_resource
+
+logger = logging.getLogger(__name__)
+
+PROMPT_TOKENS = REGISTRY.counter(
+    "arabic_ocr_model_prompt_tokens_total", "Input tokens of model calls (instructions and image)."
+)
+CACHED_PROMPT_TOKENS = REGISTRY.counter(
+    "arabic_ocr_model_cached_prompt_tokens_total", "Input tokens served from an upstream context cache."
+)
+
+
+# =======================================================
+# PROMPT TEMPLATE (built once, shared by every call)
+# =======================================================
+@dataclass(frozen=True)
+class PromptTemplate:
+    """
+    Instructions sent with every image. The Part is built once and reused; the key
+    (version plus text digest) tells caches apart even if an edit forgot the bump.
+    """
+    version: str
+    text: str
+    part: types.Part = field(init=False, repr=False, compare=False)
+    key: str = field(init=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, 'part', types.Part(text=self.text))
+        object.__setattr__(self, 'key', f"{self.version}-{prompt_digest(self.text)}")
+
+    def contents(self, image_part: types.Part) -> list[types.Part]:
+        # Instructions first: a stable prefix is what upstream (implicit) caching matches on
+        return [self.part, image_part]
+
+
+# The instructions in sections, so shorter variants can be composed and compared
+# (python -m arabic_ocr.prompt_search); the recognition prompt is all of them in order
+PROMPT_SECTIONS = {
+    "task": (
+        "انظر بدقة إلى الصورة وحدد الحرف العربي المنفصل الظاهر فيها. "
+        "كل صورة تحتوي على حرف عربي واحد فقط، مكتوب بخط يدوي أو مطبوع، بدون أي كلمة أو سياق. "
+        "مهمتك هي تحديد الحرف بشكل دقيق جدًا بناءً على شكله البصري فقط. "
+    ),
+    "confusables": (
+        "انتبه جيدًا للتمييز بين الحروف المتشابهة في الشكل مثل (ذ/ز) و(ص/ض) و(ح/هـ)، "
+        "وخاصة بين (ع) و(ء) لأنها أكثر الحروف تشابهًا في هذه المجموعة. "
+    ),
+    "hamza_ain": (
+        "تذكّر أن الحروف كلها **منفصلة** وليست متصلة بأي حرف آخر. "
+        "الهمزة (ء) هي شكل صغير جدًا، يشبه نصف دائرة أو علامة تشبه رأس العين لكنها مفصولة تمامًا عن أي خط، "
+        "ولا تحتوي على أي امتداد أو ذيل، وتكون عادة في منتصف السطر أو فوقه. "
+        "أما العين (ع) فهي حرف أكبر بكثير من الهمزة، له جسم منحني يشبه شكل (C) بالعكس تقريبًا، "
+        "وله انفتاح واضح من الأعلى، وأحيانًا يمتد للأسفل بخط قصير عند الكتابة اليدوية. "
+        "عند المقارنة بينهما: الهمزة صغيرة ومنعزلة، والعين أكبر حجمًا ومتصلة جزئيًا بالسطر. "
+        "احرص على ألا تعتبر الهمزة عينًا، حتى لو كانت مكتوبة بخط سميك أو قريب من شكل القوس. "
+    ),
+    "letters": (
+        "يجب أن تكون إجابتك أحد الأحرف التالية فقط: "
+        "ا، أ، إ، آ، ى، ب، ت، ث، ج، ح، خ، د، ذ، ر، ز، س، ش، ص، ض، ط، ظ، ع، غ، ف، ق، ك، ل، م، ن، هـ، و، ؤ، ي، ئ، ة، ء. "
+    ),
+    "format": (
+        "أجب بصيغة JSON فقط: الحرف، ودرجة ثقتك فيه بين 0 و1، وأقرب ثلاثة أحرف بديلة مع درجة الثقة في كل منها. "
+        "إذا كان الحرف غير واضح جدًا، اختر الأقرب من حيث الشكل البصري من القائمة أعلاه وخفّض درجة الثقة."
+    ),
+}
+
+# Condensed wordings of some sections, for compressed variants
+SHORT_PROMPT_SECTIONS = {
+    "task_short": "حدد الحرف العربي المنفصل الوحيد في الصورة من شكله فقط. ",
+    "hamza_ain_short": (
+        "الهمزة (ء) صغيرة ومنعزلة بلا ذيل، والعين (ع) أكبر ولها انفتاح واضح من الأعلى؛ لا تعتبر الهمزة عينًا. "
+    ),
+    "format_short": "أعط درجة ثقتك بين 0 و1 وأقرب ثلاثة بدائل، وخفّض الثقة إذا كان الحرف غير واضح.",
+}
+
+
+def compose_prompt(version: str, sections: list[str]) -> PromptTemplate:
+    """A template from named sections of PROMPT_SECTIONS or SHORT_PROMPT_SECTIONS, in order."""
+    available = {**PROMPT_SECTIONS, **SHORT_PROMPT_SECTIONS}
+    unknown = [name for name in sections if name not in available]
+    if unknown:
+        raise ValueError(f"unknown prompt sections: {', '.join(unknown)}")
+    return PromptTemplate(version, "".join(available[name] for name in sections))
+
+
+RECOGNITION_PROMPT = compose_prompt(PROMPT_VERSION, list(PROMPT_SECTIONS))
+
+
+# =======================================================
+# UPSTREAM CONTEXT CACHE (instructions processed once per TTL)
+# =======================================================
+class PromptContextCache:
+    """
+    An explicit upstream cache holding the instructions, one per model: created on
+    first use and renewed shortly before it expires. When the model refuses it (e.g.
+    the prompt is under its minimum cacheable size) the instructions are sent inline
+    and creation is not attempted again for a while.
+    """
+    RENEW_MARGIN_SECONDS = 60
+    RETRY_AFTER_FAILURE_SECONDS = 600
+
+    def __init__(self, template: PromptTemplate = RECOGNITION_PROMPT, ttl_seconds: int = CONTEXT_CACHE_TTL_SECONDS):
+        self.template = template
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._create_lock = threading.Lock()
+        self._create_lock_async: asyncio.Lock | None = None
+        # model -> (cache name, or None after a refusal; monotonic time it is good until)
+        self._entries: dict[str, tuple[str | None, float]] = {}
+
+    def _lookup(self, model: str) -> tuple[bool, str | None]:
+        with self._lock:
+            entry = self._entries.get(model)
+        if entry is not None and time.monotonic() < entry[1]:
+            return True, entry[0]
+        return False, None
+
+    def _store(self, model: str, name: str | None) -> str | None:
+        lifetime = self.ttl_seconds - self.RENEW_MARGIN_SECONDS if name else self.RETRY_AFTER_FAILURE_SECONDS
+        with self._lock:
+            self._entries[model] = (name, time.monotonic() + max(lifetime, 1))
+        return name
+
+    def invalidate(self, model: str):
+        """The upstream cache is gone (expired or deleted): the next call recreates it."""
+        with self._lock:
+            self._entries.pop(model, None)
+
+    def _create_config(self) -> types.CreateCachedContentConfig:
+        return types.CreateCachedContentConfig(
+            contents=[types.Content(role="user", parts=[self.template.part])],
+            ttl=f"{self.ttl_seconds}s",
+            display_name=f"arabic-ocr-prompt-{self.template.key}",
+        )
+
+    def _refused(self, model: str, exc: Exception) -> None:
+        logger.warning("Context cache for %s unavailable, sending the prompt inline: %s", model, exc)
+        return self._store(model, None)
+
+    def name(self, client, model: str) -> str | None:
+        """The cache to reference in calls to this model, or None to send the instructions inline."""
+        found, name = self._lookup(model)
+        if found:
+            return name
+        with self._create_lock:
+            found, name = self._lookup(model)
+            if found:
+                return name
+            try:
+                return self._store(model, client.caches.create(model=model, config=self._create_config()).name)
+            except (errors.APIError, httpx.HTTPError) as e:
+                return self._refused(model, e)
+
+    async def name_async(self, client, model: str) -> str | None:
+        found, name = self._lookup(model)
+        if found:
+            return name
+        if self._create_lock_async is None:
+            self._create_lock_async = asyncio.Lock()
+        async with self._create_lock_async:
+            found, name = self._lookup(model)
+            if found:
+                return name
+            try:
+                cache = await client.aio.caches.create(model=model, config=self._create_config())
+                return self._store(model, cache.name)
+            except (errors.APIError, httpx.HTTPError) as e:
+                return self._refused(model, e)
+
+
+@cached_resource
+def get_prompt_context_cache() -> PromptContextCache | None:
+    """The process-wide context cache, or None when CONTEXT_CACHE_ENABLED is off."""
+    return PromptContextCache() if CONTEXT_CACHE_ENABLED else None
+
+
+# =======================================================
+# INPUT-TOKEN ACCOUNTING
+# =======================================================
+class PromptUsage:
+    """Input tokens of model calls and how many were served from a cache (explicit or implicit)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+
+    def record(self, usage: types.GenerateContentResponseUsageMetadata | None):
+        if usage is None:
+            return
+        prompt_tokens = usage.prompt_token_count or 0
+        cached_tokens = usage.cached_content_token_count or 0
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += prompt_tokens
+            self.cached_tokens += cached_tokens
+        PROMPT_TOKENS.inc(prompt_tokens)
+        CACHED_PROMPT_TOKENS.inc(cached_tokens)
+
+    @property
+    def cached_ratio(self) -> float:
+        return self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+
+
+@cached_resource
+def get_prompt_usage() -> PromptUsage:
+    return PromptUsage()
@@ -0,0 +1,199 @@
+"""
+Local quality gate: blank, low-contrast, blurred or cluttered captures are rejected in a
+few milliseconds instead of costing a model round trip (and the user's retry after it).
+"""
+import threading
+import time
+from dataclasses import dataclass
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from PIL import Image
+
+from .config import (
+    QUALITY_MAX_COMPONENTS,
+    QUALITY_MAX_INK,
+    QUALITY_MIN_CONTRAST,
+    QUALITY_MIN_INK,
+    QUALITY_MIN_SHARPNESS,
+)
+from .metrics import REGISTRY
+from .preprocessing import connected_components, decode_grayscale, otsu_threshold
+from .resources import cached_resource
+
+# Frames are analysed at this size, the glyph crop at GLYPH_SIDE
+ANALYSIS_SIDE = 512
+GLYPH_SIDE = 128
+# The paper's own level is estimated on a copy this small, closed with a window wide
+# enough (about 1/7 of the frame) to erase the strokes of a glyph filling the frame
+BACKGROUND_SIDE = 64
+BACKGROUND_KERNEL = 9
+# Components smaller than this share of the ink are specks, not strokes or dots
+MIN_COMPONENT_SHARE = 0.01
+
+QUALITY_CHECKS = REGISTRY.counter(
+    "arabic_ocr_quality_checks_total", "Images checked by the local quality gate, by outcome.", ("outcome",)
+)
+QUALITY_SECONDS = REGISTRY.histogram(
+    "arabic_ocr_quality_check_seconds", "Time spent in the local quality gate per image."
+)
+
+
+class ImageRejected(ValueError):
+    """The image failed the local quality gate; reason says which check."""
+    def __init__(self, reason: str, report: "QualityReport"):
+        super().__init__(f"image rejected before recognition ({reason})")
+        self.reason = reason
+        self.report = report
+
+
+@dataclass(frozen=True)
+class QualityReport:
+    contrast: float
+    ink_ratio: float
+    sharpness: float
+    components: int
+    elapsed_ms: float
+    reason: str | None = None
+
+    @property
+    def passed(self) -> bool:
+        return self.reason is None
+
+
+# =======================================================
+# MEASUREMENTS
+# =======================================================
+def _rank_filter(values: np.ndarray, reduce) -> np.ndarray:
+    """Max or min over a BACKGROUND_KERNEL window; the borders continue the frame's slope."""
+    padded = np.pad(values, BACKGROUND_KERNEL // 2, mode='reflect', reflect_type='odd')
+    # Separable: the window's rows, then its columns
+    columns = reduce(sliding_window_view(padded, BACKGROUND_KERNEL, axis=0), axis=-1)
+    return reduce(sliding_window_view(columns, BACKGROUND_KERNEL, axis=1), axis=-1)
+
+
+def _ink_strength(gray: Image.Image, pixels: np.ndarray, ink_is_dark: bool) -> np.ndarray:
+    """
+    How far each pixel stands from the paper around it, towards the ink's side: the
+    paper level is the frame with its strokes closed away (a max then min filter for
+    dark ink), so lighting gradients and shadows cancel out.
+    """
+    small = gray.copy()
+    small.thumbnail((BACKGROUND_SIDE, BACKGROUND_SIDE), Image.Resampling.BOX)
+    erase, restore = (np.max, np.min) if ink_is_dark else (np.min, np.max)
+    paper = _rank_filter(_rank_filter(np.asarray(small, dtype=np.float32), erase), restore)
+    paper = np.asarray(Image.fromarray(paper, mode='F').resize(gray.size, Image.Resampling.BILINEAR))
+    difference = paper - pixels
+    return np.clip(difference if ink_is_dark else -difference, 0, 255)
+
+
+def assess_image(image_bytes: bytes) -> QualityReport | None:
+    """
+    Contrast between ink and the paper around it, ink coverage, sharpness of the glyph
+    and its number of connected components, checked in that order against the
+    QUALITY_* thresholds. None when the image cannot be decoded: the engine gets to try it.
+    """
+    start = time.perf_counter()
+    try:
+        gray = decode_grayscale(image_bytes, draft_side=ANALYSIS_SIDE)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+    gray.thumbnail((ANALYSIS_SIDE, ANALYSIS_SIDE), Image.Resampling.BILINEAR)
+    pixels = np.asarray(gray, dtype=np.float32)
+
+    # Ink is dark on light paper or light on a dark board: whichever side has the
+    # strongest departures from the local paper level over the smallest ink share allowed
+    top = max(int(pixels.size * QUALITY_MIN_INK), 1)
+    strength = max((_ink_strength(gray, pixels, dark) for dark in (True, False)),
+                   key=lambda s: float(np.partition(s.ravel(), -top)[-top:].mean()))
+    levels = strength.astype(np.uint8)
+    threshold = otsu_threshold(np.bincount(levels.ravel(), minlength=256).tolist())
+    ink = levels > threshold
+    ink_pixels = np.count_nonzero(ink)
+    ink_ratio = float(ink_pixels / ink.size)
+    contrast = float(strength[ink].mean()) if ink_pixels else 0.0
+
+    sharpness, components = 0.0, 0
+    if contrast >= QUALITY_MIN_CONTRAST and ink_pixels:
+        # The glyph crop at a fixed size, ink at 0 and paper at 1: blur is judged relative
+        # to the glyph, whatever the capture's resolution, framing and exposure
+        rows, cols = np.flatnonzero(ink.any(axis=1)), np.flatnonzero(ink.any(axis=0))
+        margin = max(rows[-1] - rows[0], cols[-1] - cols[0]) // 8 + 4
+        crop = Image.fromarray(levels).crop((max(cols[0] - margin, 0), max(rows[0] - margin, 0),
+                                             min(cols[-1] + margin + 1, gray.width),
+                                             min(rows[-1] + margin + 1, gray.height)))
+        crop.thumbnail((GLYPH_SIDE, GLYPH_SIDE), Image.Resampling.BILINEAR)
+        glyph = 1.0 - np.asarray(crop, dtype=np.float32) / contrast
+        laplacian = (4 * glyph[1:-1, 1:-1] - glyph[:-2, 1:-1] - glyph[2:, 1:-1]
+                     - glyph[1:-1, :-2] - glyph[1:-1, 2:])
+        sharpness = float(laplacian.var())
+        glyph_ink = glyph < 0.5
+        min_area = max(int(np.count_nonzero(glyph_ink) * MIN_COMPONENT_SHARE), 1)
+        components = sum(1 for c in connected_components(glyph_ink) if c.area >= min_area)
+
+    if contrast < QUALITY_MIN_CONTRAST:
+        reason = "low_contrast"
+    elif ink_ratio < QUALITY_MIN_INK:
+        reason = "blank"
+    elif ink_ratio > QUALITY_MAX_INK:
+        reason = "cluttered"
+    elif sharpness < QUALITY_MIN_SHARPNESS:
+        reason = "blurry"
+    elif components > QUALITY_MAX_COMPONENTS:
+        reason = "multiple_glyphs"
+    else:
+        reason = None
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    return QualityReport(round(contrast, 1), round(ink_ratio, 4), round(sharpness, 5), components,
+                         elapsed_ms, reason)
+
+
+def check_image(image_bytes: bytes) -> QualityReport | None:
+    """Runs the gate and counts the outcome; raises ImageRejected when the image fails it."""
+    report = assess_image(image_bytes)
+    get_quality_stats().record(report)
+    if report is not None and not report.passed:
+        raise ImageRejected(report.reason, report)
+    return report
+
+
+# =======================================================
+# STATISTICS (reject rate and model time saved)
+# =======================================================
+class QualityStats:
+    """Per-process totals of the gate: images checked, rejected (by reason) and time spent."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checked = 0
+        self.rejected: dict[str, int] = {}
+        self.check_ms = 0.0
+
+    def record(self, report: QualityReport | None):
+        outcome = "undecodable" if report is None else report.reason or "passed"
+        QUALITY_CHECKS.inc(outcome=outcome)
+        if report is None:
+            return
+        QUALITY_SECONDS.observe(report.elapsed_ms / 1000)
+        with self._lock:
+            self.checked += 1
+            self.check_ms += report.elapsed_ms
+            if report.reason is not None:
+                self.rejected[report.reason] = self.rejected.get(report.reason, 0) + 1
+
+    @property
+    def rejected_total(self) -> int:
+        return sum(self.rejected.values())
+
+    @property
+    def reject_rate(self) -> float:
+        return self.rejected_total / self.checked if self.checked else 0.0
+
+    def saved_ms(self, average_call_ms: float) -> float:
+        """Model time the rejections avoided, net of the time the gate took for every image."""
+        return self.rejected_total * average_call_ms - self.check_ms
+
+
+@cached_resource
+def get_quality_stats() -> QualityStats:
+    return QualityStats()
@@ -0,0 +1,247 @@
+"""
+Core recognition entry points: single images (cache-aware) and concurrent batches.
+"""
+import asyncio
+import io
+import mimetypes
+import time
+import zipfile
+import zlib
+from dataclasses import dataclass, replace
+from typing import Callable
+
+from .cache import get_recognition_cache, recognition_cache_key
+from .client import run_sync
+from .config import (
+    ASYNC_RECOGNITION,
+    BATCH_CONCURRENCY,
+    BATCH_MAX_ARCHIVE_BYTES,
+    BATCH_MAX_ARCHIVE_ENTRIES,
+    BATCH_MAX_ITEMS,
+    PHASH_ENABLED,
+    QUALITY_GATE_ENABLED,
+    RECOGNITION_TIMEOUT_SECONDS,
+)
+from .engines import Recognition, get_recognition_engine
+from .metrics import RECOGNITIONS, StageTimer
+from .phash import GlyphKey, get_near_duplicate_index, glyph_key
+from .quality import check_image
+from .singleflight import get_single_flight
+
+# =======================================================
+# CORE PROCESSING FUNCTION
+# =======================================================
+def recognize_image(image_bytes: bytes, mime_type: str, on_wait: Callable[[], None] | None = None) -> Recognition:
+    """
+    Identifies the letter through the recognition engine; raises on failure.
+    Identical images are answered from the recognition cache, and re-captures of an
+    already recognized glyph from the near-duplicate index, without a network call.
+    Blank, blurred or cluttered captures raise ImageRejected before any engine runs.
+    on_wait is called a few times a second while waiting (e.g. to show the queue position).
+    """
+    if on_wait is not None and ASYNC_RECOGNITION:
+        return run_sync(recognize_image_async(image_bytes, mime_type), on_wait=on_wait)
+
+    timer = StageTimer()
+    cache = get_recognition_cache()
+    with timer.stage("cache_lookup"):
+        cache_key = recognition_cache_key(image_bytes)
+        cached_letter = cache.get(cache_key)
+    if cached_letter is not None:
+        RECOGNITIONS.inc(engine="cache")
+        return Recognition(cached_letter, None, "cache", timings_ms=timer.timings_ms)
+
+    def recognize_uncached() -> Recognition:
+        near_timer = StageTimer()
+        glyph, near = _screen(image_bytes, near_timer)
+        if near is not None:
+            # Not written to the exact cache: a near match is a guess, not the model's answer
+            return near
+        result = get_recognition_engine().recognize(image_bytes, mime_type)
+        # Neither a fallback guess made while the remote engine was unreachable nor a
+        # low-confidence answer is cached: the next capture gets a fresh look
+        if result.cacheable:
+            cache.put(cache_key, result.letter)
+            _remember_glyph(glyph, result.letter)
+        near_timer.include(result.timings_ms)
+        return replace(result, timings_ms=near_timer.timings_ms)
+
+    # Identical images already in flight (a class photographing one flashcard) share that call
+    start = time.perf_counter()
+    result, shared = get_single_flight().do(cache_key, recognize_uncached)
+    return _finish(timer, result, shared, start)
+
+
+async def recognize_image_async(image_bytes: bytes, mime_type: str) -> Recognition:
+    timer = StageTimer()
+    cache = get_recognition_cache()
+    with timer.stage("cache_lookup"):
+        cache_key = recognition_cache_key(image_bytes)
+        cached_letter = await cache.get_async(cache_key)
+    if cached_letter is not None:
+        RECOGNITIONS.inc(engine="cache")
+        return Recognition(cached_letter, None, "cache", timings_ms=timer.timings_ms)
+
+    async def recognize_uncached() -> Recognition:
+        near_timer = StageTimer()
+        glyph, near = await asyncio.to_thread(_screen, image_bytes, near_timer)
+        if near is not None:
+            return near
+        result = await get_recognition_engine().recognize_async(image_bytes, mime_type)
+        if result.cacheable:
+            await cache.put_async(cache_key, result.letter)
+            _remember_glyph(glyph, result.letter)
+        near_timer.include(result.timings_ms)
+        return replace(result, timings_ms=near_timer.timings_ms)
+
+    start = time.perf_counter()
+    result, shared = await get_single_flight().do_async(cache_key, recognize_uncached)
+    return _finish(timer, result, shared, start)
+
+
+def _screen(image_bytes: bytes, timer: StageTimer) -> tuple[GlyphKey | None, Recognition | None]:
+    """
+    The local work before an engine call: the quality gate (raises ImageRejected for
+    captures not worth a model call), then the near-duplicate lookup.
+    """
+    if QUALITY_GATE_ENABLED:
+        with timer.stage("quality_check"):
+            check_image(image_bytes)
+    return _near_duplicate_lookup(image_bytes, timer)
+
+
+def _near_duplicate_lookup(image_bytes: bytes, timer: StageTimer) -> tuple[GlyphKey | None, Recognition | None]:
+    """
+    The glyph's key (perceptual hash and marks), and a recognition answered from a stored
+    near-duplicate (None on a miss). The key is None when the index is off or the image
+    undecodable.
+    """
+    if not PHASH_ENABLED:
+        return None, None
+    with timer.stage("near_duplicate_lookup"):
+        glyph = glyph_key(image_bytes)
+        match = get_near_duplicate_index().get(glyph) if glyph is not None else None
+    if match is None:
+        return glyph, None
+    return glyph, Recognition(match[0], None, "near_duplicate", timings_ms=timer.timings_ms)
+
+
+def _remember_glyph(glyph: GlyphKey | None, letter: str):
+    if glyph is not None:
+        get_near_duplicate_index().put(glyph, letter)
+
+
+def _finish(timer: StageTimer, result: Recognition, shared: bool, start: float) -> Recognition:
+    RECOGNITIONS.inc(engine=result.engine)
+    if shared:
+        # The engine stages belong to the request that made the call; this one only waited
+        timer.include({"coalesced_wait": round((time.perf_counter() - start) * 1000, 3)})
+    else:
+        timer.include(result.timings_ms)
+    return replace(result, coalesced=shared, timings_ms=timer.timings_ms)
+
+
+# =======================================================
+# BATCH RECOGNITION (many letter images per request)
+# =======================================================
+BATCH_IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+
+@dataclass(frozen=True)
+class BatchItem:
+    name: str
+    image_bytes: bytes
+    mime_type: str
+
+
+@dataclass(frozen=True)
+class BatchResult:
+    name: str
+    letter: str | None
+    confidence: float | None
+    engine: str | None
+    error: str | None
+    elapsed_ms: float
+
+
+class ArchiveRejected(ValueError):
+    """A ZIP upload that is corrupt or over the batch limits; reason says which."""
+    def __init__(self, archive: str, reason: str, detail: str):
+        super().__init__(f"{archive}: {detail}")
+        self.archive = archive
+        self.reason = reason
+
+
+def _archive_items(name: str, data: bytes, limit: int) -> list[BatchItem]:
+    """
+    The first `limit` images of a ZIP upload, by name. Raises ArchiveRejected, before
+    anything is decompressed, when the archive is unreadable or over its limits.
+    """
+    try:
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            entries = archive.infolist()
+            if len(entries) > BATCH_MAX_ARCHIVE_ENTRIES:
+                raise ArchiveRejected(name, "too_many_entries",
+                                      f"{len(entries)} entries (limit {BATCH_MAX_ARCHIVE_ENTRIES})")
+            images = sorted((e for e in entries
+                             if not e.is_dir() and e.filename.lower().endswith(BATCH_IMAGE_EXTENSIONS)),
+                            key=lambda e: e.filename)[:limit]
+            # zipfile never inflates a member past its declared size (the read fails instead),
+            # so the declared sizes bound the memory the archive can take
+            total = sum(e.file_size for e in images)
+            if total > BATCH_MAX_ARCHIVE_BYTES:
+                raise ArchiveRejected(name, "too_large",
+                                      f"{total} uncompressed bytes (limit {BATCH_MAX_ARCHIVE_BYTES})")
+            return [BatchItem(e.filename, archive.read(e), mimetypes.guess_type(e.filename)[0] or 'image/png')
+                    for e in images]
+    except (zipfile.BadZipFile, zlib.error, EOFError, NotImplementedError, RuntimeError) as e:
+        # Truncated or corrupt data, an unsupported compression method or an encrypted member
+        raise ArchiveRejected(name, "corrupt", str(e) or type(e).__name__) from e
+
+
+def expand_batch_uploads(files: list) -> list[BatchItem]:
+    """
+    Turns uploaded files into batch items; ZIP archives contribute every image inside
+    them. At most BATCH_MAX_ITEMS images are taken. Raises ArchiveRejected.
+    """
+    items = []
+    for uploaded in files:
+        remaining = BATCH_MAX_ITEMS - len(items)
+        if remaining <= 0:
+            break
+        if uploaded.name.lower().endswith('.zip'):
+            items.extend(_archive_items(uploaded.name, uploaded.getvalue(), remaining))
+        else:
+            items.append(BatchItem(uploaded.name, uploaded.getvalue(), f"image/{uploaded.type.split('/')[-1]}"))
+    return items
+
+
+async def recognize_batch_async(items: list[BatchItem], concurrency: int = BATCH_CONCURRENCY) -> list[BatchResult]:
+    """
+    Fans the items out concurrently on the shared event loop, at most `concurrency`
+    at a time. A failing item is reported in its row instead of failing the batch.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def recognize_one(item: BatchItem) -> BatchResult:
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                result = await asyncio.wait_for(
+                    recognize_image_async(item.image_bytes, item.mime_type), RECOGNITION_TIMEOUT_SECONDS
+                )
+            except Exception as e:
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                return BatchResult(item.name, None, None, None, str(e) or type(e).__name__, elapsed_ms)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            return BatchResult(item.name, result.letter, result.confidence, result.engine, None, elapsed_ms)
+
+    return list(await asyncio.gather(*(recognize_one(item) for item in items)))
+
+
+def recognize_batch(items: list[BatchItem], concurrency: int = BATCH_CONCURRENCY,
+                    on_wait: Callable[[], None] | None = None) -> tuple[list[BatchResult], float]:
+    """Sync facade over recognize_batch_async; returns the results and the wall time in seconds."""
+    start = time.perf_counter()
+    results = run_sync(recognize_batch_async(items, concurrency), timeout=None, on_wait=on_wait)
+    return results, time.perf_counter() - start
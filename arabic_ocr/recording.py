@@ -0,0 +1,86 @@
+"""
+Recording of real model answers, replayed offline by the mock model server.
+"""
+import hashlib
+import json
+import threading
+import time
+
+from .config import GEMINI_RECORD_PATH
+from .resources import cached_resource
+
+
+def image_digest(image_bytes: bytes) -> str:
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+def prompt_digest(text: str) -> str:
+    """Short digest of prompt text; the suffix of a prompt key (v3-1a2b3c4d)."""
+    return hashlib.sha256(text.encode()).hexdigest()[:8]
+
+
+class ResponseRecorder:
+    """
+    Appends one JSON line per model answer, keyed by the hash of the image bytes that
+    were actually sent (after preprocessing), so the mock server can match its requests.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def record(self, sent_image: bytes, model: str, prompt_version: str, text: str,
+               latency_ms: float, usage: dict | None = None):
+        line = json.dumps({
+            "image_sha256": image_digest(sent_image),
+            "model": model,
+            "prompt_version": prompt_version,
+            "text": text,
+            "latency_ms": round(latency_ms, 1),
+            "usage": usage,
+            "recorded_at": time.time(),
+        }, ensure_ascii=False)
+        with self._lock, open(self.path, 'a', encoding='utf-8') as f:
+            f.write(line + '\n')
+
+
+@cached_resource
+def get_response_recorder() -> ResponseRecorder | None:
+    return ResponseRecorder(GEMINI_RECORD_PATH) if GEMINI_RECORD_PATH else None
+
+
+class Recordings:
+    """
+    Recorded answers by model and image hash, and by prompt text when the recording's
+    prompt key carries its digest (prompt variants answer differently); the latest
+    recording wins.
+    """
+    def __init__(self):
+        self._by_prompt: dict[tuple[str, str, str], dict] = {}
+        self._latest: dict[tuple[str, str], dict] = {}
+
+    def __len__(self) -> int:
+        return len(self._latest)
+
+    def add(self, entry: dict):
+        model, image = entry["model"], entry["image_sha256"]
+        self._latest[(model, image)] = entry
+        _, separator, digest = (entry.get("prompt_version") or '').rpartition('-')
+        if separator:
+            self._by_prompt[(model, image, digest)] = entry
+
+    def has(self, model: str, image: str, prompt: str) -> bool:
+        """Whether this exact prompt (by digest) was recorded for the image."""
+        return (model, image, prompt) in self._by_prompt
+
+    def get(self, model: str, image: str, prompt: str | None = None) -> dict | None:
+        """The answer recorded with this prompt, else the latest one for the image."""
+        return self._by_prompt.get((model, image, prompt)) or self._latest.get((model, image))
+
+
+def load_recordings(path: str) -> Recordings:
+    recordings = Recordings()
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                recordings.add(json.loads(line))
+    return recordings
@@ -0,0 +1,232 @@
+"""
+Retries with exponential backoff and a deadline budget, and a circuit breaker, for
+calls to the remote model.
+"""
+import asyncio
+import random
+import threading
+import time
+from typing import Awaitable, Callable, TypeVar
+
+import httpx
+from google.genai import errors
+
+from .config import (
+    BREAKER_FAILURE_THRESHOLD,
+    BREAKER_RESET_SECONDS,
+    MODEL_RETRY_ATTEMPTS,
+    MODEL_RETRY_BASE_SECONDS,
+    MODEL_RETRY_DEADLINE_SECONDS,
+    MODEL_RETRY_MAX_SECONDS,
+)
+from .metrics import REGISTRY
+from .resources import cached_resource
+
+T = TypeVar("T")
+
+RETRIES = REGISTRY.counter(
+    "arabic_ocr_model_retries_total", "Model calls retried after a transient error.", ("reason",)
+)
+BREAKER_TRIPS = REGISTRY.counter(
+    "arabic_ocr_circuit_breaker_trips_total", "Times the model circuit breaker opened."
+)
+BREAKER_REJECTIONS = REGISTRY.counter(
+    "arabic_ocr_circuit_breaker_rejections_total", "Model calls failed fast while the breaker was open."
+)
+BREAKER_OPEN = REGISTRY.gauge(
+    "arabic_ocr_circuit_breaker_open", "1 while the model circuit breaker is open or half-open."
+)
+
+
+class CircuitOpenError(RuntimeError):
+    """The remote model is failing; calls are refused until the breaker's cool-down ends."""
+    def __init__(self, retry_after: float):
+        super().__init__(f"model unavailable, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+# =======================================================
+# ERROR CLASSIFICATION
+# =======================================================
+def retry_reason(exc: BaseException) -> str | None:
+    """Short reason when the error is transient (quota, overload, network), else None."""
+    if isinstance(exc, errors.APIError):
+        if exc.code == 429:
+            return "429"
+        if exc.code in (500, 502, 503, 504):
+            return str(exc.code)
+        return None
+    if isinstance(exc, httpx.TransportError):
+        return type(exc).__name__
+    return None
+
+
+def retry_after_seconds(exc: BaseException) -> float | None:
+    """The server's Retry-After hint (delta-seconds form), when the error carries one."""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    value = headers.get("retry-after") if headers is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+# =======================================================
+# BACKOFF POLICY
+# =======================================================
+class RetryPolicy:
+    """
+    Up to max_attempts calls with "full jitter" exponential backoff. A retry is only
+    started when its wait still fits in the deadline budget measured from the first call.
+    """
+    def __init__(self, max_attempts: int = MODEL_RETRY_ATTEMPTS, base_seconds: float = MODEL_RETRY_BASE_SECONDS,
+                 max_seconds: float = MODEL_RETRY_MAX_SECONDS, deadline_seconds: float = MODEL_RETRY_DEADLINE_SECONDS):
+        self.max_attempts = max_attempts
+        self.base_seconds = base_seconds
+        self.max_seconds = max_seconds
+        self.deadline_seconds = deadline_seconds
+
+    def backoff(self, attempt: int, exc: BaseException) -> float:
+        """Wait before retry number `attempt` (1-based); honours Retry-After as a floor."""
+        delay = random.uniform(0, min(self.max_seconds, self.base_seconds * 2 ** (attempt - 1)))
+        return max(delay, min(retry_after_seconds(exc) or 0.0, self.max_seconds))
+
+    def next_delay(self, attempt: int, exc: BaseException, started: float) -> float | None:
+        """Seconds to wait before retrying, or None when the error must be raised."""
+        if attempt >= self.max_attempts or retry_reason(exc) is None:
+            return None
+        delay = self.backoff(attempt, exc)
+        if time.monotonic() - started + delay > self.deadline_seconds:
+            return None
+        return delay
+
+
+# =======================================================
+# CIRCUIT BREAKER
+# =======================================================
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive transient failures and refuses calls for
+    reset_seconds. Then one probe call is let through: success closes the breaker,
+    failure opens it again.
+    """
+    def __init__(self, failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 reset_seconds: float = BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self.failures = 0
+        self.opened_at: float | None = None
+        self._probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.reset_seconds else "open"
+
+    def before_call(self):
+        """Raises CircuitOpenError unless the call may go ahead."""
+        if self.failure_threshold <= 0:
+            return
+        with self._lock:
+            if self.opened_at is None:
+                return
+            remaining = self.reset_seconds - (time.monotonic() - self.opened_at)
+            if remaining <= 0 and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return
+        BREAKER_REJECTIONS.inc()
+        raise CircuitOpenError(max(remaining, 1.0))
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probe_in_flight = False
+        BREAKER_OPEN.set(0)
+
+    def record_failure(self):
+        if self.failure_threshold <= 0:
+            return
+        with self._lock:
+            self.failures += 1
+            reopen = self._probe_in_flight
+            self._probe_in_flight = False
+            if not reopen and (self.opened_at is not None or self.failures < self.failure_threshold):
+                return
+            self.opened_at = time.monotonic()
+        BREAKER_TRIPS.inc()
+        BREAKER_OPEN.set(1)
+
+    def release_probe(self):
+        """The probe ended without a verdict on the upstream (e.g. a 400 or a cancellation)."""
+        with self._lock:
+            self._probe_in_flight = False
+
+
+@cached_resource
+def get_circuit_breaker() -> CircuitBreaker:
+    """One breaker per process: every session's calls share the same upstream."""
+    return CircuitBreaker()
+
+
+# =======================================================
+# CALL WRAPPERS
+# =======================================================
+async def call_with_retry_async(call: Callable[[], Awaitable[T]], policy: RetryPolicy | None = None,
+                                breaker: CircuitBreaker | None = None) -> T:
+    policy = policy or RetryPolicy()
+    breaker = breaker or get_circuit_breaker()
+    started = time.monotonic()
+    attempt = 0
+    while True:
+        attempt += 1
+        breaker.before_call()
+        try:
+            result = await call()
+        except BaseException as e:
+            delay = _after_failure(breaker, policy, attempt, e, started)
+            if delay is None:
+                raise
+            await asyncio.sleep(delay)
+        else:
+            breaker.record_success()
+            return result
+
+
+def call_with_retry(call: Callable[[], T], policy: RetryPolicy | None = None,
+                    breaker: CircuitBreaker | None = None) -> T:
+    """Blocking counterpart of call_with_retry_async."""
+    policy = policy or RetryPolicy()
+    breaker = breaker or get_circuit_breaker()
+    started = time.monotonic()
+    attempt = 0
+    while True:
+        attempt += 1
+        breaker.before_call()
+        try:
+            result = call()
+        except Exception as e:
+            delay = _after_failure(breaker, policy, attempt, e, started)
+            if delay is None:
+                raise
+            time.sleep(delay)
+        else:
+            breaker.record_success()
+            return result
+
+
+def _after_failure(breaker: CircuitBreaker, policy: RetryPolicy, attempt: int, exc: BaseException,
+                   started: float) -> float | None:
+    reason = retry_reason(exc)
+    if reason is None:
+        # Cancellations and request errors (e.g. 400) say nothing about upstream health
+        breaker.release_probe()
+        return None
+    breaker.record_failure()
+    delay = policy.next_delay(attempt, exc, started)
+    if delay is not None:
+        RETRIES.inc(reason=reason)
+    return delay
@@ -0,0 +1,37 @@
+"""
+Process-wide shared resources (clients, pools, servers, caches).
+"""
+import functools
+import threading
+from collections import OrderedDict
+
+
+def cached_resource(func=None, *, max_entries: int | None = None):
+    """
+    The non-Streamlit counterpart of st.cache_resource: the factory runs once per distinct
+    arguments and every caller in the process shares the result, even when several
+    threads ask for it at the same time. Oldest entries are dropped beyond max_entries.
+    """
+    def decorator(factory):
+        lock = threading.Lock()
+        entries: OrderedDict = OrderedDict()
+
+        @functools.wraps(factory)
+        def wrapper(*args, **kwargs):
+            key = (args, tuple(sorted(kwargs.items())))
+            with lock:
+                if key not in entries:
+                    entries[key] = factory(*args, **kwargs)
+                    if max_entries is not None:
+                        while len(entries) > max_entries:
+                            entries.popitem(last=False)
+                return entries[key]
+
+        def clear():
+            with lock:
+                entries.clear()
+
+        wrapper.clear = clear
+        return wrapper
+
+    return decorator(func) if func is not None else decorator
@@ -0,0 +1,92 @@
+"""
+Single-flight deduplication: concurrent requests for the same key share one upstream
+call. Works across script threads (blocking callers) and the shared event loop.
+"""
+import asyncio
+import concurrent.futures
+import threading
+from typing import Awaitable, Callable, TypeVar
+
+from .metrics import REGISTRY
+from .resources import cached_resource
+
+T = TypeVar("T")
+
+LEADERS = REGISTRY.counter(
+    "arabic_ocr_singleflight_leaders_total", "Recognitions that made the upstream call for their image."
+)
+COALESCED = REGISTRY.counter(
+    "arabic_ocr_singleflight_coalesced_total", "Recognitions that waited for an identical in-flight request."
+)
+
+
+class SingleFlight:
+    """
+    The first caller for a key runs the call; callers arriving while it is in flight
+    wait for that same outcome (result or exception) instead of starting their own.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: dict[str, concurrent.futures.Future] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    def _join(self, key: str) -> tuple[concurrent.futures.Future, bool]:
+        """The key's shared future, and whether this caller leads it."""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.coalesced += 1
+                COALESCED.inc()
+                return future, False
+            future = self._calls[key] = concurrent.futures.Future()
+            self.leaders += 1
+            LEADERS.inc()
+            return future, True
+
+    def _finish(self, key: str, future: concurrent.futures.Future):
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+
+    def do(self, key: str, call: Callable[[], T]) -> tuple[T, bool]:
+        """Blocking form; returns the result and whether it was shared from another caller."""
+        future, leader = self._join(key)
+        if not leader:
+            return future.result(), True
+        try:
+            result = call()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            self._finish(key, future)
+
+    async def do_async(self, key: str, call: Callable[[], Awaitable[T]]) -> tuple[T, bool]:
+        future, leader = self._join(key)
+        if not leader:
+            # Shielded: a follower giving up must not cancel the shared outcome
+            return await asyncio.shield(asyncio.wrap_future(future)), True
+
+        task = asyncio.ensure_future(call())
+
+        def settle(done: asyncio.Task):
+            if done.cancelled():
+                future.cancel()
+            elif done.exception() is not None:
+                future.set_exception(done.exception())
+            else:
+                future.set_result(done.result())
+            self._finish(key, future)
+
+        task.add_done_callback(settle)
+        # Shielded: a disconnecting leader must not cancel the followers' result
+        return await asyncio.shield(task), False
+
+
+@cached_resource
+def get_single_flight() -> SingleFlight:
+    return SingleFlight()
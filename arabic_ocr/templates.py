@@ -0,0 +1,102 @@
+"""
+Bootstraps the local classifier's reference glyphs (LOCAL_TEMPLATES_DIR), which the
+cascade engine needs before it can answer anything without the model.
+
+    python -m arabic_ocr.templates --font /usr/share/fonts/truetype/noto/NotoNaskhArabic-Regular.ttf
+    python -m arabic_ocr.templates --samples samples/ -o templates/
+
+Fonts are rendered letter by letter at each --size; labeled sample images (baa.png,
+baa_2.png or baa/001.png) are cropped to their ink. Files are named after the letter's
+clip, as TemplateEngine expects, and existing templates are kept.
+"""
+import argparse
+import hashlib
+import os
+import sys
+
+from PIL import Image, ImageDraw, ImageFont
+
+from .audio import LETTER_TO_AUDIO_BASE
+from .config import LOCAL_TEMPLATES_DIR
+from .evaluate import labeled_images
+from .preprocessing import crop_to_ink, decode_grayscale
+
+CANVAS_SIDE = 256
+PAPER, INK = 255, 0
+# Rendered for a character no font draws: letters rendering the same are missing glyphs
+MISSING_GLYPH = '\ue000'
+
+
+def _render(font: ImageFont.FreeTypeFont, text: str) -> Image.Image:
+    image = Image.new('L', (CANVAS_SIDE, CANVAS_SIDE), PAPER)
+    ImageDraw.Draw(image).text((CANVAS_SIDE // 2, CANVAS_SIDE // 2), text, font=font, fill=INK, anchor='mm')
+    return image
+
+
+def render_templates(font_path: str, output_dir: str, sizes: list[int]) -> dict[str, int]:
+    """Writes one template per letter and size drawn with the font; the count per letter."""
+    written: dict[str, int] = {}
+    font_name = os.path.splitext(os.path.basename(font_path))[0].lower()
+    for size in sizes:
+        font = ImageFont.truetype(font_path, size)
+        missing = _render(font, MISSING_GLYPH).tobytes()
+        for letter, base_name in LETTER_TO_AUDIO_BASE.items():
+            image = _render(font, letter)
+            if image.getbbox() is None or image.tobytes() == missing:
+                continue
+            glyph, _ = crop_to_ink(image)
+            glyph.save(os.path.join(output_dir, f"{base_name}_{font_name}_{size}.png"))
+            written[letter] = written.get(letter, 0) + 1
+    return written
+
+
+def import_samples(folder: str, output_dir: str) -> dict[str, int]:
+    """Writes each labeled sample cropped to its ink; the count per letter."""
+    written: dict[str, int] = {}
+    for sample in labeled_images(folder):
+        try:
+            glyph, _ = crop_to_ink(decode_grayscale(sample.image_bytes))
+        except (OSError, ValueError, Image.DecompressionBombError) as e:
+            print(f"skipped {sample.path}: {e}", file=sys.stderr)
+            continue
+        digest = hashlib.sha256(sample.image_bytes).hexdigest()[:12]
+        glyph.save(os.path.join(output_dir, f"{LETTER_TO_AUDIO_BASE[sample.letter]}_{digest}.png"))
+        written[sample.letter] = written.get(sample.letter, 0) + 1
+    return written
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(prog="python -m arabic_ocr.templates",
+                                     description="Reference glyphs for the local classifier")
+    parser.add_argument("-o", "--output", default=LOCAL_TEMPLATES_DIR,
+                        help=f"templates folder (default: {LOCAL_TEMPLATES_DIR})")
+    parser.add_argument("--font", action="append", default=[], help="TrueType/OpenType font with Arabic glyphs")
+    parser.add_argument("--size", type=int, action="append", help="font size in pixels (default: 96)")
+    parser.add_argument("--samples", help="folder of labeled letter images")
+    args = parser.parse_args(argv)
+    if not args.font and not args.samples:
+        parser.error("give at least one --font or --samples")
+
+    os.makedirs(args.output, exist_ok=True)
+    totals: dict[str, int] = {}
+    sources = [(path, lambda path=path: render_templates(path, args.output, args.size or [96]))
+               for path in args.font]
+    if args.samples:
+        sources.append((args.samples, lambda: import_samples(args.samples, args.output)))
+    for source, write in sources:
+        try:
+            written = write()
+        except OSError as e:
+            parser.error(f"cannot read {source}: {e}")
+        print(f"{source}: {sum(written.values())} templates for {len(written)} letters")
+        for letter, count in written.items():
+            totals[letter] = totals.get(letter, 0) + count
+
+    missing = [letter for letter in LETTER_TO_AUDIO_BASE if letter not in totals]
+    if missing:
+        print(f"No template for: {' '.join(missing)} (these always go to the model)", file=sys.stderr)
+    print(f"Wrote {sum(totals.values())} templates to {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Clip responses: byte ranges (single, suffix, unsatisfiable, and the malformed or
+multi-range headers that are ignored) and ETag revalidation.
+"""
+import pytest
+
+from arabic_ocr.audio import clip_response, load_audio_asset
+
+SIZE = 100
+
+
+@pytest.fixture
+def clip(tmp_path):
+    path = tmp_path / "baa.mp4"
+    path.write_bytes(bytes(range(SIZE)))
+    return load_audio_asset(str(path))
+
+
+def _headers(headers):
+    return dict(headers)
+
+
+@pytest.mark.parametrize("range_header, status, content_range, body", [
+    (None, 200, None, slice(0, SIZE)),
+    ("bytes=0-9", 206, "bytes 0-9/100", slice(0, 10)),
+    ("bytes=90-", 206, "bytes 90-99/100", slice(90, SIZE)),
+    ("bytes=-5", 206, "bytes 95-99/100", slice(95, SIZE)),
+    ("bytes=-500", 206, "bytes 0-99/100", slice(0, SIZE)),
+    ("bytes=50-500", 206, "bytes 50-99/100", slice(50, SIZE)),
+    # Unsatisfiable: nothing of the clip is in the range
+    ("bytes=-0", 416, "bytes */100", slice(0, 0)),
+    ("bytes=200-", 416, "bytes */100", slice(0, 0)),
+    ("bytes=100-120", 416, "bytes */100", slice(0, 0)),
+    # Malformed, reversed or several ranges: ignored, the whole clip is sent (RFC 9110)
+    ("bytes=abc-", 200, None, slice(0, SIZE)),
+    ("bytes=5-2", 200, None, slice(0, SIZE)),
+    ("bytes=-", 200, None, slice(0, SIZE)),
+    ("bytes=+1-2", 200, None, slice(0, SIZE)),
+    ("bytes=0-1,5-6", 200, None, slice(0, SIZE)),
+    ("bytes=0-1, 5-6", 200, None, slice(0, SIZE)),
+    ("items=0-1", 200, None, slice(0, SIZE)),
+])
+def test_ranges(clip, range_header, status, content_range, body):
+    got_status, headers, got_body = clip_response(clip, range_header=range_header)
+    headers = _headers(headers)
+    assert got_status == status
+    assert headers.get('Content-Range') == content_range
+    assert got_body == clip.data[body]
+    assert headers['Content-Length'] == str(len(got_body))
+
+
+def test_matching_etag_is_not_modified(clip):
+    status, headers, body = clip_response(clip, if_none_match=f'"{clip.digest}"', range_header="bytes=0-9")
+    assert (status, body) == (304, b'')
+    assert _headers(headers)['ETag'] == f'"{clip.digest}"'
+
+
+def test_other_etag_sends_the_clip(clip):
+    status, headers, body = clip_response(clip, if_none_match='"stale"')
+    assert (status, body) == (200, clip.data)
+    assert 'immutable' in _headers(headers)['Cache-Control']
+
+
+def test_unknown_clip_is_not_found():
+    assert clip_response(None)[0] == 404
@@ -0,0 +1,85 @@
+"""
+Batch uploads: ZIP archives are expanded to their images, rejected when corrupt or
+over the limits, and the whole batch is cut at BATCH_MAX_ITEMS.
+"""
+import io
+import zipfile
+
+import pytest
+
+from arabic_ocr import recognition
+from arabic_ocr.recognition import ArchiveRejected, BatchItem, expand_batch_uploads
+
+
+class Upload:
+    """What the uploader hands over: a name, the bytes and a MIME type."""
+    def __init__(self, name: str, data: bytes, type: str = 'image/png'):
+        self.name = name
+        self.data = data
+        self.type = type
+
+    def getvalue(self) -> bytes:
+        return self.data
+
+
+def _zip(entries: dict[str, bytes]) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, data in entries.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+def test_archive_images_are_expanded_by_name():
+    archive = _zip({'b.png': b'B', 'notes.txt': b'', 'a/c.JPG': b'C', 'a/': b'', 'a.jpeg': b'A'})
+    items = expand_batch_uploads([Upload('letters.zip', archive, 'application/zip'), Upload('d.png', b'D')])
+    assert items == [BatchItem('a.jpeg', b'A', 'image/jpeg'), BatchItem('a/c.JPG', b'C', 'image/jpeg'),
+                     BatchItem('b.png', b'B', 'image/png'), BatchItem('d.png', b'D', 'image/png')]
+
+
+def _corrupt():
+    return b'PK\x03\x04 not really a zip'
+
+
+def _truncated():
+    return _zip({'a.png': b'A' * 1000})[:-30]
+
+
+def _too_many_entries():
+    return _zip({f'{i}.txt': b'' for i in range(recognition.BATCH_MAX_ARCHIVE_ENTRIES + 1)})
+
+
+def _too_large():
+    # Compresses to a few hundred bytes; the declared size is what is checked
+    return _zip({'a.png': bytes(recognition.BATCH_MAX_ARCHIVE_BYTES + 1)})
+
+
+@pytest.mark.parametrize("archive, reason", [
+    pytest.param(_corrupt, "corrupt", id="corrupt"),
+    pytest.param(_truncated, "corrupt", id="truncated"),
+    pytest.param(_too_many_entries, "too_many_entries", id="too_many_entries"),
+    pytest.param(_too_large, "too_large", id="too_large"),
+])
+def test_rejected_archives(monkeypatch, archive, reason):
+    monkeypatch.setattr(recognition, 'BATCH_MAX_ARCHIVE_BYTES', 64 * 1024)
+    monkeypatch.setattr(recognition, 'BATCH_MAX_ARCHIVE_ENTRIES', 50)
+    with pytest.raises(ArchiveRejected) as rejected:
+        expand_batch_uploads([Upload('letters.zip', archive(), 'application/zip')])
+    assert rejected.value.reason == reason
+    assert rejected.value.archive == 'letters.zip'
+
+
+def test_size_limit_counts_only_the_images_taken(monkeypatch):
+    monkeypatch.setattr(recognition, 'BATCH_MAX_ARCHIVE_BYTES', 100)
+    monkeypatch.setattr(recognition, 'BATCH_MAX_ITEMS', 1)
+    archive = _zip({'a.png': b'A', 'b.png': bytes(1000), 'readme.txt': bytes(1000)})
+    assert expand_batch_uploads([Upload('letters.zip', archive)]) == [BatchItem('a.png', b'A', 'image/png')]
+
+
+def test_batch_is_truncated_at_max_items(monkeypatch):
+    monkeypatch.setattr(recognition, 'BATCH_MAX_ITEMS', 4)
+    archive = _zip({'c.png': b'C', 'a.png': b'A', 'skip.txt': b'', 'b.png': b'B'})
+    uploads = [Upload('first.png', b'1'), Upload('letters.zip', archive), Upload('later.png', b'L'),
+               Upload('never.zip', _corrupt())]
+    items = expand_batch_uploads(uploads)
+    assert [item.name for item in items] == ['first.png', 'a.png', 'b.png', 'c.png']
@@ -0,0 +1,100 @@
+"""
+Model replies: the JSON answer is validated against the 36 letters and [0, 1], its
+alternatives are advisory, and a partial stream is settled once its confidence is.
+"""
+import json
+
+import pytest
+
+from arabic_ocr.engines import InvalidModelAnswer, parse_model_answer, streamed_answer
+
+
+def _reply(letter="ب", confidence=0.9, alternatives=None) -> str:
+    answer = {"letter": letter, "confidence": confidence}
+    if alternatives is not None:
+        answer["alternatives"] = alternatives
+    return json.dumps(answer, ensure_ascii=False)
+
+
+@pytest.mark.parametrize("text, expected", [
+    pytest.param(_reply(), ("ب", 0.9, ()), id="json"),
+    pytest.param(' \n' + _reply(confidence=1) + '\n', ("ب", 1.0, ()), id="whitespace"),
+    pytest.param(_reply(confidence=0), ("ب", 0.0, ()), id="zero_confidence"),
+    pytest.param(_reply(letter="هـ"), ("ه", 0.9, ()), id="tatweel_json"),
+    pytest.param("هـ", ("ه", None, ()), id="tatweel_bare"),
+    pytest.param(" ب\n", ("ب", None, ()), id="bare_letter"),
+])
+def test_valid_answers(text, expected):
+    assert parse_model_answer(text) == expected
+
+
+@pytest.mark.parametrize("text", [
+    pytest.param(None, id="none"),
+    pytest.param("", id="empty"),
+    pytest.param('{"letter": "ب", "confidence": 0.9', id="truncated_json"),
+    pytest.param('{"letter": "ب"}', id="missing_confidence"),
+    pytest.param('{"confidence": 0.9}', id="missing_letter"),
+    pytest.param('{"letter": "ب", "confidence": "high"}', id="confidence_not_a_number"),
+    pytest.param('{"letter": ["ب"], "confidence": 0.9}', id="letter_not_a_string"),
+    pytest.param('{"letter": "ب", "confidence": NaN}', id="nan_confidence"),
+    pytest.param(_reply(confidence=1.5), id="confidence_above_one"),
+    pytest.param(_reply(confidence=-0.1), id="negative_confidence"),
+    pytest.param(_reply(letter="x"), id="latin_letter"),
+    pytest.param(_reply(letter="ٮ"), id="dotless_baa"),
+    pytest.param(_reply(letter="بت"), id="two_letters"),
+    pytest.param("the letter is ب", id="prose"),
+    pytest.param("x", id="bare_latin"),
+])
+def test_invalid_answers(text):
+    with pytest.raises(InvalidModelAnswer):
+        parse_model_answer(text)
+
+
+def test_invalid_alternatives_are_skipped():
+    alternatives = [
+        {"letter": "ت", "confidence": 0.05},
+        {"letter": "ب", "confidence": 0.3},        # the answer itself
+        {"letter": "x", "confidence": 0.2},        # not one of the 36
+        {"letter": "ث", "confidence": 1.2},        # out of range
+        {"letter": "ن"},                           # no confidence
+        "ي",                                       # not an object
+        {"letter": "نـ", "confidence": 0.08},      # tatweel
+        {"letter": "ي", "confidence": "0.04"},
+        {"letter": "ف", "confidence": 0.01},
+    ]
+    letter, confidence, kept = parse_model_answer(_reply(alternatives=alternatives))
+    assert (letter, confidence) == ("ب", 0.9)
+    assert kept == (("ن", 0.08), ("ت", 0.05), ("ي", 0.04))
+
+
+@pytest.mark.parametrize("alternatives", [None, [], "ت", {"letter": "ت"}])
+def test_alternatives_may_be_missing_or_unusable(alternatives):
+    assert parse_model_answer(_reply(alternatives=alternatives))[:2] == ("ب", 0.9)
+
+
+@pytest.mark.parametrize("partial", [
+    pytest.param('', id="empty"),
+    pytest.param('{"letter": "ب"', id="letter_only"),
+    pytest.param('{"letter": "ب", "confidence": ', id="before_confidence"),
+    pytest.param('{"letter": "ب", "confidence": 0', id="inside_confidence"),
+    pytest.param('{"letter": "ب", "confidence": 0.9', id="inside_confidence_digits"),
+    pytest.param('{"letter": "ب", "confidence": 9e', id="inside_exponent"),
+    pytest.param('{"letter": "ب", "confidence": 1.5,', id="confidence_above_one"),
+    pytest.param('{"letter": "ب", "confidence": -0.1}', id="negative_confidence"),
+    pytest.param('{"letter": "ب", "confidence": 0.9.1,', id="not_a_number"),
+    pytest.param('{"letter": "x", "confidence": 0.9,', id="latin_letter"),
+])
+def test_unsettled_streams(partial):
+    assert streamed_answer(partial) is None
+
+
+@pytest.mark.parametrize("partial, letter, confidence", [
+    pytest.param('{"letter": "ب", "confidence": 0.9,', "ب", 0.9, id="before_alternatives"),
+    pytest.param('{"letter":"ب","confidence":0.75}', "ب", 0.75, id="complete"),
+    pytest.param('{"letter": "هـ", "confidence": 1 , "alternatives": [{"letter": "ت"', "ه", 1.0, id="tatweel"),
+    pytest.param('{"letter": "ب", "confidence": 5e-1,', "ب", 0.5, id="exponent"),
+])
+def test_settled_streams(partial, letter, confidence):
+    answer = streamed_answer(partial)
+    assert json.loads(answer) == {"letter": letter, "confidence": confidence}
+    assert parse_model_answer(answer) == (letter, confidence, ())
@@ -0,0 +1,127 @@
+"""
+Near-duplicate index: letters that differ only by dots or a hamza never answer for each
+other, while re-captures of one glyph keep their marks and still match.
+"""
+import io
+import itertools
+import os
+
+import pytest
+from PIL import Image, ImageDraw, ImageFont
+
+from arabic_ocr.phash import HASH_FUNCTIONS, NearDuplicateIndex, glyph_key
+
+INK = 20
+SIZE = 200
+
+
+def _dot(draw, x, y, r=9):
+    draw.ellipse([x - r, y - r, x + r, y + r], fill=INK)
+
+
+def _hamza(draw, x, y):
+    draw.arc([x - 12, y - 12, x + 12, y + 12], 200, 90, fill=INK, width=6)
+    draw.line([(x - 12, y + 14), (x + 14, y + 6)], fill=INK, width=6)
+
+
+def _bowl(draw):
+    draw.arc([30, 40, 170, 140], 0, 180, fill=INK, width=14)
+
+
+def _haa(draw):
+    draw.line([(60, 50), (140, 50)], fill=INK, width=14)
+    draw.arc([40, 50, 160, 170], 100, 260, fill=INK, width=14)
+
+
+def _alif(draw):
+    draw.line([(100, 50), (100, 160)], fill=INK, width=14)
+
+
+def _taa(draw):
+    draw.line([(70, 30), (70, 160)], fill=INK, width=14)
+    draw.ellipse([70, 100, 170, 160], outline=INK, width=14)
+
+
+# Letters drawn as a main stroke plus their dots or hamza
+GLYPHS = {
+    "ب": lambda d: (_bowl(d), _dot(d, 100, 175)),
+    "ت": lambda d: (_bowl(d), _dot(d, 80, 50), _dot(d, 120, 50)),
+    "ث": lambda d: (_bowl(d), _dot(d, 80, 55), _dot(d, 120, 55), _dot(d, 100, 25)),
+    "ح": _haa,
+    "ج": lambda d: (_haa(d), _dot(d, 105, 115)),
+    "خ": lambda d: (_haa(d), _dot(d, 100, 20)),
+    "ا": _alif,
+    "أ": lambda d: (_alif(d), _hamza(d, 100, 25)),
+    "إ": lambda d: (_alif(d), _hamza(d, 100, 180)),
+    "ط": _taa,
+    "ظ": lambda d: (_taa(d), _dot(d, 125, 45)),
+}
+CONFUSABLE_GROUPS = ["بتث", "حجخ", "اأإ", "طظ"]
+
+
+def _encode(image: Image.Image, format: str = 'PNG') -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format=format, **({'quality': 90} if format == 'JPEG' else {}))
+    return buffer.getvalue()
+
+
+def drawn(letter: str) -> bytes:
+    image = Image.new('L', (SIZE, SIZE), 245)
+    GLYPHS[letter](ImageDraw.Draw(image))
+    return _encode(image)
+
+
+def recaptured(image_bytes: bytes) -> bytes:
+    """The same card again: larger frame, shifted, scaled and JPEG-compressed."""
+    with Image.open(io.BytesIO(image_bytes)) as glyph:
+        frame = Image.new('L', (320, 280), 240)
+        frame.paste(glyph.resize((230, 230)), (60, 25))
+    return _encode(frame, 'JPEG')
+
+
+@pytest.mark.parametrize("algorithm", sorted(HASH_FUNCTIONS))
+@pytest.mark.parametrize("group", CONFUSABLE_GROUPS)
+def test_confusable_letters_never_match(algorithm, group):
+    for stored, queried in itertools.permutations(group, 2):
+        index = NearDuplicateIndex(max_distance=8)
+        index.put(glyph_key(drawn(stored), algorithm), stored)
+        assert index.get(glyph_key(drawn(queried), algorithm)) is None, f"{queried} answered as {stored}"
+
+
+@pytest.mark.parametrize("letter", sorted(GLYPHS))
+def test_recapture_keeps_marks(letter):
+    assert glyph_key(recaptured(drawn(letter))).marks == glyph_key(drawn(letter)).marks
+
+
+def test_recapture_matches_its_letter():
+    index = NearDuplicateIndex()
+    index.put(glyph_key(drawn("ج")), "ج")
+    match = index.get(glyph_key(recaptured(drawn("ج"))))
+    assert match is not None and match[0] == "ج"
+
+
+ARABIC_FONTS = [
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/truetype/noto/NotoNaskhArabic-Regular.ttf",
+    "/usr/share/fonts/opentype/noto/NotoNaskhArabic-Regular.ttf",
+    "/Library/Fonts/Arial Unicode.ttf",
+    "C:/Windows/Fonts/arial.ttf",
+]
+ARABIC_FONT = next((path for path in ARABIC_FONTS if os.path.exists(path)), None)
+
+
+@pytest.mark.skipif(ARABIC_FONT is None, reason="no font with Arabic glyphs installed")
+@pytest.mark.parametrize("algorithm", sorted(HASH_FUNCTIONS))
+@pytest.mark.parametrize("group", CONFUSABLE_GROUPS)
+def test_rendered_confusable_letters_never_match(algorithm, group):
+    font = ImageFont.truetype(ARABIC_FONT, 140)
+
+    def rendered(letter: str) -> bytes:
+        image = Image.new('L', (SIZE, SIZE), 245)
+        ImageDraw.Draw(image).text((SIZE // 2, SIZE // 2), letter, font=font, fill=INK, anchor='mm')
+        return _encode(image)
+
+    for stored, queried in itertools.permutations(group, 2):
+        index = NearDuplicateIndex(max_distance=8)
+        index.put(glyph_key(rendered(stored), algorithm), stored)
+        assert index.get(glyph_key(rendered(queried), algorithm)) is None, f"{queried} answered as {stored}"
@@ -0,0 +1,110 @@
+"""
+Local quality gate: every reject reason, and clear captures that must pass whatever the
+lighting (gradients, vignetting, light ink on a dark board).
+"""
+import io
+
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw, ImageFilter
+
+from arabic_ocr.quality import ImageRejected, assess_image, check_image
+
+WIDTH, HEIGHT = 640, 480
+PAPER, INK = 215, 60
+
+
+def _encode(image: Image.Image, format: str = 'JPEG') -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format=format, **({'quality': 85} if format == 'JPEG' else {}))
+    return buffer.getvalue()
+
+
+def _paper(levels: np.ndarray | int = PAPER) -> Image.Image:
+    return Image.fromarray(np.broadcast_to(levels, (HEIGHT, WIDTH)).astype(np.uint8))
+
+
+def capture(paper: Image.Image | None = None, center=(WIDTH // 2, HEIGHT // 2), ink: int = INK,
+            blur: float = 0) -> bytes:
+    """A baa-like glyph (bowl and dot) covering about 1% of a phone-sized frame."""
+    image = paper or _paper()
+    draw = ImageDraw.Draw(image)
+    x, y = center
+    draw.arc([x - 40, y - 30, x + 40, y + 30], 0, 180, fill=ink, width=12)
+    draw.ellipse([x - 6, y + 40, x + 6, y + 52], fill=ink)
+    if blur:
+        image = image.filter(ImageFilter.GaussianBlur(blur))
+    return _encode(image)
+
+
+def falloff(near: int, far: int) -> Image.Image:
+    """Paper lit from the left, darker towards the right."""
+    return _paper(np.tile(np.linspace(near, far, WIDTH), (HEIGHT, 1)))
+
+
+def vignette() -> Image.Image:
+    y, x = np.indices((HEIGHT, WIDTH))
+    return _paper(PAPER - 60 * (((x - WIDTH / 2) / (WIDTH / 2)) ** 2 + ((y - HEIGHT / 2) / (HEIGHT / 2)) ** 2))
+
+
+def chalkboard() -> bytes:
+    image = _paper(50)
+    ImageDraw.Draw(image).arc([280, 210, 360, 270], 0, 180, fill=230, width=12)
+    return _encode(image)
+
+
+@pytest.mark.parametrize("image_bytes", [
+    pytest.param(capture(), id="even"),
+    pytest.param(capture(falloff(210, 150), center=(480, 300)), id="falloff"),
+    pytest.param(capture(falloff(210, 90), center=(500, 300)), id="strong_falloff"),
+    pytest.param(capture(vignette(), center=(520, 380)), id="vignette"),
+    pytest.param(chalkboard(), id="light_on_dark"),
+])
+def test_clear_captures_pass(image_bytes):
+    report = check_image(image_bytes)
+    assert report.passed, report
+    assert report.contrast > 50
+
+
+def test_contrast_is_measured_against_the_local_paper():
+    # Ink at 60 on paper at about 150 where the glyph sits, however bright the far side is
+    report = assess_image(capture(falloff(210, 150), center=(580, 300)))
+    assert report.contrast > 80
+
+
+def _speck() -> bytes:
+    image = _paper()
+    ImageDraw.Draw(image).ellipse([300, 200, 302, 202], fill=INK)
+    return _encode(image, 'PNG')
+
+
+def _checkerboard() -> bytes:
+    y, x = np.indices((HEIGHT, WIDTH))
+    return _encode(_paper(np.where((x // 16 + y // 16) % 2, PAPER, INK)))
+
+
+def _strokes() -> bytes:
+    image = _paper()
+    draw = ImageDraw.Draw(image)
+    for i in range(8):
+        draw.line([(60 + i * 70, 200), (60 + i * 70, 280)], fill=INK, width=10)
+    return _encode(image)
+
+
+@pytest.mark.parametrize("image_bytes, reason", [
+    pytest.param(capture(ink=190), "low_contrast", id="faded"),
+    pytest.param(_encode(_paper()), "low_contrast", id="empty"),
+    pytest.param(_speck(), "blank", id="speck"),
+    pytest.param(_checkerboard(), "cluttered", id="pattern"),
+    pytest.param(capture(ink=20, blur=5), "blurry", id="out_of_focus"),
+    pytest.param(_strokes(), "multiple_glyphs", id="row_of_strokes"),
+])
+def test_rejects(image_bytes, reason):
+    with pytest.raises(ImageRejected) as rejected:
+        check_image(image_bytes)
+    assert rejected.value.reason == reason
+
+
+def test_undecodable_images_are_left_to_the_engine():
+    assert assess_image(b"not an image") is None
+    assert check_image(b"not an image") is None